@@ -1,12 +1,31 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, g, has_request_context, send_from_directory
 import os
+import sys
 import pg8000.native
-from datetime import datetime, timedelta
+import pg8000.core
+from datetime import date, datetime, timedelta, timezone
 from functools import wraps
 from urllib.parse import urlparse
 from hashlib import sha256
 import secrets
 import random
+import threading
+import time
+import json
+import select
+import atexit
+import bisect
+import queue
+import re
+import csv
+import io
+import gzip
+from collections import OrderedDict, deque, namedtuple
+
+try:
+    import brotli  # isteğe bağlı; yoksa yalnızca gzip
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 app.secret_key = 'swing-planet-2024-secret-key'
@@ -15,20 +34,1263 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=90)  # 3 ay hatırla
 
 DATABASE_URL = os.environ.get('DATABASE_URL', '')
 
-def get_db():
+# Bağlantı havuzu ayarları (gunicorn worker başına)
+DB_HAVUZ_MIN = int(os.environ.get('DB_HAVUZ_MIN', '1'))
+DB_HAVUZ_MAX = int(os.environ.get('DB_HAVUZ_MAX', '5'))
+DB_HAVUZ_BEKLEME = float(os.environ.get('DB_HAVUZ_BEKLEME', '10'))  # saniye
+DB_BAGLANTI_MAX_KULLANIM = int(os.environ.get('DB_BAGLANTI_MAX_KULLANIM', '1000'))
+DB_BAGLANTI_MAX_OMUR = int(os.environ.get('DB_BAGLANTI_MAX_OMUR', '1800'))  # saniye
+DB_BOSTA_KONTROL = int(os.environ.get('DB_BOSTA_KONTROL', '30'))  # bu kadar boşta kalırsa SELECT 1
+
+# Toplu blok varsayılan ufku (gün)
+TOPLU_BLOK_GUN = int(os.environ.get('TOPLU_BLOK_GUN', '90'))
+TOPLU_BLOK_MAX_GUN = 366
+# Blok onayı istenirken gösterilecek en fazla çakışan rezervasyon
+CAKISMA_ORNEK_SAYISI = 20
+
+# Aralık ızgarası: en fazla bu kadar gün, kompakt yanıttaki durum kodları
+SLOT_ARALIK_MAX_GUN = 62
+SLOT_KODLARI = ['bos', 'dolu', 'kendi', 'bloklu']
+
+# Boş saat arama: en fazla bu kadar günlük ufuk, varsayılan/en fazla sonuç sayısı
+BOS_SLOT_MAX_GUN = 92
+BOS_SLOT_LIMIT = 20
+BOS_SLOT_MAX_LIMIT = 100
+
+# Toplu iptal / alan temizleme en fazla bu kadar günlük aralık
+TOPLU_IPTAL_MAX_GUN = 92
+
+# Tek istekte rezerve edilebilecek en fazla 30 dakikalık slot
+REZERVASYON_MAX_SLOT = 8
+
+# Aktivite akışı sayfa boyu
+AKTIVITE_SAYFA = 30
+AKTIVITE_MAX_SAYFA = 100
+
+# Görev listesi sayfalama
+GOREV_DURUMLARI = ('bekliyor', 'yapildi_iddia', 'tamamlandi')
+GOREV_ACIK_DURUMLAR = ('bekliyor', 'yapildi_iddia')  # ?durum verilmezse; tamamlananlar istenince
+GOREV_SAYFA = 50
+GOREV_MAX_SAYFA = 200
+
+# Dışa aktarma: sunucu tarafı cursor'dan bir seferde okunan satır, worker başına eşzamanlı aktarım
+DISA_AKTARIM_PARCA = int(os.environ.get('DISA_AKTARIM_PARCA', '2000'))
+DISA_AKTARIM_MAX_ESZAMANLI = int(os.environ.get('DISA_AKTARIM_MAX_ESZAMANLI', '2'))
+
+# Saklama süreleri (ay): bu kadar eski bölümler özetlendikten sonra düşürülür
+REZERVASYON_SAKLAMA_AY = max(int(os.environ.get('REZERVASYON_SAKLAMA_AY', '24')), 1)
+AKTIVITE_SAKLAMA_AY = max(int(os.environ.get('AKTIVITE_SAKLAMA_AY', '6')), 1)
+GIRIS_SAKLAMA_AY = max(int(os.environ.get('GIRIS_SAKLAMA_AY', '3')), 1)
+
+def yeni_baglanti():
+    """Havuzdan bağımsız, çıplak bir PostgreSQL bağlantısı aç"""
     parsed = urlparse(DATABASE_URL)
-    conn = pg8000.native.Connection(
+    return pg8000.native.Connection(
         user=parsed.username,
         password=parsed.password,
         host=parsed.hostname,
         port=parsed.port or 5432,
         database=parsed.path[1:]
     )
-    return conn
 
-def init_db():
+class HavuzBaglantisi:
+    """Havuzdan ödünç alınmış bağlantı. close() bağlantıyı kapatmaz, havuza iade eder."""
+
+    def __init__(self, havuz, conn):
+        self._havuz = havuz
+        self._conn = conn
+        self.olusturma = time.monotonic()
+        self.son_kullanim = self.olusturma
+        self.kullanim = 0
+        self.bozuk = False
+        self.istek_kapsamli = False
+        self.olcum = None  # istek içindeyse IstekOlcumu
+
+    def run(self, sql, **params):
+        baslangic = time.perf_counter()
+        sonuc = None
+        try:
+            sonuc = self._conn.run(sql, **params)
+            return sonuc
+        except pg8000.native.InterfaceError:
+            # Soket koptu, bu bağlantı bir daha kullanılmamalı
+            self.bozuk = True
+            raise
+        finally:
+            sure = time.perf_counter() - baslangic
+            if self.olcum is not None:
+                self.olcum.kaydet(sure, len(sonuc) if sonuc else 0)
+            if sure >= YAVAS_SORGU_ESIGI:
+                yavas_sorgular.kaydet(sql, params, sure)
+
+    @property
+    def row_count(self):
+        return self._conn.row_count
+
+    def close(self):
+        # İstek boyunca paylaşılan bağlantı teardown'da iade edilir
+        if not self.istek_kapsamli:
+            self.birak()
+
+    def birak(self):
+        self._havuz.birak(self)
+
+class BaglantiHavuzu:
+    """Worker başına PostgreSQL bağlantı havuzu"""
+
+    def __init__(self, min_boyut, max_boyut, bekleme, max_kullanim, max_omur, bosta_kontrol):
+        self.min_boyut = min_boyut
+        self.max_boyut = max_boyut
+        self.bekleme = bekleme
+        self.max_kullanim = max_kullanim
+        self.max_omur = max_omur
+        self.bosta_kontrol = bosta_kontrol
+        self._kosul = threading.Condition()
+        self._sifirla()
+
+    def _sifirla(self):
+        # Fork sonrası ebeveynden gelen soketler paylaşılmamalı
+        self._pid = os.getpid()
+        self._bosta = []
+        self._toplam = 0
+        self.acilan = 0
+        self.kapatilan = 0
+        self.bekleyen = 0
+
+    def _kapat(self, hb):
+        self._toplam -= 1
+        self.kapatilan += 1
+        self._soketi_kapat(hb)
+
+    @staticmethod
+    def _soketi_kapat(hb):
+        try:
+            hb._conn.close()
+        except Exception:
+            pass
+
+    def _eskimis_mi(self, hb):
+        return (hb.kullanim >= self.max_kullanim or
+                time.monotonic() - hb.olusturma >= self.max_omur)
+
+    def _canli_mi(self, hb):
+        if time.monotonic() - hb.son_kullanim < self.bosta_kontrol:
+            return True
+        try:
+            hb._conn.run('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def al(self):
+        bitis = time.monotonic() + self.bekleme
+        while True:
+            hb = None
+            with self._kosul:
+                if self._pid != os.getpid():
+                    self._sifirla()
+                while not self._bosta:
+                    if self._toplam < self.max_boyut:
+                        self._toplam += 1
+                        break
+                    kalan = bitis - time.monotonic()
+                    if kalan <= 0:
+                        raise TimeoutError(f'{self.bekleme:g} saniyede boş veritabanı bağlantısı bulunamadı')
+                    self.bekleyen += 1
+                    try:
+                        self._kosul.wait(kalan)
+                    finally:
+                        self.bekleyen -= 1
+                else:
+                    hb = self._bosta.pop()
+            if hb is None:
+                break
+            # Bağlantı artık bu thread'in; SELECT 1 ve soket kapatma kilit dışında, diğer thread'ler beklemesin
+            if not self._eskimis_mi(hb) and self._canli_mi(hb):
+                return self._odunc_ver(hb)
+            with self._kosul:
+                self._toplam -= 1
+                self.kapatilan += 1
+                self._kosul.notify()
+            self._soketi_kapat(hb)
+        # Yeni bağlantıyı kilit dışında aç, ağ el sıkışması diğer thread'leri bekletmesin
+        try:
+            conn = yeni_baglanti()
+        except Exception:
+            with self._kosul:
+                self._toplam -= 1
+                self._kosul.notify()
+            raise
+        with self._kosul:
+            self.acilan += 1
+            return self._odunc_ver(HavuzBaglantisi(self, conn))
+
+    def _odunc_ver(self, hb):
+        hb.kullanim += 1
+        hb.istek_kapsamli = False
+        hb.olcum = None
+        return hb
+
+    def birak(self, hb):
+        if not hb.bozuk:
+            try:
+                # Yarım kalmış transaction'ı bir sonraki kullanıcıya taşıma
+                if hb._conn._transaction_status != pg8000.core.IDLE:
+                    hb._conn.run('ROLLBACK')
+            except Exception:
+                hb.bozuk = True
+        with self._kosul:
+            if self._pid != os.getpid():
+                return
+            hb.son_kullanim = time.monotonic()
+            if hb.bozuk or self._eskimis_mi(hb):
+                self._kapat(hb)
+            else:
+                self._bosta.append(hb)
+            self._kosul.notify()
+        if self._toplam < self.min_boyut:
+            self.doldur()
+
+    def doldur(self):
+        """Havuzu minimum boyuta kadar önceden doldur"""
+        while True:
+            with self._kosul:
+                if self._toplam >= self.min_boyut:
+                    return
+                self._toplam += 1
+            try:
+                conn = yeni_baglanti()
+            except Exception:
+                with self._kosul:
+                    self._toplam -= 1
+                return
+            with self._kosul:
+                self.acilan += 1
+                self._bosta.append(HavuzBaglantisi(self, conn))
+                self._kosul.notify()
+
+    def istatistik(self):
+        with self._kosul:
+            return {
+                'toplam': self._toplam,
+                'bosta': len(self._bosta),
+                'kullanimda': self._toplam - len(self._bosta),
+                'bekleyen': self.bekleyen,
+                'acilan': self.acilan,
+                'kapatilan': self.kapatilan,
+            }
+
+havuz = BaglantiHavuzu(DB_HAVUZ_MIN, DB_HAVUZ_MAX, DB_HAVUZ_BEKLEME,
+                       DB_BAGLANTI_MAX_KULLANIM, DB_BAGLANTI_MAX_OMUR, DB_BOSTA_KONTROL)
+
+def get_db():
+    """Havuzdan bağlantı al. Bir istek içindeki tüm çağrılar aynı bağlantıyı paylaşır."""
+    if has_request_context():
+        conn = g.get('_db')
+        if conn is None:
+            olcum = g.get('_olcum')
+            baslangic = time.perf_counter()
+            conn = g._db = havuz.al()
+            conn.istek_kapsamli = True
+            if olcum is not None:
+                olcum.baglanti += time.perf_counter() - baslangic
+                conn.olcum = olcum
+        return conn
+    return havuz.al()
+
+@app.teardown_request
+def db_baglantisini_birak(hata=None):
+    conn = g.pop('_db', None)
+    if conn is not None:
+        conn.birak()
+
+# ==================== ÖLÇÜM: SERVER-TIMING & PROMETHEUS ====================
+#
+# Her istekte havuzdan bağlantı alma süresi, ifade sayısı, ifade süreleri ve dönen satırlar
+# toplanır; yanıtta Server-Timing başlığı olarak döner ve /metrics'te Prometheus metin
+# biçiminde rota bazında birikir. Gunicorn'da her worker'ın sayaçları ayrıdır: METRIK_DIZINI
+# verilirse worker'lar anlık görüntülerini oraya yazar ve /metrics hepsini birleştirir
+# (dizin deploy'da boşaltılmalı).
+
+METRIK_DIZINI = os.environ.get('METRIK_DIZINI', '')
+METRIK_TOKEN = os.environ.get('METRIK_TOKEN', '')  # verilirse /metrics "Authorization: Bearer" ister
+METRIK_YAZMA_ARALIGI = 5  # saniye
+SURE_KOVALARI = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class IstekOlcumu:
+    """Tek isteğin veritabanı ölçümleri; HavuzBaglantisi.run her ifadede doldurur"""
+    __slots__ = ('baslangic', 'baglanti', 'ifade', 'sure', 'satir', 'ifade_sureleri')
+
+    def __init__(self):
+        self.baslangic = time.perf_counter()
+        self.baglanti = 0.0
+        self.ifade = 0
+        self.sure = 0.0
+        self.satir = 0
+        self.ifade_sureleri = []
+
+    def kaydet(self, sure, satir):
+        self.ifade += 1
+        self.sure += sure
+        self.satir += satir
+        self.ifade_sureleri.append(sure)
+
+def histogram():
+    # Kova başına (kümülatif olmayan) sayılar + son eleman +Inf
+    return {'kovalar': [0] * (len(SURE_KOVALARI) + 1), 'toplam': 0.0, 'sayi': 0}
+
+def histograma_ekle(h, deger):
+    h['kovalar'][bisect.bisect_left(SURE_KOVALARI, deger)] += 1
+    h['toplam'] += deger
+    h['sayi'] += 1
+
+class Metrikler:
+    """Worker içi rota metrikleri. İstek başına bir kez kilit alınır, ifade başına alınmaz."""
+
+    def __init__(self):
+        self._kilit = threading.Lock()
+        self._son_yazma = 0.0
+        self._sifirla()
+
+    def _sifirla(self):
+        self._pid = os.getpid()
+        self.rotalar = {}
+        self.ifade_suresi = histogram()
+        self.baglanti_bekleme = histogram()
+
+    def kaydet(self, anahtar, sure, olcum, durum):
+        with self._kilit:
+            if self._pid != os.getpid():
+                self._sifirla()
+            rota = self.rotalar.get(anahtar)
+            if rota is None:
+                rota = self.rotalar[anahtar] = {'istek': histogram(), 'hata': 0, 'ifade': 0,
+                                                'db_sure': 0.0, 'satir': 0, 'baglanti': 0.0}
+            histograma_ekle(rota['istek'], sure)
+            if durum >= 500:
+                rota['hata'] += 1
+            rota['ifade'] += olcum.ifade
+            rota['db_sure'] += olcum.sure
+            rota['satir'] += olcum.satir
+            rota['baglanti'] += olcum.baglanti
+            if olcum.ifade:
+                histograma_ekle(self.baglanti_bekleme, olcum.baglanti)
+            for ifade_suresi in olcum.ifade_sureleri:
+                histograma_ekle(self.ifade_suresi, ifade_suresi)
+
+    def anlik(self):
+        """JSON'a yazılabilir anlık görüntü: birikmiş sayaçlar + bu worker'ın göstergeleri"""
+        with self._kilit:
+            sayaclar = json.loads(json.dumps({
+                'rotalar': self.rotalar,
+                'ifade_suresi': self.ifade_suresi,
+                'baglanti_bekleme': self.baglanti_bekleme,
+            }))
+        sayaclar['yazicilar'] = {isim: y.sayaclar() for isim, y in yazicilar.items()}
+        havuz_durumu = havuz.istatistik()
+        onbellek_durumu = {isim: o.istatistik() for isim, o in onbellekler.items()}
+        # Worker ömrü boyunca yalnızca artanlar sayaçlara: ölen worker'ınki birleştirmede korunur
+        sayaclar['havuz'] = {k: havuz_durumu[k] for k in ('acilan', 'kapatilan')}
+        sayaclar['onbellek'] = {isim: {k: o[k] for k in ('isabet', 'iska')} for isim, o in onbellek_durumu.items()}
+        gostergeler = {'havuz': havuz_durumu,
+                       'onbellek': onbellek_durumu,
+                       'sse_istemci': olaylar.istemci_sayisi(),
+                       'dinleyici_bagli': int(dinleyici.bagli),
+                       'yazici_kuyruk': {isim: {'derinlik': y.derinlik(), 'kapasite': y.kapasite}
+                                         for isim, y in yazicilar.items()}}
+        return {'pid': os.getpid(), 'sayaclar': sayaclar, 'gostergeler': gostergeler}
+
+    def belki_yaz(self):
+        """METRIK_DIZINI varsa anlık görüntüyü en fazla METRIK_YAZMA_ARALIGI'nda bir yaz"""
+        simdi = time.monotonic()
+        if not METRIK_DIZINI or simdi - self._son_yazma < METRIK_YAZMA_ARALIGI:
+            return
+        self._son_yazma = simdi
+        self.yaz()
+
+    def yaz(self):
+        try:
+            yol = os.path.join(METRIK_DIZINI, f'{os.getpid()}.json')
+            with open(yol + '.tmp', 'w') as f:
+                json.dump(self.anlik(), f)
+            os.replace(yol + '.tmp', yol)
+        except OSError as e:
+            print(f"Metrik yazma hatası: {e}")
+
+def _canli_mi(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def _topla(hedef, kaynak):
+    # Aynı şekilli iç içe sözlük/listeleri sayısal olarak topla
+    for anahtar, deger in kaynak.items():
+        if isinstance(deger, dict):
+            _topla(hedef.setdefault(anahtar, {}), deger)
+        elif isinstance(deger, list):
+            mevcut = hedef.setdefault(anahtar, [0] * len(deger))
+            for i, v in enumerate(deger):
+                mevcut[i] += v
+        elif isinstance(deger, (int, float)):
+            hedef[anahtar] = hedef.get(anahtar, 0) + deger
+
+def metrikleri_birlestir():
+    """Bu worker'ın ve METRIK_DIZINI'ndeki diğer worker'ların metrikleri.
+    Ölmüş worker'ların sayaçları korunur (sayaçlar geri gitmesin), göstergeleri atlanır."""
+    kendi = metrikler.anlik()
+    if not METRIK_DIZINI:
+        return kendi['sayaclar'], kendi['gostergeler'], 1
+    metrikler.yaz()
+    sayaclar, gostergeler, canli = {}, {}, 0
+    for dosya in os.listdir(METRIK_DIZINI):
+        if not dosya.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRIK_DIZINI, dosya)) as f:
+                veri = json.load(f)
+        except (OSError, ValueError):
+            continue
+        _topla(sayaclar, veri['sayaclar'])
+        if _canli_mi(veri['pid']):
+            _topla(gostergeler, veri['gostergeler'])
+            canli += 1
+    return sayaclar, gostergeler, canli
+
+def _etiket(deger):
+    return str(deger).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_metni():
+    sayaclar, gostergeler, worker_sayisi = metrikleri_birlestir()
+    satirlar = []
+
+    def baslik(isim, tip, aciklama):
+        satirlar.append(f'# HELP {isim} {aciklama}')
+        satirlar.append(f'# TYPE {isim} {tip}')
+
+    def histogram_satirlari(isim, h, etiketler=''):
+        kumulatif = 0
+        for sinir, sayi in zip(SURE_KOVALARI + ('+Inf',), h['kovalar']):
+            kumulatif += sayi
+            satirlar.append(f'{isim}_bucket{{{etiketler}le="{sinir}"}} {kumulatif}')
+        etiketler = etiketler.rstrip(',')
+        satirlar.append(f'{isim}_sum{{{etiketler}}} {h["toplam"]:.6f}' if etiketler else f'{isim}_sum {h["toplam"]:.6f}')
+        satirlar.append(f'{isim}_count{{{etiketler}}} {h["sayi"]}' if etiketler else f'{isim}_count {h["sayi"]}')
+
+    rotalar = sorted(sayaclar.get('rotalar', {}).items())
+
+    def rota_etiketi(anahtar):
+        metod, _, rota = anahtar.partition(' ')
+        return f'rota="{_etiket(rota)}",metod="{metod}"'
+
+    baslik('studyo_http_istek_suresi_saniye', 'histogram', 'Rota bazında istek süresi')
+    for anahtar, r in rotalar:
+        histogram_satirlari('studyo_http_istek_suresi_saniye', r['istek'], rota_etiketi(anahtar) + ',')
+    for isim, alan, aciklama in (
+        ('studyo_http_hata_toplam', 'hata', '5xx yanıt sayısı'),
+        ('studyo_db_ifade_toplam', 'ifade', 'Çalıştırılan SQL ifadesi'),
+        ('studyo_db_sure_saniye_toplam', 'db_sure', 'SQL ifadelerinde geçen süre'),
+        ('studyo_db_satir_toplam', 'satir', 'SQL ifadelerinin döndürdüğü satır'),
+        ('studyo_db_baglanti_saniye_toplam', 'baglanti', 'Havuzdan bağlantı alma süresi'),
+    ):
+        baslik(isim, 'counter', aciklama)
+        for anahtar, r in rotalar:
+            deger = r[alan]
+            satirlar.append(f'{isim}{{{rota_etiketi(anahtar)}}} {deger:.6f}' if isinstance(deger, float)
+                            else f'{isim}{{{rota_etiketi(anahtar)}}} {deger}')
+
+    baslik('studyo_db_ifade_suresi_saniye', 'histogram', 'Tek SQL ifadesinin süresi')
+    histogram_satirlari('studyo_db_ifade_suresi_saniye', sayaclar.get('ifade_suresi') or histogram())
+    baslik('studyo_db_baglanti_bekleme_saniye', 'histogram', 'İstek başına havuzdan bağlantı alma süresi')
+    histogram_satirlari('studyo_db_baglanti_bekleme_saniye', sayaclar.get('baglanti_bekleme') or histogram())
+
+    havuz_durumu = gostergeler.get('havuz', {})
+    baslik('studyo_havuz_baglanti', 'gauge', 'Havuzdaki bağlantılar (tüm canlı worker\'lar)')
+    for durum in ('toplam', 'bosta', 'kullanimda', 'bekleyen'):
+        satirlar.append(f'studyo_havuz_baglanti{{durum="{durum}"}} {havuz_durumu.get(durum, 0)}')
+    havuz_sayaclari = sayaclar.get('havuz', {})
+    baslik('studyo_havuz_acilan_toplam', 'counter', 'Açılan fiziksel bağlantı')
+    satirlar.append(f'studyo_havuz_acilan_toplam {havuz_sayaclari.get("acilan", 0)}')
+    baslik('studyo_havuz_kapatilan_toplam', 'counter', 'Kapatılan fiziksel bağlantı')
+    satirlar.append(f'studyo_havuz_kapatilan_toplam {havuz_sayaclari.get("kapatilan", 0)}')
+
+    onbellek = sorted(sayaclar.get('onbellek', {}).items())
+    for isim, alan, aciklama in (
+        ('studyo_onbellek_isabet_toplam', 'isabet', 'Önbellek isabeti'),
+        ('studyo_onbellek_iska_toplam', 'iska', 'Önbellek ıskası'),
+    ):
+        baslik(isim, 'counter', aciklama)
+        for onbellek_isim, o in onbellek:
+            satirlar.append(f'{isim}{{onbellek="{_etiket(onbellek_isim)}"}} {o.get(alan, 0)}')
+    baslik('studyo_onbellek_boyut', 'gauge', 'Önbellekteki kayıt (tüm canlı worker\'lar)')
+    for onbellek_isim, o in sorted(gostergeler.get('onbellek', {}).items()):
+        satirlar.append(f'studyo_onbellek_boyut{{onbellek="{_etiket(onbellek_isim)}"}} {o.get("boyut", 0)}')
+    baslik('studyo_onbellek_isabet_orani', 'gauge', 'Önbellek isabet oranı')
+    for onbellek_isim, o in onbellek:
+        toplam = o.get('isabet', 0) + o.get('iska', 0)
+        satirlar.append(f'studyo_onbellek_isabet_orani{{onbellek="{_etiket(onbellek_isim)}"}} '
+                        f'{(o.get("isabet", 0) / toplam) if toplam else 0:.4f}')
+
+    baslik('studyo_sse_istemci', 'gauge', 'Bağlı SSE istemcisi')
+    satirlar.append(f'studyo_sse_istemci {gostergeler.get("sse_istemci", 0)}')
+    baslik('studyo_dinleyici_bagli', 'gauge', 'LISTEN bağlantısı açık worker sayısı')
+    satirlar.append(f'studyo_dinleyici_bagli {gostergeler.get("dinleyici_bagli", 0)}')
+
+    yazici_sayaclari = sorted(sayaclar.get('yazicilar', {}).items())
+    for isim, alan, aciklama in (
+        ('studyo_yazici_kayit_toplam', 'kayit', 'Arka planda yazılan denetim kaydı'),
+        ('studyo_yazici_parti_toplam', 'parti', 'Çok satırlı INSERT sayısı'),
+        ('studyo_yazici_eszamanli_toplam', 'esz_yazma', 'Kuyruk dolu olduğu için istek içinde yazılan kayıt'),
+        ('studyo_yazici_hata_toplam', 'hata', 'Başarısız yazma denemesi (parti)'),
+        ('studyo_yazici_dusen_toplam', 'dusen', 'Tüm denemelerden sonra yazılamayıp düşürülen kayıt'),
+    ):
+        baslik(isim, 'counter', aciklama)
+        for yazici, y in yazici_sayaclari:
+            satirlar.append(f'{isim}{{yazici="{_etiket(yazici)}"}} {y.get(alan, 0)}')
+    baslik('studyo_yazici_yazma_suresi_saniye', 'histogram', 'Bir partinin yazılma süresi (bağlantı alma dahil)')
+    for yazici, y in yazici_sayaclari:
+        histogram_satirlari('studyo_yazici_yazma_suresi_saniye', y.get('sure') or histogram(), f'yazici="{_etiket(yazici)}",')
+    for isim, alan, aciklama in (
+        ('studyo_yazici_kuyruk_derinlik', 'derinlik', 'Yazılmayı bekleyen kayıt'),
+        ('studyo_yazici_kuyruk_kapasite', 'kapasite', 'Kuyruk kapasitesi (tüm canlı worker\'lar)'),
+    ):
+        baslik(isim, 'gauge', aciklama)
+        for yazici, y in sorted(gostergeler.get('yazici_kuyruk', {}).items()):
+            satirlar.append(f'{isim}{{yazici="{_etiket(yazici)}"}} {y.get(alan, 0)}')
+    baslik('studyo_worker', 'gauge', 'Metrikleri okunan canlı worker sayısı')
+    satirlar.append(f'studyo_worker {worker_sayisi}')
+    return '\n'.join(satirlar) + '\n'
+
+metrikler = Metrikler()
+
+@app.before_request
+def olcumu_baslat():
+    g._olcum = IstekOlcumu()
+
+@app.after_request
+def olcumu_kaydet(yanit):
+    olcum = g.pop('_olcum', None)
+    if olcum is None:
+        return yanit
+    sure = time.perf_counter() - olcum.baslangic
+    # Başlık değeri latin-1 olmalı, açıklamalar ASCII
+    yanit.headers['Server-Timing'] = (
+        f'db;dur={olcum.sure * 1000:.2f};desc="{olcum.ifade} sorgu/{olcum.satir} satir", '
+        f'db-baglanti;dur={olcum.baglanti * 1000:.2f}, app;dur={sure * 1000:.2f}'
+    )
+    rota = request.url_rule.rule if request.url_rule else 'eslesmeyen'
+    metrikler.kaydet(f'{request.method} {rota}', sure, olcum, yanit.status_code)
+    metrikler.belki_yaz()
+    return yanit
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus kazıma uç noktası"""
+    if METRIK_TOKEN and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRIK_TOKEN}'):
+        return Response('yetkisiz\n', status=401, mimetype='text/plain')
+    return Response(prometheus_metni(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# ==================== SIKIŞTIRMA, ETAG & STATİK DOSYALAR ====================
+#
+# Eşiği aşan metin yanıtları istemci destekliyorsa brotli (paket kuruluysa), değilse gzip ile
+# sıkıştırılır. Akan yanıtlar (SSE, dışa aktarma) ve dosya yanıtları olduğu gibi geçer.
+# Kendi ETag'ini koymayan GET JSON yanıtlarına gövde özetinden zayıf ETag eklenir ve
+# If-None-Match eşleşirse gövdesiz 304 döner. Şablonlar statik dosyaları statik_url() ile
+# içerik özetli adreslerden ister; bu adresler bir yıl boyunca değişmez olarak önbelleğe alınır.
+
+SIKISTIRMA_ESIGI = int(os.environ.get('SIKISTIRMA_ESIGI', '1024'))  # bayt
+GZIP_SEVIYESI = 6
+BROTLI_KALITESI = 5
+SIKISTIRILABILIR_TURLER = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+STATIK_MAX_YAS = 365 * 24 * 3600  # saniye
+
+_statik_ozetler = {}  # dosya -> (mtime, özet)
+
+def statik_ozeti(dosya):
+    """Statik dosyanın içerik özeti; dosya değiştiyse (mtime) yeniden hesaplanır"""
+    yol = os.path.join(app.static_folder, dosya)
+    mtime = os.path.getmtime(yol)
+    kayit = _statik_ozetler.get(dosya)
+    if kayit is None or kayit[0] != mtime:
+        with open(yol, 'rb') as f:
+            kayit = (mtime, sha256(f.read()).hexdigest()[:12])
+        _statik_ozetler[dosya] = kayit
+    return kayit[1]
+
+@app.template_global()
+def statik_url(dosya):
+    """Şablonlar için içerik özetli statik adres: /statik/<özet>/<dosya>"""
+    try:
+        return url_for('statik_dosya', ozet=statik_ozeti(dosya), dosya=dosya)
+    except OSError:
+        return url_for('static', filename=dosya)
+
+@app.route('/statik/<ozet>/<path:dosya>')
+def statik_dosya(ozet, dosya):
+    yanit = send_from_directory(app.static_folder, dosya)
+    if ozet == statik_ozeti(dosya):
+        yanit.headers['Cache-Control'] = f'public, max-age={STATIK_MAX_YAS}, immutable'
+    else:
+        # Eski özetli adres: dosyayı ver ama uzun süre saklatma
+        yanit.headers['Cache-Control'] = 'public, no-cache'
+    return yanit
+
+def sikistirilabilir(yanit):
+    if yanit.status_code != 200 or yanit.is_streamed or yanit.direct_passthrough:
+        return False
+    if 'Content-Encoding' in yanit.headers:
+        return False
+    return (yanit.mimetype or '').startswith(SIKISTIRILABILIR_TURLER)
+
+@app.after_request
+def yaniti_sikistir(yanit):
+    if request.method == 'GET' and yanit.status_code == 200 and yanit.mimetype == 'application/json' \
+            and not yanit.is_streamed and not yanit.headers.get('ETag'):
+        yanit.set_etag(sha256(yanit.get_data()).hexdigest()[:20], weak=True)
+        yanit.headers.setdefault('Cache-Control', 'private, no-cache')
+        if request.if_none_match.contains_weak(yanit.get_etag()[0]):
+            yanit.status_code = 304
+            yanit.set_data(b'')
+            return yanit
+
+    if not sikistirilabilir(yanit):
+        return yanit
+    yanit.vary.add('Accept-Encoding')
+    govde = yanit.get_data()
+    if len(govde) < SIKISTIRMA_ESIGI:
+        return yanit
+    kodlamalar = request.accept_encodings
+    if brotli is not None and kodlamalar['br']:
+        yanit.set_data(brotli.compress(govde, quality=BROTLI_KALITESI))
+        yanit.headers['Content-Encoding'] = 'br'
+    elif kodlamalar['gzip']:
+        yanit.set_data(gzip.compress(govde, compresslevel=GZIP_SEVIYESI, mtime=0))
+        yanit.headers['Content-Encoding'] = 'gzip'
+    else:
+        return yanit
+    # Sıkıştırılmış gövde baytça farklı; güçlü ETag zayıfa çevrilir
+    etag, zayif = yanit.get_etag()
+    if etag and not zayif:
+        yanit.set_etag(etag, weak=True)
+    return yanit
+
+# ==================== YAVAŞ SORGU GÜNLÜĞÜ ====================
+#
+# Eşiği aşan her ifade SQL'i, (telefonları maskelenmiş) parametreleri, rota ve süresiyle
+# worker içi halka tampona yazılır. YAVAS_SORGU_EXPLAIN oranında örneklenen kayıtlar için
+# arka planda EXPLAIN (ANALYZE, BUFFERS) alınır: READ ONLY bir transaction içinde çalıştırılıp
+# geri alınır; yazan ifadelerde (INSERT/UPDATE/DELETE) ANALYZE'sız plana düşülür.
+
+YAVAS_SORGU_ESIGI = float(os.environ.get('YAVAS_SORGU_ESIGI_MS', '200')) / 1000
+YAVAS_SORGU_EXPLAIN = float(os.environ.get('YAVAS_SORGU_EXPLAIN', '0'))  # 0..1 örnekleme oranı
+YAVAS_SORGU_DOSYASI = os.environ.get('YAVAS_SORGU_DOSYASI', '')  # verilirse tüm worker'lar JSON satırı ekler
+YAVAS_SORGU_TAMPON = 200
+YAVAS_SORGU_EXPLAIN_ARALIK = 300  # saniye, aynı SQL için en fazla bu aralıkta bir EXPLAIN
+YAVAS_SORGU_DOSYA_MAX = 5 * 1024 * 1024  # bayt, aşınca .1'e döndürülür
+
+TELEFON_DESENI = re.compile(r'(?<!\d)(\d{3})\d{5,8}(\d{2})(?!\d)')
+HASH_DESENI = re.compile(r'\b[0-9a-f]{64}\b')
+
+def parametre_maskele(deger):
+    """Günlüğe yazılacak parametre: telefonlar ve şifre hash'leri maskelenir, uzunlar kısaltılır"""
+    if isinstance(deger, str):
+        deger = HASH_DESENI.sub('<hash>', TELEFON_DESENI.sub(r'\1*****\2', deger))
+        return deger if len(deger) <= 200 else deger[:200] + '…'
+    if isinstance(deger, (list, tuple)):
+        maskeli = [parametre_maskele(v) for v in deger[:20]]
+        return maskeli + [f'… +{len(deger) - 20}'] if len(deger) > 20 else maskeli
+    if isinstance(deger, (int, float, bool)) or deger is None:
+        return deger
+    return parametre_maskele(str(deger))
+
+class YavasSorguGunlugu:
+    """Eşiği aşan SQL ifadelerinin halka tamponu ve örneklenmiş EXPLAIN planları"""
+
+    def __init__(self, boyut):
+        self._kilit = threading.Lock()
+        self._kayitlar = deque(maxlen=boyut)
+        self._son_explain = {}
+        self._kuyruk = queue.Queue(maxsize=20)
+        self._thread = None
+
+    def kaydet(self, sql, params, sure):
+        if has_request_context():
+            rota = f'{request.method} {request.url_rule.rule}' if request.url_rule else request.path
+        else:
+            rota = f'[{threading.current_thread().name}]'
+        kayit = {
+            'zaman': datetime.now().isoformat(timespec='seconds'),
+            'sure_ms': round(sure * 1000, 1),
+            'rota': rota,
+            'sql': ' '.join(sql.split()),
+            'parametreler': {k: parametre_maskele(v) for k, v in params.items()},
+            'plan': None,
+            'pid': os.getpid(),
+        }
+        with self._kilit:
+            self._kayitlar.append(kayit)
+        if self._explain_alinsin_mi(kayit['sql']):
+            try:
+                self._kuyruk.put_nowait((kayit, sql, params))
+                self._baslat()
+                return
+            except queue.Full:
+                pass
+        self._dosyaya_yaz(kayit)
+
+    def _explain_alinsin_mi(self, sql):
+        if YAVAS_SORGU_EXPLAIN <= 0 or random.random() >= YAVAS_SORGU_EXPLAIN:
+            return False
+        ilk = sql.split(None, 1)[0].upper() if sql else ''
+        # Oturum düzeyinde yan etkisi olanlar (kilit, LISTEN, transaction komutları) hiç tekrar çalıştırılmaz
+        if ilk not in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE') or 'pg_advisory' in sql:
+            return False
+        simdi = time.monotonic()
+        with self._kilit:
+            if simdi - self._son_explain.get(sql, -YAVAS_SORGU_EXPLAIN_ARALIK) < YAVAS_SORGU_EXPLAIN_ARALIK:
+                return False
+            self._son_explain[sql] = simdi
+            if len(self._son_explain) > 1000:
+                self._son_explain.clear()
+        return True
+
+    def _baslat(self):
+        with self._kilit:
+            # Fork sonrası ebeveynin thread'i çocukta canlı görünmez, yeniden başlatılır
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._calis, name='yavas-sorgu-explain', daemon=True)
+                self._thread.start()
+
+    def _calis(self):
+        while True:
+            kayit, sql, params = self._kuyruk.get()
+            try:
+                kayit['plan'] = self._explain(sql, params)
+            except Exception as e:
+                kayit['plan'] = f'EXPLAIN alınamadı: {e}'
+            self._dosyaya_yaz(kayit)
+
+    def _explain(self, sql, params):
+        hb = havuz.al()
+        try:
+            # Ölçüm ve yavaş sorgu kaydı devreye girmesin diye çıplak bağlantı kullanılır
+            conn = hb._conn
+            for secenek in ('ANALYZE, BUFFERS', None):
+                conn.run('BEGIN READ ONLY')
+                try:
+                    conn.run("SET LOCAL statement_timeout = '10s'")
+                    rows = conn.run(f'EXPLAIN ({secenek}) {sql}' if secenek else f'EXPLAIN {sql}', **params)
+                    return '\n'.join(r[0] for r in rows)
+                except pg8000.native.DatabaseError:
+                    if secenek is None:
+                        raise
+                finally:
+                    conn.run('ROLLBACK')
+        finally:
+            hb.birak()
+
+    def _dosyaya_yaz(self, kayit):
+        if not YAVAS_SORGU_DOSYASI:
+            return
+        try:
+            with self._kilit:
+                if os.path.exists(YAVAS_SORGU_DOSYASI) and os.path.getsize(YAVAS_SORGU_DOSYASI) > YAVAS_SORGU_DOSYA_MAX:
+                    os.replace(YAVAS_SORGU_DOSYASI, YAVAS_SORGU_DOSYASI + '.1')
+                with open(YAVAS_SORGU_DOSYASI, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(kayit, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"Yavaş sorgu günlüğü yazılamadı: {e}")
+
+    def son_kayitlar(self, adet):
+        """Dosya varsa tüm worker'lardan, yoksa bu worker'ın tamponundan en yeni kayıtlar"""
+        if YAVAS_SORGU_DOSYASI and os.path.exists(YAVAS_SORGU_DOSYASI):
+            with open(YAVAS_SORGU_DOSYASI, encoding='utf-8') as f:
+                satirlar = deque(f, maxlen=adet)
+            kayitlar = []
+            for satir in satirlar:
+                try:
+                    kayitlar.append(json.loads(satir))
+                except ValueError:
+                    continue
+        else:
+            with self._kilit:
+                kayitlar = [dict(k) for k in list(self._kayitlar)[-adet:]]
+        kayitlar.reverse()
+        return kayitlar
+
+yavas_sorgular = YavasSorguGunlugu(YAVAS_SORGU_TAMPON)
+
+# ==================== DEĞİŞİKLİK BİLDİRİMLERİ & ÖNBELLEK ====================
+
+SLOT_KANALI = 'slot_degisti'
+OLAY_KANALI = 'olay'  # {'tip': 'oy' | 'gorev', ...}
+DINLEYICI_NABIZ = 25  # saniye, bildirim gelmese de bağlantı bu aralıkla yoklanır
+SLOT_ONBELLEK_BOYUT = int(os.environ.get('SLOT_ONBELLEK_BOYUT', '2048'))
+SLOT_ONBELLEK_SURE = int(os.environ.get('SLOT_ONBELLEK_SURE', '300'))  # saniye, emniyet sınırı
+
+class DegisiklikDinleyici:
+    """Worker başına tek LISTEN bağlantısı; gelen bildirimleri kanal abonelerine dağıtır"""
+
+    def __init__(self):
+        self._aboneler = {}
+        self._baglaninca = []
+        self._kopunca = []
+        self._kilit = threading.Lock()
+        self._pid = None
+        self.bagli = False
+
+    def abone_ol(self, kanal, geri_cagir):
+        self._aboneler.setdefault(kanal, []).append(geri_cagir)
+
+    def baglaninca(self, geri_cagir):
+        self._baglaninca.append(geri_cagir)
+
+    def kopunca(self, geri_cagir):
+        self._kopunca.append(geri_cagir)
+
+    def baslat(self):
+        """Bu process için dinleyici thread'i yoksa başlat (fork sonrası da çalışır)"""
+        if self._pid == os.getpid():
+            return
+        with self._kilit:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.bagli = False
+            threading.Thread(target=self._calis, name='degisiklik-dinleyici', daemon=True).start()
+
+    def _dagit(self, kanal, yuk):
+        try:
+            veri = json.loads(yuk) if yuk else {}
+        except ValueError:
+            veri = {}
+        for geri_cagir in self._aboneler.get(kanal, []):
+            try:
+                geri_cagir(veri)
+            except Exception as e:
+                print(f"Bildirim işlenemedi ({kanal}): {e}")
+
+    def _durum_degisti(self, bagli):
+        self.bagli = bagli
+        for geri_cagir in (self._baglaninca if bagli else self._kopunca):
+            geri_cagir()
+
+    def _calis(self):
+        bekleme = 1
+        while True:
+            conn = None
+            try:
+                conn = yeni_baglanti()
+                for kanal in self._aboneler:
+                    conn.run(f'LISTEN {kanal}')
+                self._durum_degisti(True)
+                bekleme = 1
+                while True:
+                    # pg8000 bildirimleri ancak sunucudan mesaj okurken işler;
+                    # soket okunabilir olunca (ya da nabız süresinde) boş bir sorguyla boşalt
+                    select.select([conn._usock], [], [], DINLEYICI_NABIZ)
+                    conn.run('SELECT 1')
+                    while conn.notifications:
+                        _, kanal, yuk = conn.notifications.popleft()
+                        self._dagit(kanal, yuk)
+            except Exception as e:
+                print(f"Dinleyici bağlantısı koptu: {e}")
+                if self.bagli:
+                    self._durum_degisti(False)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                time.sleep(bekleme)
+                bekleme = min(bekleme * 2, 60)
+
+def bildir(conn, kanal, veri):
+    """Tüm worker'lara NOTIFY gönder (transaction içindeyse commit ile gider)"""
+    conn.run('SELECT pg_notify(:p1, :p2)', p1=kanal, p2=json.dumps(veri))
+
+class Onbellek:
+    """Worker içi LRU önbellek; süre sınırlı, isabet/ıska sayaçlı
+
+    Yalnızca dinleyici bağlıyken kullanılır; bağlantı yokken başka worker'ların
+    yaptığı değişiklikler kaçırılabileceği için her okuma veritabanına gider.
+    """
+
+    def __init__(self, boyut, sure):
+        self.boyut = boyut
+        self.sure = sure
+        self.aktif = False
+        self._kayitlar = OrderedDict()
+        self._kilit = threading.Lock()
+        self._nesil = 0
+        self.isabet = 0
+        self.iska = 0
+        self.cikarilan = 0
+        self.gecersiz = 0
+
+    def al(self, anahtar):
+        with self._kilit:
+            kayit = self._kayitlar.get(anahtar) if self.aktif else None
+            if kayit is not None and time.monotonic() - kayit[1] > self.sure:
+                del self._kayitlar[anahtar]
+                kayit = None
+            if kayit is None:
+                self.iska += 1
+                return None
+            self._kayitlar.move_to_end(anahtar)
+            self.isabet += 1
+            return kayit[0]
+
+    def nesil(self):
+        return self._nesil
+
+    def koy(self, anahtar, deger, nesil):
+        """Değeri sakla; okuma sırasında bir geçersiz kılma olduysa saklamadan döndür"""
+        with self._kilit:
+            if self.aktif and nesil == self._nesil:
+                self._kayitlar[anahtar] = (deger, time.monotonic())
+                self._kayitlar.move_to_end(anahtar)
+                while len(self._kayitlar) > self.boyut:
+                    self._kayitlar.popitem(last=False)
+                    self.cikarilan += 1
+        return deger
+
+    def gecersiz_kil(self, anahtarlar=None, kosul=None):
+        """Verilen anahtarları ya da kosul(anahtar) doğru olanları sil"""
+        with self._kilit:
+            self._nesil += 1
+            if kosul is not None:
+                anahtarlar = [a for a in self._kayitlar if kosul(a)]
+            for anahtar in anahtarlar or ():
+                if self._kayitlar.pop(anahtar, None) is not None:
+                    self.gecersiz += 1
+
+    def temizle(self):
+        with self._kilit:
+            self._nesil += 1
+            self._kayitlar.clear()
+
+    def istatistik(self):
+        with self._kilit:
+            toplam = self.isabet + self.iska
+            return {
+                'aktif': self.aktif,
+                'boyut': len(self._kayitlar),
+                'isabet': self.isabet,
+                'iska': self.iska,
+                'isabet_orani': round(self.isabet / toplam, 3) if toplam else 0.0,
+                'cikarilan': self.cikarilan,
+                'gecersiz': self.gecersiz,
+            }
+
+dinleyici = DegisiklikDinleyici()
+onbellekler = {}
+
+def onbellek_olustur(isim, boyut, sure):
+    """Dinleyiciye bağlı önbellek: bağlantı kurulunca açılır, koparsa kapanır"""
+    onbellek = onbellekler[isim] = Onbellek(boyut, sure)
+    return onbellek
+
+def _onbellekleri_ac():
+    for onbellek in onbellekler.values():
+        onbellek.temizle()
+        onbellek.aktif = True
+
+def _onbellekleri_kapat():
+    for onbellek in onbellekler.values():
+        onbellek.aktif = False
+        onbellek.temizle()
+
+dinleyici.baglaninca(_onbellekleri_ac)
+dinleyici.kopunca(_onbellekleri_kapat)
+
+# (studyo, alan, tarih) -> {'satirlar': {saat: rezervasyon}, 'surum': içerik özeti}
+slot_onbellek = onbellek_olustur('slot', SLOT_ONBELLEK_BOYUT, SLOT_ONBELLEK_SURE)
+
+def slot_onbellegini_temizle(studyo, alan, tarihler=None):
+    """tarihler None ise o alanın tüm günleri"""
+    if tarihler is None:
+        slot_onbellek.gecersiz_kil(kosul=lambda a: a[0] == studyo and a[1] == alan)
+    else:
+        slot_onbellek.gecersiz_kil([(studyo, alan, t) for t in tarihler])
+
+dinleyici.abone_ol(SLOT_KANALI, lambda veri: slot_onbellegini_temizle(veri.get('studyo'), veri.get('alan'), veri.get('tarihler')))
+
+# (lokasyon, pratik_tarih) -> pratik_ozetleri() çıktısı; pratik_oyla 'oy' olayıyla geçersiz kılar
+pratik_onbellek = onbellek_olustur('pratik', 32, 24 * 3600)
+
+def _pratik_olayi(veri):
+    if veri.get('tip') == 'oy':
+        pratik_onbellek.gecersiz_kil([(veri.get('lokasyon'), veri.get('pratik_tarih'))])
+
+dinleyici.abone_ol(OLAY_KANALI, _pratik_olayi)
+
+# Aktivite akışı: süzgeç başına ilk sayfa ve bilinen en yeni id; yeni aktivite bildirimiyle
+# temizlenir. Yoklamalar (after_id) bilinen son id'yi zaten görmüşse veritabanına gitmeden boş döner.
+aktivite_onbellek = onbellek_olustur('aktivite', 64, 300)
+
+def _aktivite_olayi(veri):
+    # Aktiviteler arka planda yazılır; yazıcı her partiden sonra bildirir
+    if veri.get('tip') == 'aktivite':
+        aktivite_onbellek.temizle()
+
+dinleyici.abone_ol(OLAY_KANALI, _aktivite_olayi)
+
+def benzersizlik_ihlali_mi(e):
+    """pg8000 hatası UNIQUE kısıtı ihlali (23505) mi?"""
+    return bool(e.args) and isinstance(e.args[0], dict) and e.args[0].get('C') == '23505'
+
+def slot_yuku(studyo, alan, tarihler=None, islem=None, telefon=None):
+    """SLOT_KANALI bildirim gövdesi (SQL içinden pg_notify ile gönderilecekse)"""
+    return json.dumps({'studyo': studyo, 'alan': alan, 'tarihler': tarihler, 'islem': islem, 'telefon': telefon})
+
+def slot_degisti(conn, studyo, alan, tarihler=None, islem=None, telefon=None):
+    """Yazma sonrası: yerel önbelleği hemen, diğer worker'larınkini NOTIFY ile geçersiz kıl.
+    telefon, rezervasyonu değişen kullanıcıdır (kişisel önbellekler için)."""
+    slot_onbellegini_temizle(studyo, alan, tarihler)
+    bildir(conn, SLOT_KANALI, {'studyo': studyo, 'alan': alan, 'tarihler': tarihler, 'islem': islem, 'telefon': telefon})
+
+def olay_bildir(conn, tip, **veri):
+    """Slot dışı değişiklikleri (oy, görev) SSE istemcilerine duyur"""
+    veri['tip'] = tip
+    bildir(conn, OLAY_KANALI, veri)
+
+# ==================== SSE OLAY AKIŞI ====================
+
+SSE_TIPLERI = ('slot', 'aktivite', 'oy', 'gorev')
+SSE_NABIZ = 15  # saniye
+SSE_MAX_SURE = 300  # saniye; sonra tarayıcı Last-Event-ID ile yeniden bağlanır
+SSE_GECMIS = 500
+SSE_KUYRUK = 256
+
+class OlayYayini:
+    """Dinleyiciden gelen olayları bu worker'daki tüm SSE istemcilerine dağıtır.
+
+    Olay kimlikleri '<worker önek>-<sıra>' biçimindedir. Last-Event-ID bu worker'a
+    aitse ve geçmiş tamponda duruyorsa kaçırılanlar tekrar gönderilir; değilse
+    istemciye 'yenile' gider ve ekranı baştan yükler.
+    """
+
+    def __init__(self, gecmis, kuyruk_boyutu):
+        self._kilit = threading.Lock()
+        self._gecmis = deque(maxlen=gecmis)
+        self._aboneler = set()
+        self._kuyruk_boyutu = kuyruk_boyutu
+        self._token = secrets.token_hex(3)
+        self._sira = 0
+
+    def _onek(self):
+        return f'{os.getpid():x}{self._token}'
+
+    def son_id(self):
+        with self._kilit:
+            return f'{self._onek()}-{self._sira}'
+
+    def yayinla(self, tip, veri):
+        with self._kilit:
+            self._sira += 1
+            olay = (self._sira, f'{self._onek()}-{self._sira}', tip, veri)
+            self._gecmis.append(olay)
+            for kuyruk in self._aboneler:
+                try:
+                    kuyruk.put_nowait(olay)
+                except queue.Full:
+                    # Yavaş istemci: kuyruğu boşaltıp 'yenile' göndereceğiz
+                    kuyruk.tasti = True
+
+    def abone_ol(self, son_id=None):
+        """(kuyruk, kaçırılan olaylar) döner; kaçırılanlar bilinmiyorsa None"""
+        kuyruk = queue.Queue(maxsize=self._kuyruk_boyutu)
+        kuyruk.tasti = False
+        with self._kilit:
+            self._aboneler.add(kuyruk)
+            if not son_id:
+                return kuyruk, []
+            onek, _, sira = son_id.rpartition('-')
+            if onek != self._onek() or not sira.isdigit():
+                return kuyruk, None
+            sira = int(sira)
+            ilk = self._gecmis[0][0] if self._gecmis else self._sira + 1
+            if sira + 1 < ilk or sira > self._sira:
+                return kuyruk, None
+            return kuyruk, [olay for olay in self._gecmis if olay[0] > sira]
+
+    def abonelikten_cik(self, kuyruk):
+        with self._kilit:
+            self._aboneler.discard(kuyruk)
+
+    def istemci_sayisi(self):
+        with self._kilit:
+            return len(self._aboneler)
+
+olaylar = OlayYayini(SSE_GECMIS, SSE_KUYRUK)
+
+# Bildirimlerde worker'lar arası kullanılan, tarayıcılara gitmemesi gereken alanlar
+SSE_GIZLI_ALANLAR = ('telefon', 'telefonlar', 'token')
+
+def _slot_olayi(veri):
+    veri = {k: v for k, v in veri.items() if k not in SSE_GIZLI_ALANLAR}
+    olaylar.yayinla('slot', veri)
+
+def _genel_olay(veri):
+    veri = {k: v for k, v in veri.items() if k not in SSE_GIZLI_ALANLAR}
+    tip = veri.pop('tip', None)
+    if tip:
+        olaylar.yayinla(tip, veri)
+
+dinleyici.abone_ol(SLOT_KANALI, _slot_olayi)
+dinleyici.abone_ol(OLAY_KANALI, _genel_olay)
+# Dinleyici yeniden bağlandıysa aradaki bildirimler kaçmış olabilir
+dinleyici.baglaninca(lambda: olaylar.yayinla('yenile', {}))
+
+def sse_mesaji(olay_id, tip, veri):
+    return f'id: {olay_id}\nevent: {tip}\ndata: {json.dumps(veri, ensure_ascii=False)}\n\n'
+
+def slot_kayitlari(studyo, alanlar, baslangic, bitis):
+    """(alan, tarih) -> önbellek kaydı. Eksik gün varsa tüm aralık tek sorguyla doldurulur.
+    Önbellekte yalnızca somut satırlar durur; tekrarlayan kurallar dönüşte eklenir."""
+    gunler = [baslangic + timedelta(days=i) for i in range((bitis - baslangic).days + 1)]
+    sonuc = {}
+    for alan in alanlar:
+        for tarih in gunler:
+            kayit = slot_onbellek.al((studyo, alan, tarih.isoformat()))
+            if kayit is not None:
+                sonuc[(alan, tarih)] = kayit
+    if len(sonuc) == len(alanlar) * len(gunler):
+        return {(alan, tarih): kurallari_uygula(studyo, alan, tarih, kayit) for (alan, tarih), kayit in sonuc.items()}
+    
+    nesil = slot_onbellek.nesil()
     conn = get_db()
-    conn.run('''
+    rows = conn.run('''
+        SELECT alan, tarih, saat, rezerve_eden, telefon, bloklu FROM rezervasyonlar
+        WHERE studyo = :p1 AND tarih BETWEEN :p2 AND :p3 AND alan = ANY(CAST(:p4 AS text[]))
+    ''', p1=studyo, p2=baslangic.isoformat(), p3=bitis.isoformat(), p4=list(alanlar))
+    conn.close()
+    
+    gruplu = {}
+    for row in rows:
+        gruplu.setdefault((row[0], row[1]), {})[row[2]] = {'rezerve_eden': row[3], 'telefon': row[4], 'bloklu': row[5]}
+    for alan in alanlar:
+        for tarih in gunler:
+            if (alan, tarih) not in sonuc:
+                satirlar = gruplu.get((alan, tarih), {})
+                kayit = {'satirlar': satirlar, 'surum': sha256(repr(sorted(satirlar.items())).encode()).hexdigest()[:16]}
+                sonuc[(alan, tarih)] = slot_onbellek.koy((studyo, alan, tarih.isoformat()), kayit, nesil)
+    return {(alan, tarih): kurallari_uygula(studyo, alan, tarih, kayit) for (alan, tarih), kayit in sonuc.items()}
+
+def kosullu_json(veri, *surum_parcalari):
+    """Zayıf ETag'li JSON yanıtı; If-None-Match eşleşirse gövdesiz 304"""
+    etag = sha256('|'.join(surum_parcalari).encode()).hexdigest()[:20]
+    if request.if_none_match.contains_weak(etag):
+        yanit = app.response_class(status=304)
+    else:
+        yanit = jsonify(veri)
+    yanit.set_etag(etag, weak=True)
+    yanit.headers['Cache-Control'] = 'private, no-cache'
+    return yanit
+
+@app.before_request
+def dinleyiciyi_baslat():
+    dinleyici.baslat()
+
+# ==================== ŞEMA MİGRASYONLARI ====================
+#
+# Şema değişiklikleri worker açılışında değil, deploy sırasında bir kez çalıştırılır:
+#     flask --app app db-migrate
+# Her migrasyon (sürüm, açıklama, ifadeler, eşzamanlı_mı); veri taşıyan ifade (sql, parametreler)
+# çiftidir, değerler SQL metnine gömülmez. Eşzamanlı olanlar
+# (CREATE INDEX CONCURRENTLY) transaction dışında, diğerleri tek transaction içinde
+# uygulanır. Uygulanan sürümler sema_surumu tablosuna yazılır; yeni değişiklik
+# her zaman listenin sonuna yeni bir sürüm olarak eklenir.
+
+MIGRASYON_KILIDI = 72010  # pg_advisory_lock anahtarı, aynı anda iki migrate çalışmasın
+
+def aylik_bolumleme(tablo, kolon, tanim, eski_kisitlar=(), eski_indeksler=(), indeksler=()):
+    """Düz bir tabloyu `kolon` üzerinden aylık RANGE bölümlü tabloya çeviren migrasyon ifadeleri.
+    Veri olan her ay ve önümüzdeki iki ay için bölüm açılır, geri kalanı varsayılan bölüme düşer."""
+    ifadeler = [f'ALTER TABLE {tablo} RENAME TO {tablo}_eski']
+    # Yeni tablonun kısıt/indeks isimleri eskileriyle çakışmasın
+    for kisit in [f'{tablo}_pkey', *eski_kisitlar]:
+        ifadeler.append(f'ALTER TABLE {tablo}_eski RENAME CONSTRAINT {kisit} TO {kisit}_eski')
+    ifadeler += [f'DROP INDEX IF EXISTS {indeks}' for indeks in eski_indeksler]
+    ifadeler += [
+        f'CREATE TABLE {tablo} ({tanim}) PARTITION BY RANGE ({kolon})',
+        f'ALTER SEQUENCE {tablo}_id_seq OWNED BY {tablo}.id',
+        f'CREATE TABLE {tablo}_varsayilan PARTITION OF {tablo} DEFAULT',
+        f'''
+        SELECT aylik_bolum_olustur('{tablo}', '{kolon}', CAST(ay AS date))
+        FROM generate_series(
+            date_trunc('month', COALESCE((SELECT MIN({kolon}) FROM {tablo}_eski), CURRENT_DATE)),
+            date_trunc('month', GREATEST((SELECT MAX({kolon}) FROM {tablo}_eski), CURRENT_DATE)) + interval '2 months',
+            interval '1 month') AS ay
+        ''',
+        f'INSERT INTO {tablo} SELECT * FROM {tablo}_eski',
+        f'DROP TABLE {tablo}_eski',
+    ]
+    return ifadeler + list(indeksler)
+
+# İlk üye listesi ve görev takip rolleri: migrasyon 10 bunları kullanicilar tablosuna yazar,
+# çalışma anında kullanılmaz (üyeler yönetim panelinden eklenir/devre dışı bırakılır).
+ILK_KULLANICILAR = {
+    # Admin'ler
+    "5554128946": {"isim": "Uğur Altun", "admin": True},
+    "5302605898": {"isim": "Bilge Sağnak Altun", "admin": True},
+    
+    # Ekip
+    "5409171998": {"isim": "Kübra Gözde Zorlu", "admin": False},
+    "5347666377": {"isim": "Berfin Tomruk", "admin": False},
+    "5074942445": {"isim": "Özhan Kakış", "admin": False},
+    "5367194693": {"isim": "Mert Tomruk", "admin": False},
+    "5417383748": {"isim": "Duygu Bölükbaşı Yıldırım", "admin": False},
+    "5364906694": {"isim": "Ceyhan İleri", "admin": False},
+    "5425614963": {"isim": "Büşra Karaköse", "admin": False},
+    "5307013845": {"isim": "Tuğçe Karagülen", "admin": False},
+    "5434564332": {"isim": "Enes Çepni", "admin": False},
+    "5377974644": {"isim": "Serpil Koşak", "admin": False},
+    "5357132619": {"isim": "Alperen Hacıismailoğlu", "admin": False},
+    "5448482424": {"isim": "Zehra Ergül", "admin": False},
+    "5348878568": {"isim": "Muhammet Bülbül", "admin": False},
+    "5350279213": {"isim": "Emre Ağdaş", "admin": False},
+    "5335437664": {"isim": "İlker Güney", "admin": False},
+    "5302821881": {"isim": "Kayhan Tüfekçi", "admin": False},
+    "5367777965": {"isim": "Başak Cengiz", "admin": False},
+    "5455151266": {"isim": "Atacan Ağüzüm", "admin": False},
+    "5528451111": {"isim": "Emre Gökalp", "admin": False},
+    "5064568591": {"isim": "Funda Açlan", "admin": False},
+    "5383537044": {"isim": "Nida Küçükaslan", "admin": False},
+    "5075277754": {"isim": "Zehra Erek", "admin": False},
+    "5050230175": {"isim": "Beyza Yıldırım", "admin": False},
+    "5066735330": {"isim": "Özge Aydın", "admin": False},
+    "5068647964": {"isim": "Ceyda Dinç", "admin": False},
+    "5397834846": {"isim": "Büşra Aydoğanoğlu", "admin": False},
+    "5445360312": {"isim": "Leyla Özler", "admin": False},
+    "5465358679": {"isim": "Büşra Gül", "admin": False},
+    "5333737400": {"isim": "Burçin Torun", "admin": False},
+    "5434849161": {"isim": "Elif Atmaca", "admin": False},
+    "5543898154": {"isim": "Mehmet Yıldırım", "admin": False},
+    "5057710492": {"isim": "Ahmet Kızgın", "admin": False},
+    "5357717101": {"isim": "Süleyman Ufuk Eroğlu", "admin": False},
+    "5071299465": {"isim": "Onur Özdemir", "admin": False},
+    "5306653496": {"isim": "Erdem Eren", "admin": False},
+    "5317705515": {"isim": "Deniz Temizkan", "admin": False},
+    "5319478065": {"isim": "Sueda Yüceer", "admin": False},
+    "5312103619": {"isim": "Melike Gün", "admin": False},
+    "5334187526": {"isim": "Ezgi Tan", "admin": False},
+    "5052399493": {"isim": "Atalay Okun", "admin": False},
+    "5352041658": {"isim": "Mustafa Kemal Doğançay", "admin": False},
+}
+
+ILK_GOREV_ERISIM = {
+    "5554128946": "admin",      # Uğur Altun
+    "5352041658": "kullanici",  # Mustafa Kemal Doğançay
+}
+
+MIGRASYONLAR = [
+    (1, 'Temel tablolar', [
+        '''
         CREATE TABLE IF NOT EXISTS rezervasyonlar (
             id SERIAL PRIMARY KEY,
             studyo TEXT NOT NULL,
@@ -41,8 +1303,8 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             UNIQUE(studyo, alan, tarih, saat)
         )
-    ''')
-    conn.run('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS aktiviteler (
             id SERIAL PRIMARY KEY,
             isim TEXT NOT NULL,
@@ -53,8 +1315,8 @@ def init_db():
             saat TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    ''')
-    conn.run('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS pratik_anket (
             id SERIAL PRIMARY KEY,
             pratik_tarih DATE NOT NULL,
@@ -65,8 +1327,8 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             UNIQUE(pratik_tarih, lokasyon, telefon)
         )
-    ''')
-    conn.run('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS pratik_gorevli (
             id SERIAL PRIMARY KEY,
             pratik_tarih DATE NOT NULL,
@@ -76,16 +1338,16 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             UNIQUE(pratik_tarih, lokasyon, telefon)
         )
-    ''')
-    conn.run('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS kullanici_sifreler (
             id SERIAL PRIMARY KEY,
             telefon TEXT UNIQUE NOT NULL,
             sifre_hash TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    ''')
-    conn.run('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS giris_denemeleri (
             id SERIAL PRIMARY KEY,
             telefon TEXT NOT NULL,
@@ -93,8 +1355,8 @@ def init_db():
             basarili BOOLEAN DEFAULT FALSE,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    ''')
-    conn.run('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS gorevler (
             id SERIAL PRIMARY KEY,
             baslik TEXT NOT NULL,
@@ -103,8 +1365,8 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    ''')
-    conn.run('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS gorev_notlar (
             id SERIAL PRIMARY KEY,
             gorev_id INTEGER,
@@ -113,68 +1375,444 @@ def init_db():
             not_text TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
+        ''',
+    ], False),
+    (2, 'Pratik görev sayaçları', [
+        '''
+        CREATE TABLE IF NOT EXISTS pratik_gorev_sayac (
+            lokasyon TEXT NOT NULL,
+            telefon TEXT NOT NULL,
+            isim TEXT NOT NULL,
+            sayi INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (lokasyon, telefon)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS pratik_gorev_haftalik (
+            hafta DATE NOT NULL,
+            lokasyon TEXT NOT NULL,
+            telefon TEXT NOT NULL,
+            isim TEXT NOT NULL,
+            sayi INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hafta, lokasyon, telefon)
+        )
+        ''',
+        '''
+        INSERT INTO pratik_gorev_haftalik (hafta, lokasyon, telefon, isim, sayi)
+        SELECT CAST(date_trunc('week', pratik_tarih) AS date), lokasyon, telefon, MAX(isim), COUNT(*)
+        FROM pratik_gorevli
+        WHERE NOT EXISTS (SELECT 1 FROM pratik_gorev_haftalik)
+        GROUP BY 1, 2, 3
+        ON CONFLICT DO NOTHING
+        ''',
+        '''
+        INSERT INTO pratik_gorev_sayac (lokasyon, telefon, isim, sayi)
+        SELECT lokasyon, telefon, MAX(isim), SUM(sayi)
+        FROM pratik_gorev_haftalik
+        WHERE NOT EXISTS (SELECT 1 FROM pratik_gorev_sayac)
+        GROUP BY 1, 2
+        ON CONFLICT DO NOTHING
+        ''',
+    ], False),
+    (3, 'Sıcak sorgu indeksleri', [
+        # kullanici_kilitli_mi: telefon + son 15 dk başarısız denemeler
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS giris_denemeleri_basarisiz_idx ON giris_denemeleri (telefon, created_at) WHERE basarili = FALSE',
+        # get_aktiviteler: ORDER BY created_at DESC LIMIT 30
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS aktiviteler_created_idx ON aktiviteler (created_at)',
+        # lokasyon bazlı görevli sorguları
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS pratik_gorevli_lokasyon_idx ON pratik_gorevli (lokasyon, pratik_tarih)',
+        # api_gorevler: görev başına notlar
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS gorev_notlar_gorev_idx ON gorev_notlar (gorev_id, created_at)',
+    ], True),
+    (4, 'Aylık bölümleme ve özet tabloları', [
+        '''
+        CREATE OR REPLACE FUNCTION aylik_bolum_olustur(tablo TEXT, kolon TEXT, ay DATE) RETURNS BOOLEAN AS $$
+        DECLARE
+            bolum TEXT := tablo || '_p' || to_char(ay, 'YYYYMM');
+            ilk DATE := date_trunc('month', ay);
+            son DATE := date_trunc('month', ay) + interval '1 month';
+        BEGIN
+            IF to_regclass(bolum) IS NOT NULL THEN
+                RETURN FALSE;
+            END IF;
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', bolum, tablo);
+            -- Bölüm açılmadan önce varsayılan bölüme düşmüş satırları taşı, sonra bağla
+            EXECUTE format('WITH t AS (DELETE FROM %I WHERE %I >= $1 AND %I < $2 RETURNING *) INSERT INTO %I SELECT * FROM t',
+                           tablo || '_varsayilan', kolon, kolon, bolum) USING ilk, son;
+            EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', tablo, bolum, ilk, son);
+            RETURN TRUE;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        *aylik_bolumleme('rezervasyonlar', 'tarih', '''
+            id INTEGER NOT NULL DEFAULT nextval('rezervasyonlar_id_seq'),
+            studyo TEXT NOT NULL,
+            alan TEXT NOT NULL,
+            tarih DATE NOT NULL,
+            saat TEXT NOT NULL,
+            rezerve_eden TEXT,
+            telefon TEXT,
+            bloklu BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, tarih),
+            UNIQUE (studyo, alan, tarih, saat)
+        ''', eski_kisitlar=['rezervasyonlar_studyo_alan_tarih_saat_key']),
+        *aylik_bolumleme('aktiviteler', 'created_at', '''
+            id INTEGER NOT NULL DEFAULT nextval('aktiviteler_id_seq'),
+            isim TEXT NOT NULL,
+            islem TEXT NOT NULL,
+            studyo TEXT NOT NULL,
+            alan TEXT NOT NULL,
+            tarih DATE NOT NULL,
+            saat TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ''', eski_indeksler=['aktiviteler_created_idx'], indeksler=[
+            'CREATE INDEX aktiviteler_created_idx ON aktiviteler (created_at)',
+        ]),
+        *aylik_bolumleme('giris_denemeleri', 'created_at', '''
+            id INTEGER NOT NULL DEFAULT nextval('giris_denemeleri_id_seq'),
+            telefon TEXT NOT NULL,
+            ip_adresi TEXT,
+            basarili BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ''', eski_indeksler=['giris_denemeleri_basarisiz_idx'], indeksler=[
+            'CREATE INDEX giris_denemeleri_basarisiz_idx ON giris_denemeleri (telefon, created_at) WHERE basarili = FALSE',
+        ]),
+        '''
+        CREATE TABLE IF NOT EXISTS rezervasyon_aylik (
+            ay DATE NOT NULL,
+            studyo TEXT NOT NULL,
+            alan TEXT NOT NULL,
+            rezervasyon INTEGER NOT NULL DEFAULT 0,
+            blok INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (ay, studyo, alan)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS giris_gunluk (
+            gun DATE PRIMARY KEY,
+            basarili INTEGER NOT NULL DEFAULT 0,
+            basarisiz INTEGER NOT NULL DEFAULT 0,
+            telefon_sayisi INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+    ], False),
+    (5, 'Takvim istisnaları', [
+        '''
+        CREATE TABLE IF NOT EXISTS takvim_istisnalari (
+            studyo TEXT NOT NULL,
+            tarih DATE NOT NULL,
+            baslangic TEXT,
+            bitis TEXT,
+            aciklama TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (studyo, tarih),
+            CHECK ((baslangic IS NULL) = (bitis IS NULL))
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS takvim_istisnalari_tarih_idx ON takvim_istisnalari (tarih)',
+    ], False),
+    (6, 'Slot doluluk maskeleri', [
+        # 'HH:MM' -> yarım saatlik ızgaradaki bit (SAAT_IZGARASI ile aynı sıra)
+        '''
+        CREATE OR REPLACE FUNCTION slot_biti(saat TEXT) RETURNS BIGINT AS $$
+            SELECT CAST(1 AS bigint) << (CAST(split_part(saat, ':', 1) AS integer) * 2
+                                         + CAST(split_part(saat, ':', 2) AS integer) / 30)
+        $$ LANGUAGE sql IMMUTABLE
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS slot_doluluk (
+            studyo TEXT NOT NULL,
+            alan TEXT NOT NULL,
+            tarih DATE NOT NULL,
+            maske BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (tarih, studyo, alan)
+        )
+        ''',
+        # Her yazma yolunu (rezerve, iptal, toplu blok, elle SQL) kapsamak için tetikleyici.
+        # Bit işlemleri satır kilidi altında yapıldığından eşzamanlı yazmalar birbirini ezmez.
+        '''
+        CREATE OR REPLACE FUNCTION slot_doluluk_guncelle() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE slot_doluluk SET maske = maske & ~slot_biti(OLD.saat)
+                WHERE tarih = OLD.tarih AND studyo = OLD.studyo AND alan = OLD.alan;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO slot_doluluk (studyo, alan, tarih, maske)
+                VALUES (NEW.studyo, NEW.alan, NEW.tarih, slot_biti(NEW.saat))
+                ON CONFLICT (tarih, studyo, alan) DO UPDATE SET maske = slot_doluluk.maske | EXCLUDED.maske;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        # Bölümlü tablodaki tetikleyici mevcut ve sonradan bağlanan bölümlere kopyalanır
+        '''
+        CREATE TRIGGER rezervasyonlar_doluluk
+        AFTER INSERT OR DELETE OR UPDATE OF studyo, alan, tarih, saat ON rezervasyonlar
+        FOR EACH ROW EXECUTE FUNCTION slot_doluluk_guncelle()
+        ''',
+        '''
+        INSERT INTO slot_doluluk (studyo, alan, tarih, maske)
+        SELECT studyo, alan, tarih, bit_or(slot_biti(saat)) FROM rezervasyonlar
+        GROUP BY studyo, alan, tarih
+        ON CONFLICT (tarih, studyo, alan) DO UPDATE SET maske = EXCLUDED.maske
+        ''',
+    ], False),
+    (7, 'Tekrarlayan blok ve rezervasyon kuralları', [
+        '''
+        CREATE TABLE IF NOT EXISTS tekrar_kurallari (
+            id SERIAL PRIMARY KEY,
+            studyo TEXT NOT NULL,
+            alan TEXT NOT NULL,
+            gunler SMALLINT NOT NULL CHECK (gunler BETWEEN 1 AND 127),
+            baslangic TEXT NOT NULL,
+            bitis TEXT NOT NULL,
+            gecerli_baslangic DATE NOT NULL,
+            gecerli_bitis DATE,
+            bloklu BOOLEAN NOT NULL DEFAULT TRUE,
+            rezerve_eden TEXT,
+            telefon TEXT,
+            aciklama TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CHECK (gecerli_bitis IS NULL OR gecerli_bitis >= gecerli_baslangic),
+            CHECK (bloklu OR telefon IS NOT NULL)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS tekrar_kurallari_alan_idx ON tekrar_kurallari (studyo, alan, gecerli_bitis)',
+    ], False),
+    (8, 'iCalendar beslemesi', [
+        '''
+        CREATE TABLE IF NOT EXISTS ical_tokenlari (
+            telefon TEXT PRIMARY KEY,
+            token TEXT NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Bölümlü tabloda CONCURRENTLY olmaz; indeks her bölüme ayrı ayrı kurulur
+        'CREATE INDEX IF NOT EXISTS rezervasyonlar_telefon_idx ON rezervasyonlar (telefon, tarih)',
+    ], False),
+    (9, 'Aktivite akışı indeksleri', [
+        # Keyset sayfalama id üzerinden; süzgeçli sorgular bu indekslerde id sırasıyla okunur
+        'CREATE INDEX IF NOT EXISTS aktiviteler_studyo_idx ON aktiviteler (studyo, alan, id)',
+        'CREATE INDEX IF NOT EXISTS aktiviteler_isim_idx ON aktiviteler (isim, id)',
+    ], False),
+    (10, 'Kullanıcı dizini', [
+        '''CREATE TABLE IF NOT EXISTS kullanicilar (
+            telefon TEXT PRIMARY KEY,
+            isim TEXT NOT NULL,
+            admin BOOLEAN NOT NULL DEFAULT FALSE,
+            gorev_rolu TEXT CHECK (gorev_rolu IN ('admin', 'kullanici')),
+            aktif BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        ('''
+            INSERT INTO kullanicilar (telefon, isim, admin, gorev_rolu)
+            SELECT telefon, isim, admin, gorev_rolu
+            FROM json_to_recordset(CAST(:p1 AS json)) AS x(telefon TEXT, isim TEXT, admin BOOLEAN, gorev_rolu TEXT)
+            ON CONFLICT (telefon) DO NOTHING
+        ''', {'p1': json.dumps([{'telefon': telefon, 'isim': bilgi['isim'], 'admin': bilgi['admin'],
+                                 'gorev_rolu': ILK_GOREV_ERISIM.get(telefon)}
+                                for telefon, bilgi in ILK_KULLANICILAR.items()])}),
+    ], False),
+]
+
+def _ifade_calistir(conn, ifade):
+    if isinstance(ifade, tuple):
+        sql, parametreler = ifade
+        return conn.run(sql, **parametreler)
+    return conn.run(ifade)
+
+def migrasyonlari_uygula(conn, yazdir=print):
+    """Uygulanmamış migrasyonları sırayla uygula; uygulanan sürüm listesini döner"""
+    conn.run('''
+        CREATE TABLE IF NOT EXISTS sema_surumu (
+            surum INTEGER PRIMARY KEY,
+            aciklama TEXT NOT NULL,
+            uygulandi TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
     ''')
-    conn.close()
+    conn.run('SELECT pg_advisory_lock(:p1)', p1=MIGRASYON_KILIDI)
+    try:
+        uygulanmis = {r[0] for r in conn.run('SELECT surum FROM sema_surumu')}
+        yeni = []
+        for surum, aciklama, ifadeler, eszamanli in MIGRASYONLAR:
+            if surum in uygulanmis:
+                continue
+            yazdir(f'{surum}: {aciklama}...')
+            if eszamanli:
+                # CONCURRENTLY transaction içinde çalışmaz. Yarıda kalan bir indeks INVALID
+                # olarak kalır ve IF NOT EXISTS onu atlar; bu yüzden sürümü yazmadan kontrol et.
+                for ifade in ifadeler:
+                    _ifade_calistir(conn, ifade)
+                gecersiz = conn.run('SELECT indexrelid::regclass::text FROM pg_index WHERE NOT indisvalid')
+                if gecersiz:
+                    raise RuntimeError('Geçersiz indeks(ler) var, DROP INDEX ile silip tekrar çalıştırın: '
+                                       + ', '.join(r[0] for r in gecersiz))
+                conn.run('INSERT INTO sema_surumu (surum, aciklama) VALUES (:p1, :p2)', p1=surum, p2=aciklama)
+            else:
+                conn.run('BEGIN')
+                try:
+                    for ifade in ifadeler:
+                        _ifade_calistir(conn, ifade)
+                    conn.run('INSERT INTO sema_surumu (surum, aciklama) VALUES (:p1, :p2)', p1=surum, p2=aciklama)
+                    conn.run('COMMIT')
+                except Exception:
+                    conn.run('ROLLBACK')
+                    raise
+            yeni.append(surum)
+        return yeni
+    finally:
+        conn.run('SELECT pg_advisory_unlock(:p1)', p1=MIGRASYON_KILIDI)
 
-try:
-    init_db()
-except:
-    pass
+@app.cli.command('db-migrate')
+def db_migrate_komutu():
+    """Veritabanı şemasını en son sürüme yükselt"""
+    conn = yeni_baglanti()
+    try:
+        yeni = migrasyonlari_uygula(conn)
+    finally:
+        conn.close()
+    print(f'{len(yeni)} migrasyon uygulandı' if yeni else 'Şema güncel')
 
-KULLANICILAR = {
-    # Admin'ler
-    "5554128946": {"isim": "Uğur Altun", "admin": True},
-    "5302605898": {"isim": "Bilge Sağnak Altun", "admin": True},
-    
-    # Ekip
-    "5409171998": {"isim": "Kübra Gözde Zorlu", "admin": False},
-    "5347666377": {"isim": "Berfin Tomruk", "admin": False},
-    "5074942445": {"isim": "Özhan Kakış", "admin": False},
-    "5367194693": {"isim": "Mert Tomruk", "admin": False},
-    "5417383748": {"isim": "Duygu Bölükbaşı Yıldırım", "admin": False},
-    "5364906694": {"isim": "Ceyhan İleri", "admin": False},
-    "5425614963": {"isim": "Büşra Karaköse", "admin": False},
-    "5307013845": {"isim": "Tuğçe Karagülen", "admin": False},
-    "5434564332": {"isim": "Enes Çepni", "admin": False},
-    "5377974644": {"isim": "Serpil Koşak", "admin": False},
-    "5357132619": {"isim": "Alperen Hacıismailoğlu", "admin": False},
-    "5448482424": {"isim": "Zehra Ergül", "admin": False},
-    "5348878568": {"isim": "Muhammet Bülbül", "admin": False},
-    "5350279213": {"isim": "Emre Ağdaş", "admin": False},
-    "5335437664": {"isim": "İlker Güney", "admin": False},
-    "5302821881": {"isim": "Kayhan Tüfekçi", "admin": False},
-    "5367777965": {"isim": "Başak Cengiz", "admin": False},
-    "5455151266": {"isim": "Atacan Ağüzüm", "admin": False},
-    "5528451111": {"isim": "Emre Gökalp", "admin": False},
-    "5064568591": {"isim": "Funda Açlan", "admin": False},
-    "5383537044": {"isim": "Nida Küçükaslan", "admin": False},
-    "5075277754": {"isim": "Zehra Erek", "admin": False},
-    "5050230175": {"isim": "Beyza Yıldırım", "admin": False},
-    "5066735330": {"isim": "Özge Aydın", "admin": False},
-    "5068647964": {"isim": "Ceyda Dinç", "admin": False},
-    "5397834846": {"isim": "Büşra Aydoğanoğlu", "admin": False},
-    "5445360312": {"isim": "Leyla Özler", "admin": False},
-    "5465358679": {"isim": "Büşra Gül", "admin": False},
-    "5333737400": {"isim": "Burçin Torun", "admin": False},
-    "5434849161": {"isim": "Elif Atmaca", "admin": False},
-    "5543898154": {"isim": "Mehmet Yıldırım", "admin": False},
-    "5057710492": {"isim": "Ahmet Kızgın", "admin": False},
-    "5357717101": {"isim": "Süleyman Ufuk Eroğlu", "admin": False},
-    "5071299465": {"isim": "Onur Özdemir", "admin": False},
-    "5306653496": {"isim": "Erdem Eren", "admin": False},
-    "5317705515": {"isim": "Deniz Temizkan", "admin": False},
-    "5319478065": {"isim": "Sueda Yüceer", "admin": False},
-    "5312103619": {"isim": "Melike Gün", "admin": False},
-    "5334187526": {"isim": "Ezgi Tan", "admin": False},
-    "5052399493": {"isim": "Atalay Okun", "admin": False},
-    "5352041658": {"isim": "Mustafa Kemal Doğançay", "admin": False},
-}
+@app.cli.command('db-surum')
+def db_surum_komutu():
+    """Uygulanmış ve bekleyen migrasyonları listele"""
+    conn = yeni_baglanti()
+    try:
+        tablo_var = conn.run("SELECT to_regclass('sema_surumu') IS NOT NULL")[0][0]
+        rows = conn.run('SELECT surum, uygulandi FROM sema_surumu') if tablo_var else []
+    finally:
+        conn.close()
+    uygulanmis = {r[0]: r[1] for r in rows}
+    for surum, aciklama, _, _ in MIGRASYONLAR:
+        durum = uygulanmis[surum].strftime('%Y-%m-%d %H:%M') if surum in uygulanmis else 'bekliyor'
+        print(f'{surum:>3}  {aciklama:<40} {durum}')
 
-# Görev Takip - Sadece bu kişiler erişebilir
-GOREV_ERISIM = {
-    "5554128946": "admin",      # Uğur Altun
-    "5352041658": "kullanici",  # Mustafa Kemal Doğançay
-}
+# ==================== BAKIM: BÖLÜMLER, ÖZETLER, SAKLAMA ====================
+#
+# rezervasyonlar (tarih), aktiviteler ve giris_denemeleri (created_at) aylık bölümlüdür.
+# Sıcak sorgular yalnızca son/yaklaşan ayların küçük bölümlerine dokunur. Günlük cron:
+#     flask --app app db-bakim
+# 1) ileriki aylar için bölümleri açar, 2) özet tablolarını günceller,
+# 3) saklama süresi dolan bölümleri DROP eder (DELETE yerine, şişkinlik bırakmaz).
+
+BAKIM_KILIDI = 72012
+
+# (tablo, bölüm kolonu, saklama ayı, kaç ay ileriye bölüm açılır)
+BOLUMLU_TABLOLAR = [
+    ('rezervasyonlar', 'tarih', REZERVASYON_SAKLAMA_AY, TOPLU_BLOK_MAX_GUN // 28 + 1),
+    ('aktiviteler', 'created_at', AKTIVITE_SAKLAMA_AY, 2),
+    ('giris_denemeleri', 'created_at', GIRIS_SAKLAMA_AY, 2),
+]
+
+# Özetler idempotent: son özetlenen dönemden (ve en az :p1'den) itibaren yeniden hesaplanır,
+# böylece bakım birkaç gün atlansa da bölüm düşürülmeden önce özeti tamamlanmış olur.
+REZERVASYON_OZET_SQL = '''
+    INSERT INTO rezervasyon_aylik (ay, studyo, alan, rezervasyon, blok)
+    SELECT CAST(date_trunc('month', tarih) AS date), studyo, alan,
+           COUNT(*) FILTER (WHERE NOT bloklu), COUNT(*) FILTER (WHERE bloklu)
+    FROM rezervasyonlar
+    WHERE tarih < CURRENT_DATE
+    AND tarih >= LEAST(COALESCE((SELECT MAX(ay) FROM rezervasyon_aylik), DATE '-infinity'), CAST(:p1 AS date))
+    GROUP BY 1, 2, 3
+    ON CONFLICT (ay, studyo, alan) DO UPDATE
+        SET rezervasyon = EXCLUDED.rezervasyon, blok = EXCLUDED.blok
+'''
+
+GIRIS_OZET_SQL = '''
+    INSERT INTO giris_gunluk (gun, basarili, basarisiz, telefon_sayisi)
+    SELECT CAST(created_at AS date), COUNT(*) FILTER (WHERE basarili), COUNT(*) FILTER (WHERE NOT basarili),
+           COUNT(DISTINCT telefon)
+    FROM giris_denemeleri
+    WHERE created_at < CURRENT_DATE
+    AND created_at >= LEAST(COALESCE((SELECT MAX(gun) FROM giris_gunluk), DATE '-infinity'), CAST(:p1 AS date))
+    GROUP BY 1
+    ON CONFLICT (gun) DO UPDATE
+        SET basarili = EXCLUDED.basarili, basarisiz = EXCLUDED.basarisiz, telefon_sayisi = EXCLUDED.telefon_sayisi
+'''
+
+# Yeni bölüm açılırken varsayılan bölümden taşınan satırlar tetikleyiciyi yalnızca DELETE için
+# çalıştırır (INSERT henüz bağlanmamış tabloya yapılır); taşınan aylar için maskeleri yeniden hesapla.
+SLOT_DOLULUK_ONAR_SQL = [
+    '''
+    INSERT INTO slot_doluluk (studyo, alan, tarih, maske)
+    SELECT studyo, alan, tarih, bit_or(slot_biti(saat)) FROM rezervasyonlar
+    WHERE tarih >= :p1 AND tarih < :p2
+    GROUP BY studyo, alan, tarih
+    ON CONFLICT (tarih, studyo, alan) DO UPDATE SET maske = EXCLUDED.maske
+    ''',
+    '''
+    UPDATE slot_doluluk d SET maske = 0
+    WHERE d.tarih >= :p1 AND d.tarih < :p2 AND d.maske <> 0
+    AND NOT EXISTS (SELECT 1 FROM rezervasyonlar r WHERE r.tarih = d.tarih AND r.studyo = d.studyo AND r.alan = d.alan)
+    ''',
+]
+
+def ay_kaydir(ay, n):
+    """Ayın ilk gününü n ay ileri/geri kaydır"""
+    toplam = ay.year * 12 + ay.month - 1 + n
+    return ay.replace(year=toplam // 12, month=toplam % 12 + 1, day=1)
+
+def bakim_yap(conn, yazdir=print):
+    """Bölümleri hazırla, özetleri güncelle, saklama süresi dolan bölümleri düşür"""
+    conn.run('SELECT pg_advisory_lock(:p1)', p1=BAKIM_KILIDI)
+    try:
+        bugun = datetime.now().date()
+        bu_ay = bugun.replace(day=1)
+        
+        # 1) İleriki aylar (varsayılan bölüme düşmüş satırlar yeni bölüme taşınır)
+        for tablo, kolon, _, ileri in BOLUMLU_TABLOLAR:
+            rows = conn.run('''
+                SELECT aylik_bolum_olustur(:p1, :p2, CAST(ay AS date))
+                FROM generate_series(CAST(:p3 AS date), CAST(:p4 AS date), interval '1 month') AS ay
+            ''', p1=tablo, p2=kolon, p3=bu_ay, p4=ay_kaydir(bu_ay, ileri))
+            acilan = sum(1 for r in rows if r[0])
+            if acilan:
+                yazdir(f'{tablo}: {acilan} yeni bölüm')
+                if tablo == 'rezervasyonlar':
+                    for ifade in SLOT_DOLULUK_ONAR_SQL:
+                        conn.run(ifade, p1=bu_ay, p2=ay_kaydir(bu_ay, ileri + 1))
+        
+        # 2) Özetler, ham veri düşürülmeden önce
+        conn.run(REZERVASYON_OZET_SQL, p1=ay_kaydir(bu_ay, -2))
+        conn.run(GIRIS_OZET_SQL, p1=bugun - timedelta(days=2))
+        
+        # 3) Saklama: bölüm isimleri <tablo>_pYYYYMM
+        for tablo, kolon, saklama, _ in BOLUMLU_TABLOLAR:
+            sinir = ay_kaydir(bu_ay, -saklama)
+            bolumler = conn.run('''
+                SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = CAST(:p1 AS regclass) ORDER BY c.relname
+            ''', p1=tablo)
+            for (bolum,) in bolumler:
+                ek = bolum[len(tablo) + 2:]
+                if not bolum.startswith(tablo + '_p') or len(ek) != 6 or not ek.isdigit():
+                    continue
+                if bugun.replace(year=int(ek[:4]), month=int(ek[4:]), day=1) < sinir:
+                    conn.run(f'DROP TABLE {bolum}')
+                    yazdir(f'{bolum} düşürüldü')
+            conn.run(f'DELETE FROM {tablo}_varsayilan WHERE {kolon} < :p1', p1=sinir)
+            if conn.row_count:
+                yazdir(f'{tablo}_varsayilan: {conn.row_count} eski satır silindi')
+            if tablo == 'rezervasyonlar':
+                # DROP TABLE tetikleyici çalıştırmaz; düşürülen aylara ait maskeleri de sil
+                conn.run('DELETE FROM slot_doluluk WHERE tarih < :p1', p1=sinir)
+    finally:
+        conn.run('SELECT pg_advisory_unlock(:p1)', p1=BAKIM_KILIDI)
+
+@app.cli.command('db-bakim')
+def db_bakim_komutu():
+    """Bölüm bakımı, özetler ve saklama süresi (günlük cron ile çalıştırın)"""
+    conn = yeni_baglanti()
+    try:
+        bakim_yap(conn)
+    finally:
+        conn.close()
+    print('Bakım tamamlandı')
 
 STUDYOLAR = {
     'kadikoy': {
@@ -224,32 +1862,333 @@ def sifre_dogrula(sifre, sifre_hash):
     """Şifreyi hash ile karşılaştır"""
     return hash_sifre(sifre) == sifre_hash
 
-def kullanici_kilitli_mi(telefon):
-    """Son 15 dakikada 5+ başarısız deneme varsa kilitle"""
+# ==================== ARKA PLAN YAZICILARI ====================
+#
+# Denetim kayıtları (aktiviteler, giris_denemeleri) istek yolunda yazılmaz: sınırlı bir
+# kuyruğa eklenir, worker başına bir arka plan thread'i bunları `parti` kayda ulaşınca ya da
+# ilk kayıttan `aralik` saniye sonra tek çok satırlı INSERT ile yazar. Kuyruk doluysa kayıt
+# çağıranın thread'inde, isteğin kendi bağlantısıyla hemen yazılır (geri basınç); worker
+# kapanırken kuyruk boşaltılır.
+# Kuyruk derinliği, yazılan/eşzamanlı yazılan kayıtlar ve yazma süresi /metrics'te görünür.
+
+# Yazılamayan parti arka planda üstel beklemeyle bu kadar denenir, sonra düşürülüp günlüğe yazılır
+YAZICI_DENEME = int(os.environ.get('YAZICI_DENEME', '4'))
+YAZICI_BEKLEME = 0.5  # saniye; her denemede iki katına çıkar
+
+AKTIVITE_YAZMA_ARALIGI = 0.5  # saniye
+AKTIVITE_PARTI = 200
+AKTIVITE_KUYRUK = 2000
+
+yazicilar = {}
+
+class ArkaPlanYazici:
+    """Kayıtları (sözlük) arka plan thread'inde `tablo`ya toplu yazan sınırlı kuyruk.
+    kolonlar: (kolon, SQL tipi) çiftleri; kayıttaki diğer anahtarlar yalnızca _yazildi içindir.
+    zaman_kolonu verilirse veritabanı saatiyle doldurulur: CURRENT_TIMESTAMP eksi kaydın kuyrukta
+    beklediği süre (okuyanlar yaşı CURRENT_TIMESTAMP'e göre ölçtüğünden tek saat kullanılır)."""
+
+    def __init__(self, isim, tablo, kolonlar, aralik, parti, kapasite, zaman_kolonu=None):
+        self.isim = isim
+        self.aralik = aralik
+        self.parti = parti
+        self.kapasite = kapasite
+        self._kuyruk = queue.Queue(maxsize=kapasite)
+        self._kilit = threading.Lock()
+        self._pid = None
+        self._zaman_kolonu = zaman_kolonu
+        isimler = ', '.join(k for k, _ in kolonlar)
+        tipler = ', '.join(f'{k} {tip}' for k, tip in kolonlar)
+        if zaman_kolonu:
+            self._sql = f'''
+                INSERT INTO {tablo} ({isimler}, {zaman_kolonu})
+                SELECT {isimler}, CURRENT_TIMESTAMP - make_interval(secs => bekleme)
+                FROM json_to_recordset(CAST(:p1 AS json)) AS x({tipler}, bekleme DOUBLE PRECISION)
+            '''
+        else:
+            self._sql = f'''
+                INSERT INTO {tablo} ({isimler})
+                SELECT {isimler} FROM json_to_recordset(CAST(:p1 AS json)) AS x({tipler})
+            '''
+        self._sayaclar_sifirla()
+        yazicilar[isim] = self
+
+    def _sayaclar_sifirla(self):
+        self._sayaclar = {'kayit': 0, 'parti': 0, 'esz_yazma': 0, 'hata': 0, 'dusen': 0, 'sure': histogram()}
+
+    def baslat(self):
+        if self._pid == os.getpid():
+            return
+        with self._kilit:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._sayaclar_sifirla()
+            threading.Thread(target=self._calis, name=f'{self.isim}-yazici', daemon=True).start()
+
+    def ekle(self, kayit):
+        self.baslat()
+        if self._zaman_kolonu:
+            kayit.setdefault('zaman', time.time())
+        try:
+            self._kuyruk.put_nowait(kayit)
+        except queue.Full:
+            # Yazıcı yetişemiyor: bu kaydı beklemeden kendimiz yazalım. İstek içindeysek isteğin
+            # bağlantısıyla; havuzdan ikinci bir bağlantı beklemek havuzu kilitleyebilir
+            with self._kilit:
+                self._sayaclar['esz_yazma'] += 1
+            self._partiyi_yaz([kayit], get_db, deneme=1)
+
+    def _topla(self, ilk_bekleme):
+        kayitlar = []
+        try:
+            kayitlar.append(self._kuyruk.get(timeout=ilk_bekleme))
+        except queue.Empty:
+            return kayitlar
+        bitis = time.monotonic() + self.aralik
+        while len(kayitlar) < self.parti:
+            kalan = bitis - time.monotonic()
+            if kalan <= 0:
+                break
+            try:
+                kayitlar.append(self._kuyruk.get(timeout=kalan))
+            except queue.Empty:
+                break
+        return kayitlar
+
+    def _calis(self):
+        while True:
+            kayitlar = self._topla(None)
+            if kayitlar:
+                self._partiyi_yaz(kayitlar)
+
+    def _partiyi_yaz(self, kayitlar, baglanti_al=None, deneme=YAZICI_DENEME):
+        """Partiyi üstel beklemeyle `deneme` kez yazmayı dene; olmazsa kayıtları düşür ve günlüğe yaz.
+        İstek yolu beklemez (deneme=1); kuyruk zaten dolu olduğundan geri de konamaz."""
+        for i in range(deneme):
+            if i:
+                time.sleep(YAZICI_BEKLEME * 2 ** (i - 1))
+            hata = self._yaz(kayitlar, baglanti_al)
+            if hata is None:
+                return True
+        with self._kilit:
+            self._sayaclar['dusen'] += len(kayitlar)
+        app.logger.error('%s: %d kayıt %d denemede yazılamadı, düşürüldü (%s): %s', self.isim, len(kayitlar),
+                         deneme, hata, json.dumps([{k: parametre_maskele(v) for k, v in kayit.items()}
+                                                   for kayit in kayitlar], ensure_ascii=False))
+        return False
+
+    def _yaz(self, kayitlar, baglanti_al=None):
+        """Tek deneme; başarısızsa hatayı döner. baglanti_al verilmezse havuzdan ayrı bağlantı (arka plan thread'i)"""
+        baslangic = time.perf_counter()
+        try:
+            conn = (baglanti_al or havuz.al)()
+        except Exception as e:
+            with self._kilit:
+                self._sayaclar['hata'] += 1
+            return e
+        if self._zaman_kolonu:
+            simdi = time.time()
+            veri = [{**k, 'bekleme': max(simdi - k['zaman'], 0)} for k in kayitlar]
+        else:
+            veri = kayitlar
+        try:
+            conn.run(self._sql, p1=json.dumps(veri))
+            hata = None
+        except Exception as e:
+            hata = e
+        try:
+            if hata is None:
+                # Satırlar yazıldı; bildirim hatası partiyi yeniden denetmemeli (çift kayıt olur)
+                try:
+                    self._yazildi(conn, kayitlar)
+                except Exception as e:
+                    print(f"Hata: {e}")
+        finally:
+            conn.close()
+        with self._kilit:
+            if hata is None:
+                self._sayaclar['kayit'] += len(kayitlar)
+                self._sayaclar['parti'] += 1
+                histograma_ekle(self._sayaclar['sure'], time.perf_counter() - baslangic)
+            else:
+                self._sayaclar['hata'] += 1
+        return hata
+
+    def _yazildi(self, conn, kayitlar):
+        """Aynı bağlantıda, parti yazıldıktan sonra (bildirimler için)"""
+
+    def bosalt(self):
+        """Kuyrukta kalanları hemen yaz (worker kapanırken)"""
+        kayitlar = []
+        while True:
+            try:
+                kayitlar.append(self._kuyruk.get_nowait())
+            except queue.Empty:
+                break
+        for i in range(0, len(kayitlar), self.parti):
+            self._partiyi_yaz(kayitlar[i:i + self.parti])
+
+    def derinlik(self):
+        return self._kuyruk.qsize()
+
+    def sayaclar(self):
+        with self._kilit:
+            return json.loads(json.dumps(self._sayaclar))
+
+class AktiviteKaydedici(ArkaPlanYazici):
+    """Rezerve/iptal kayıtlarını aktiviteler'e yazar; yazılınca akışı yeniletir"""
+
+    def __init__(self, aralik, parti, kapasite):
+        super().__init__('aktiviteler', 'aktiviteler',
+                         (('isim', 'TEXT'), ('islem', 'TEXT'), ('studyo', 'TEXT'), ('alan', 'TEXT'),
+                          ('tarih', 'DATE'), ('saat', 'TEXT')),
+                         aralik, parti, kapasite, zaman_kolonu='created_at')
+
+    def ekle(self, isim, islem, studyo, alan, tarih, saat):
+        super().ekle({'isim': isim, 'islem': islem, 'studyo': studyo, 'alan': alan, 'tarih': tarih,
+                      'saat': saat})
+
+    def _yazildi(self, conn, kayitlar):
+        # Akış önbelleği ve SSE 'aktivite' olayı satırlar görünür olduktan sonra
+        aktivite_onbellek.temizle()
+        olay_bildir(conn, 'aktivite', sayi=len(kayitlar))
+
+aktivite_kaydedici = AktiviteKaydedici(AKTIVITE_YAZMA_ARALIGI, AKTIVITE_PARTI, AKTIVITE_KUYRUK)
+atexit.register(aktivite_kaydedici.bosalt)
+
+# ==================== GİRİŞ KISITLAMA ====================
+#
+# Başarısız denemeler worker belleğinde kayan pencerede tutulur; kilitli bir hesaba
+# gelen istek veritabanına hiç gitmeden reddedilir. Denemeler arka planda toplu
+# yazılır ve başarısızlar GIRIS_KANALI üzerinden diğer worker'lara duyurulur.
+# Dinleyici her bağlandığında pencereler son 15 dakikanın kayıtlarıyla yeniden doldurulur.
+
+GIRIS_KANALI = 'giris_basarisiz'
+GIRIS_PENCERE = 15 * 60  # saniye
+GIRIS_TELEFON_LIMIT = 5
+GIRIS_IP_LIMIT = int(os.environ.get('GIRIS_IP_LIMIT', '20'))
+GIRIS_YAZMA_ARALIGI = 1.0  # saniye
+GIRIS_PARTI = 100
+GIRIS_KUYRUK = 1000
+
+class KayanPencere:
+    """Anahtar başına son `pencere` saniyedeki olayları sayar"""
+
+    def __init__(self, pencere, limit):
+        self.pencere = pencere
+        self.limit = limit
+        self._olaylar = {}
+        self._kilit = threading.Lock()
+
+    def _budanmis(self, anahtar, simdi):
+        zamanlar = self._olaylar.get(anahtar)
+        if zamanlar is None:
+            return None
+        while zamanlar and zamanlar[0] <= simdi - self.pencere:
+            zamanlar.popleft()
+        if not zamanlar:
+            del self._olaylar[anahtar]
+            return None
+        return zamanlar
+
+    def asildi_mi(self, anahtar):
+        with self._kilit:
+            zamanlar = self._budanmis(anahtar, time.time())
+            return zamanlar is not None and len(zamanlar) >= self.limit
+
+    def ekle(self, anahtar, zaman=None):
+        simdi = time.time()
+        zaman = zaman or simdi
+        if zaman <= simdi - self.pencere:
+            return
+        with self._kilit:
+            zamanlar = self._budanmis(anahtar, simdi)
+            if zamanlar is None:
+                zamanlar = self._olaylar[anahtar] = deque()
+            if zamanlar and zaman < zamanlar[-1]:
+                # Başka worker'dan gecikmeli gelen olay: sırayı koru
+                zamanlar.insert(bisect.bisect(zamanlar, zaman), zaman)
+            else:
+                zamanlar.append(zaman)
+            if len(self._olaylar) > 10000:
+                for a in list(self._olaylar):
+                    self._budanmis(a, simdi)
+
+    def temizle(self):
+        with self._kilit:
+            self._olaylar.clear()
+
+telefon_penceresi = KayanPencere(GIRIS_PENCERE, GIRIS_TELEFON_LIMIT)
+ip_penceresi = KayanPencere(GIRIS_PENCERE, GIRIS_IP_LIMIT)
+
+_worker_token = secrets.token_hex(4)
+
+def worker_kimligi():
+    return f'{os.getpid()}-{_worker_token}'
+
+def basarisiz_deneme_say(telefon, ip_adresi, zaman=None):
+    if telefon:
+        telefon_penceresi.ekle(telefon, zaman)
+    if ip_adresi:
+        ip_penceresi.ekle(ip_adresi, zaman)
+
+class GirisKaydedici(ArkaPlanYazici):
+    """Giriş denemelerini giris_denemeleri'ne yazar; başarısızları diğer worker'lara duyurur"""
+
+    def __init__(self, aralik, parti, kapasite):
+        super().__init__('giris_denemeleri', 'giris_denemeleri',
+                         (('telefon', 'TEXT'), ('ip_adresi', 'TEXT'), ('basarili', 'BOOLEAN')),
+                         aralik, parti, kapasite, zaman_kolonu='created_at')
+
+    def ekle(self, telefon, ip_adresi, basarili):
+        super().ekle({'telefon': telefon, 'ip_adresi': ip_adresi, 'basarili': basarili, 'zaman': time.time()})
+
+    def _yazildi(self, conn, kayitlar):
+        basarisiz = [[k['telefon'], k['ip_adresi'], k['zaman']] for k in kayitlar if not k['basarili']]
+        if basarisiz:
+            bildir(conn, GIRIS_KANALI, {'worker': worker_kimligi(), 'denemeler': basarisiz})
+
+giris_kaydedici = GirisKaydedici(GIRIS_YAZMA_ARALIGI, GIRIS_PARTI, GIRIS_KUYRUK)
+atexit.register(giris_kaydedici.bosalt)
+
+def _giris_bildirimi_geldi(veri):
+    if veri.get('worker') == worker_kimligi():
+        return
+    for telefon, ip_adresi, zaman in veri.get('denemeler', []):
+        basarisiz_deneme_say(telefon, ip_adresi, zaman)
+
+def _giris_pencerelerini_doldur():
+    conn = havuz.al()
     try:
-        conn = get_db()
         rows = conn.run('''
-            SELECT COUNT(*) FROM giris_denemeleri 
-            WHERE telefon = :p1 
-            AND basarili = FALSE 
-            AND created_at > :p2
-        ''', p1=telefon, p2=(datetime.now() - timedelta(minutes=15)).isoformat())
+            SELECT telefon, ip_adresi, EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - created_at))
+            FROM giris_denemeleri
+            WHERE basarili = FALSE AND created_at > CURRENT_TIMESTAMP - make_interval(secs => :p1)
+        ''', p1=GIRIS_PENCERE)
+    finally:
         conn.close()
-        return rows[0][0] >= 5
-    except:
-        return False
+    telefon_penceresi.temizle()
+    ip_penceresi.temizle()
+    simdi = time.time()
+    for telefon, ip_adresi, once in rows:
+        basarisiz_deneme_say(telefon, ip_adresi, simdi - float(once))
+
+dinleyici.abone_ol(GIRIS_KANALI, _giris_bildirimi_geldi)
+dinleyici.baglaninca(_giris_pencerelerini_doldur)
+
+def kullanici_kilitli_mi(telefon):
+    """Son 15 dakikada 5+ başarısız deneme varsa kilitle"""
+    return telefon_penceresi.asildi_mi(telefon)
+
+def ip_kilitli_mi(ip_adresi):
+    """Son 15 dakikada bu IP'den GIRIS_IP_LIMIT+ başarısız deneme varsa kilitle"""
+    return ip_penceresi.asildi_mi(ip_adresi)
 
 def giris_denemesi_kaydet(telefon, ip_adresi, basarili):
-    """Giriş denemesini kaydet"""
-    try:
-        conn = get_db()
-        conn.run('''
-            INSERT INTO giris_denemeleri (telefon, ip_adresi, basarili) 
-            VALUES (:p1, :p2, :p3)
-        ''', p1=telefon, p2=ip_adresi, p3=basarili)
-        conn.close()
-    except:
-        pass
+    """Giriş denemesini kaydet (yazma arka planda, kısıtlama hemen)"""
+    if not basarili:
+        basarisiz_deneme_say(telefon, ip_adresi)
+    giris_kaydedici.ekle(telefon, ip_adresi, basarili)
 
 def sifre_var_mi(telefon):
     """Kullanıcının şifresi var mı kontrol et"""
@@ -277,17 +2216,270 @@ def sifre_kaydet(telefon, sifre):
     except:
         return False
 
-def saat_listesi_olustur(baslangic, bitis):
-    saatler = []
-    bas_saat, bas_dk = map(int, baslangic.split(':'))
-    bit_saat, bit_dk = map(int, bitis.split(':'))
-    current = bas_saat * 60 + bas_dk
-    end = bit_saat * 60 + bit_dk
-    while current < end:
-        saat = f"{current // 60:02d}:{current % 60:02d}"
-        saatler.append(saat)
-        current += 30
-    return saatler
+# ==================== DERLENMİŞ PROGRAMLAR, İSTİSNA TAKVİMİ & TEKRARLAYAN KURALLAR ====================
+#
+# Çalışma saatleri açılışta bir kez yarım saatlik ızgaradan dilimlenip (studyo, gün tipi)
+# başına değişmez slot tablolarına derlenir. Tatil, kapanış ya da özel saat gibi tarihe özel
+# istisnalar takvim_istisnalari tablosundadır (studyo '*' tüm stüdyolar; baslangic/bitis NULL
+# ise kapalı). Tablo worker içinde (studyo, tarih) sözlüğüne yüklenir, 'takvim' olayıyla yenilenir.
+#
+# Haftalık dersler gibi tekrarlayan bloklar/rezervasyonlar tekrar_kurallari'nda tek satırdır
+# (günler bit maskesi, saat aralığı, geçerlilik tarihleri). Slot satırı üretilmez; kurallar
+# okuma anında somut rezervasyonlarla birleştirilir ve rezerve'de uygulanır.
+
+KOPYA_YENILEME = 30  # saniye; dinleyici bağlı değilken tablo kopyaları en geç bu aralıkla yeniden okunur
+
+SAAT_IZGARASI = tuple(f'{d // 60:02d}:{d % 60:02d}' for d in range(0, 24 * 60, 30))
+SAAT_INDEKSI = {saat: i for i, saat in enumerate(SAAT_IZGARASI)}
+SAAT_INDEKSI['24:00'] = len(SAAT_IZGARASI)
+SAAT_ETIKETLERI = SAAT_IZGARASI + ('24:00',)  # aralık sonu indeksi 48 olabilir
+
+# saatler: slot tuple'ı, kume: hızlı üyelik, maske: bit i = SAAT_IZGARASI[i] açık
+GunProgrami = namedtuple('GunProgrami', 'saatler kume maske aciklama')
+
+def saat_araligi(baslangic, bitis):
+    """[baslangic, bitis) yarım saatlik slotlar; ızgarada olmayan saat KeyError verir"""
+    return SAAT_IZGARASI[SAAT_INDEKSI[baslangic]:SAAT_INDEKSI[bitis]]
+
+_derlenmis_programlar = {}
+
+def program_derle(baslangic, bitis, aciklama=None):
+    """Açılış-kapanış aralığını GunProgrami'na derle; aynı aralık bir kez derlenir.
+    baslangic/bitis boşsa o gün kapalıdır."""
+    anahtar = (baslangic, bitis, aciklama)
+    program = _derlenmis_programlar.get(anahtar)
+    if program is None:
+        saatler = saat_araligi(baslangic, bitis) if baslangic and bitis else ()
+        maske = 0
+        for saat in saatler:
+            maske |= 1 << SAAT_INDEKSI[saat]
+        program = _derlenmis_programlar[anahtar] = GunProgrami(saatler, frozenset(saatler), maske, aciklama)
+    return program
+
+def gun_tipi(tarih):
+    return 'hafta_ici' if tarih.weekday() < 5 else 'hafta_sonu'
+
+def programlari_derle():
+    """STUDYOLAR'daki çalışma saatlerini (studyo, gün tipi) tablosuna derle"""
+    return {
+        (studyo, tip): program_derle(saat_bilgi['baslangic'], saat_bilgi['bitis'])
+        for studyo, bilgi in STUDYOLAR.items()
+        for tip, saat_bilgi in bilgi['saatler'].items()
+    }
+
+STUDYO_PROGRAMLARI = programlari_derle()
+
+class TabloKopyasi:
+    """Küçük bir tablonun worker içi kopyası. Değişiklik bildirimiyle geçersiz kılınır;
+    sorgu tabloyu okur, derle(rows) satırlardan sorgulanacak yapıyı kurar."""
+
+    def __init__(self, sorgu, derle):
+        self._sorgu = sorgu
+        self._derle = derle
+        self._kilit = threading.Lock()
+        self._veri = None
+        self._yuklenme = None  # monotonic; None ise yeniden okunmalı
+        self._nesil = 0
+
+    def gecersiz_kil(self):
+        self._nesil += 1
+        self._yuklenme = None
+
+    def _guncel_mi(self):
+        yuklenme = self._yuklenme
+        if yuklenme is None:
+            return False
+        # Dinleyici bağlıyken değişiklik bildirimle gelir; değilse süreyle yenile
+        return dinleyici.bagli or time.monotonic() - yuklenme < KOPYA_YENILEME
+
+    def veri(self):
+        if not self._guncel_mi():
+            self._yukle()
+        return self._veri
+
+    def _yukle(self):
+        with self._kilit:
+            if self._guncel_mi():
+                return
+            nesil = self._nesil
+            baslangic = time.monotonic()
+            conn = get_db()
+            rows = conn.run(self._sorgu)
+            conn.close()
+            self._veri = self._derle(rows)
+            # Okurken bir değişiklik bildirimi geldiyse bir sonraki erişimde yeniden oku
+            if nesil == self._nesil:
+                self._yuklenme = baslangic
+
+class IstisnaTakvimi(TabloKopyasi):
+    """takvim_istisnalari: (studyo, tarih) -> GunProgrami"""
+
+    def __init__(self):
+        super().__init__('SELECT studyo, tarih, baslangic, bitis, aciklama FROM takvim_istisnalari',
+                         lambda rows: {(r[0], r[1]): program_derle(r[2], r[3], r[4]) for r in rows})
+
+    def al(self, studyo, tarih):
+        istisnalar = self.veri()
+        return istisnalar.get((studyo, tarih)) or istisnalar.get(('*', tarih))
+
+istisnalar = IstisnaTakvimi()
+
+def _takvim_olayi(veri):
+    if veri.get('tip') == 'takvim':
+        istisnalar.gecersiz_kil()
+
+dinleyici.abone_ol(OLAY_KANALI, _takvim_olayi)
+# Kopukken gelen bildirimler kaçmış olabilir
+dinleyici.baglaninca(istisnalar.gecersiz_kil)
+
+def gun_programi(studyo, tarih):
+    """O günün derlenmiş programı: önce istisna takvimi, yoksa stüdyonun gün tipi tablosu"""
+    return istisnalar.al(studyo, tarih) or STUDYO_PROGRAMLARI[(studyo, gun_tipi(tarih))]
+
+def program_imzasi(program):
+    """ETag'e katılacak program özeti (saatler ve açıklama)"""
+    return f'{program.maske:x}:{program.aciklama or ""}'
+
+# program: kuralın saat aralığının derlenmiş hali; imza: ETag'e katılan içerik özeti
+TekrarKurali = namedtuple('TekrarKurali', 'id studyo alan gunler baslangic bitis gecerli_baslangic '
+                                          'gecerli_bitis bloklu rezerve_eden telefon aciklama program imza')
+
+TEKRAR_KURALI_KOLONLARI = ('id, studyo, alan, gunler, baslangic, bitis, gecerli_baslangic, gecerli_bitis, '
+                           'bloklu, rezerve_eden, telefon, aciklama')
+
+def tekrar_kurali(row):
+    return TekrarKurali(*row, program=program_derle(row[4], row[5]),
+                        imza=sha256(repr(row).encode()).hexdigest()[:8])
+
+class TekrarKurallari(TabloKopyasi):
+    """tekrar_kurallari: (studyo, alan, haftanın günü) -> kurallar. Bir günün kuralları
+    sözlükten tek erişimle bulunur, yalnızca geçerlilik tarihleri süzülür."""
+
+    def __init__(self):
+        super().__init__(f'SELECT {TEKRAR_KURALI_KOLONLARI} FROM tekrar_kurallari ORDER BY id', self._dizinle)
+
+    @staticmethod
+    def _dizinle(rows):
+        dizin = {}
+        for row in rows:
+            kural = tekrar_kurali(row)
+            for gun in range(7):
+                if kural.gunler >> gun & 1:
+                    dizin.setdefault((kural.studyo, kural.alan, gun), []).append(kural)
+        return dizin
+
+    def gunun_kurallari(self, studyo, alan, tarih):
+        return [k for k in self.veri().get((studyo, alan, tarih.weekday()), ())
+                if k.gecerli_baslangic <= tarih and (k.gecerli_bitis is None or tarih <= k.gecerli_bitis)]
+
+    def maske(self, studyo, alan, tarih):
+        """O gün kurallarla dolu slotların bit maskesi"""
+        maske = 0
+        for kural in self.gunun_kurallari(studyo, alan, tarih):
+            maske |= kural.program.maske
+        return maske
+
+kurallar = TekrarKurallari()
+
+def _kural_olayi(veri):
+    if veri.get('tip') == 'kural':
+        kurallar.gecersiz_kil()
+
+dinleyici.abone_ol(OLAY_KANALI, _kural_olayi)
+dinleyici.baglaninca(kurallar.gecersiz_kil)
+
+def kurallari_uygula(studyo, alan, tarih, kayit):
+    """Somut satırlardan oluşan slot kaydına o günün kurallarını ekle. Blok kuralları somut
+    satırların önüne geçer; tekrarlayan rezervasyonlar yalnızca boş slotlara yerleşir."""
+    gunun = kurallar.gunun_kurallari(studyo, alan, tarih)
+    if not gunun:
+        return kayit
+    satirlar = dict(kayit['satirlar'])
+    for kural in sorted(gunun, key=lambda k: k.bloklu):
+        satir = {'rezerve_eden': kural.rezerve_eden, 'telefon': kural.telefon, 'bloklu': kural.bloklu, 'kural': kural.id}
+        for saat in kural.program.saatler:
+            if kural.bloklu or saat not in satirlar:
+                satirlar[saat] = satir
+    return {'satirlar': satirlar, 'surum': kayit['surum'] + ':' + ','.join(k.imza for k in gunun)}
+
+# Kuralın kapsadığı somut (blok olmayan) rezervasyonlar; toplu_iptal koşulu olarak da kullanılır.
+# Geçmiş günler ve bugün başlamış slotlar dokunulmaz: ne çakışma sayılır ne iptal edilir
+KURAL_CAKISMA_KOSULU = '''
+    studyo = :p1 AND alan = :p2 AND NOT bloklu
+    AND tarih >= :p3 AND tarih <= COALESCE(CAST(:p4 AS date), DATE 'infinity')
+    AND (tarih > CURRENT_DATE OR (tarih = CURRENT_DATE AND saat >= to_char(LOCALTIME, 'HH24:MI')))
+    AND saat = ANY(CAST(:p5 AS text[]))
+    AND (CAST(:p6 AS integer) >> (CAST(EXTRACT(ISODOW FROM tarih) AS integer) - 1)) & 1 = 1
+'''
+
+def kural_cakismalari(conn, studyo, alan, gun_maskesi, saatler, gecerli_baslangic, gecerli_bitis):
+    """Kuralın kapsadığı somut (blok olmayan) rezervasyonlar: [(tarih, saat)]"""
+    return conn.run(f'''
+        SELECT tarih, saat FROM rezervasyonlar WHERE {KURAL_CAKISMA_KOSULU}
+        ORDER BY tarih, saat
+    ''', p1=studyo, p2=alan, p3=gecerli_baslangic, p4=gecerli_bitis, p5=list(saatler), p6=gun_maskesi)
+
+def cakisma_onayi_iste(cakismalar):
+    """Onaysız blok isteğine dönülecek yanıt: çakışan rezervasyonlar iptal edilmeden önce admin onayı"""
+    return jsonify({
+        'success': False,
+        'onay_gerekli': True,
+        'cakisan': len(cakismalar),
+        'cakismalar': [{'tarih': t.isoformat(), 'saat': s} for t, s in cakismalar[:CAKISMA_ORNEK_SAYISI]],
+        'error': f'{len(cakismalar)} mevcut rezervasyonla çakışıyor; onaylanırsa bunlar iptal edilir'
+    })
+
+def kurali_kirp(kural, gun_maskesi, baslangic, bitis, secim_baslangic, secim_bitis):
+    """Kuraldan (günler x [baslangic, bitis) x [secim_baslangic, secim_bitis]) seçimini çıkar.
+    Geriye kalanı (gunler, baslangic, bitis, gecerli_baslangic, gecerli_bitis) parçaları olarak döner;
+    secim_bitis None ise seçim süresizdir."""
+    g0, g1 = kural.gecerli_baslangic, kural.gecerli_bitis
+    parcalar = []
+    # Seçimin geçerlilik aralığı dışında kalan dönemler olduğu gibi kalır
+    if g0 < secim_baslangic:
+        parcalar.append((kural.gunler, kural.baslangic, kural.bitis, g0, secim_baslangic - timedelta(days=1)))
+    if secim_bitis is not None and (g1 is None or g1 > secim_bitis):
+        parcalar.append((kural.gunler, kural.baslangic, kural.bitis, secim_bitis + timedelta(days=1), g1))
+    o0 = max(g0, secim_baslangic)
+    o1 = g1 if secim_bitis is None else (secim_bitis if g1 is None else min(g1, secim_bitis))
+    # Ortak dönemde: seçilmeyen günler tüm saatleriyle, seçilen günler saat aralığının dışındaki kısımlarla
+    kalan_gunler = kural.gunler & ~gun_maskesi
+    ortak_gunler = kural.gunler & gun_maskesi
+    if kalan_gunler:
+        parcalar.append((kalan_gunler, kural.baslangic, kural.bitis, o0, o1))
+    if ortak_gunler and kural.baslangic < baslangic:
+        parcalar.append((ortak_gunler, kural.baslangic, baslangic, o0, o1))
+    if ortak_gunler and bitis < kural.bitis:
+        parcalar.append((ortak_gunler, bitis, kural.bitis, o0, o1))
+    return parcalar
+
+def bos_araliklar(bos, slot_sayisi):
+    """bos maskesinde en az slot_sayisi ardışık boş bit içeren her koşu için
+    (ilk başlangıç indeksi, koşunun bitiş indeksi) üret; bitiş hariçtir"""
+    # basla'nın i. biti: i'den başlayan slot_sayisi slotun hepsi boş
+    basla = bos
+    for i in range(1, slot_sayisi):
+        basla &= bos >> i
+    while basla:
+        en_dusuk = basla & -basla
+        sonraki = basla + en_dusuk  # en düşük ardışık 1 bloğunu temizler
+        kosu = basla & ~sonraki
+        basla &= sonraki
+        yield en_dusuk.bit_length() - 1, kosu.bit_length() - 1 + slot_sayisi
+
+def slot_durumu(rez, telefon):
+    """Rezervasyon satırından (durum, kisi, kendi_mi) üret"""
+    if not rez:
+        return 'bos', None, False
+    if rez['bloklu']:
+        return 'bloklu', None, False
+    return 'dolu', rez['rezerve_eden'], rez['telefon'] == telefon
+
+def saat_ekle(saat, dakika):
+    """'HH:MM' saatine dakika ekle"""
+    sa, dk = map(int, saat.split(':'))
+    toplam = sa * 60 + dk + dakika
+    return f"{toplam // 60:02d}:{toplam % 60:02d}"
 
 def get_pratik_tarihi(lokasyon):
     """Bu haftanın pratik tarihini bul"""
@@ -381,11 +2573,16 @@ def login():
     elif telefon.startswith('0'):
         telefon = telefon[1:]
     
+    # IP ya da hesap kilitli mi? (bellekte, veritabanına gitmeden)
+    if ip_kilitli_mi(ip_adresi):
+        return render_template('giris.html', hata='Çok fazla başarısız deneme. 15 dakika bekleyin.', captcha_soru=yeni_captcha())
+    
     # Kullanıcı kayıtlı mı?
-    if telefon not in KULLANICILAR:
+    kullanici = kullanicilar.aktif(telefon)
+    if kullanici is None:
+        basarisiz_deneme_say(None, ip_adresi)  # numara taramasını IP limitine say
         return render_template('giris.html', hata='Bu numara kayıtlı değil', captcha_soru=yeni_captcha())
     
-    # Hesap kilitli mi?
     if kullanici_kilitli_mi(telefon):
         return render_template('giris.html', hata='Çok fazla başarısız deneme. 15 dakika bekleyin.', captcha_soru=yeni_captcha())
     
@@ -408,8 +2605,8 @@ def login():
     # Başarılı giriş
     giris_denemesi_kaydet(telefon, ip_adresi, True)
     session['telefon'] = telefon
-    session['isim'] = KULLANICILAR[telefon]['isim']
-    session['admin'] = KULLANICILAR[telefon]['admin']
+    session['isim'] = kullanici.isim
+    session['admin'] = kullanici.admin
     
     if request.form.get('hatirla'):
         session.permanent = True
@@ -433,7 +2630,8 @@ def sifre_belirle():
     if 'temp_telefon' not in session:
         return redirect(url_for('giris'))
     telefon = session['temp_telefon']
-    isim = KULLANICILAR.get(telefon, {}).get('isim', '')
+    kullanici = kullanicilar.aktif(telefon)
+    isim = kullanici.isim if kullanici else ''
     return render_template('sifre_belirle.html', isim=isim)
 
 @app.route('/sifre-kaydet', methods=['POST'])
@@ -442,31 +2640,35 @@ def sifre_kaydet_route():
         return redirect(url_for('giris'))
     
     telefon = session['temp_telefon']
+    kullanici = kullanicilar.aktif(telefon)
+    if kullanici is None:
+        session.pop('temp_telefon', None)
+        return redirect(url_for('giris'))
     sifre = request.form.get('sifre', '').strip()
     sifre_tekrar = request.form.get('sifre_tekrar', '').strip()
     
     # Validasyon
     if len(sifre) < 6:
         return render_template('sifre_belirle.html', 
-                             isim=KULLANICILAR[telefon]['isim'],
+                             isim=kullanici.isim,
                              hata='Şifre en az 6 karakter olmalı')
     
     if sifre != sifre_tekrar:
         return render_template('sifre_belirle.html', 
-                             isim=KULLANICILAR[telefon]['isim'],
+                             isim=kullanici.isim,
                              hata='Şifreler eşleşmiyor')
     
     # Şifreyi kaydet
     if sifre_kaydet(telefon, sifre):
         session.pop('temp_telefon', None)
         session['telefon'] = telefon
-        session['isim'] = KULLANICILAR[telefon]['isim']
-        session['admin'] = KULLANICILAR[telefon]['admin']
+        session['isim'] = kullanici.isim
+        session['admin'] = kullanici.admin
         session.permanent = True
         return redirect(url_for('takvim'))
     else:
         return render_template('sifre_belirle.html', 
-                             isim=KULLANICILAR[telefon]['isim'],
+                             isim=kullanici.isim,
                              hata='Bir hata oluştu, tekrar deneyin')
 
 @app.route('/api/admin/sifre-sifirla', methods=['POST'])
@@ -478,14 +2680,15 @@ def admin_sifre_sifirla():
     data = request.json
     telefon = data.get('telefon', '').strip()
     
-    if telefon not in KULLANICILAR:
+    kullanici = kullanicilar.al(telefon)
+    if kullanici is None:
         return jsonify({'success': False, 'error': 'Kullanıcı bulunamadı'})
     
     try:
         conn = get_db()
         conn.run('DELETE FROM kullanici_sifreler WHERE telefon = :p1', p1=telefon)
         conn.close()
-        return jsonify({'success': True, 'mesaj': f'{KULLANICILAR[telefon]["isim"]} şifresi sıfırlandı'})
+        return jsonify({'success': True, 'mesaj': f'{kullanici.isim} şifresi sıfırlandı'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -503,10 +2706,238 @@ def admin_sifre_durumu():
     except Exception as e:
         return jsonify({'sifreli': [], 'error': str(e)})
 
+@app.route('/api/admin/yavas-sorgular')
+@login_required
+def admin_yavas_sorgular():
+    if not session.get('admin'):
+        return jsonify({'error': 'Yetkiniz yok'})
+    adet = min(max(request.args.get('adet', 50, type=int), 1), YAVAS_SORGU_TAMPON)
+    return jsonify({
+        'esik_ms': YAVAS_SORGU_ESIGI * 1000,
+        'explain_orani': YAVAS_SORGU_EXPLAIN,
+        'kayitlar': yavas_sorgular.son_kayitlar(adet),
+    })
+
+@app.route('/api/admin/takvim-istisnalari')
+@login_required
+def admin_takvim_istisnalari():
+    """Bugünden itibaren tanımlı takvim istisnaları"""
+    if not session.get('admin'):
+        return jsonify({'error': 'Yetkiniz yok'})
+    try:
+        conn = get_db()
+        rows = conn.run('''
+            SELECT studyo, tarih, baslangic, bitis, aciklama FROM takvim_istisnalari
+            WHERE tarih >= CURRENT_DATE ORDER BY tarih, studyo
+        ''')
+        conn.close()
+        return jsonify({'istisnalar': [
+            {'studyo': r[0], 'tarih': r[1].isoformat(), 'baslangic': r[2], 'bitis': r[3], 'aciklama': r[4]}
+            for r in rows
+        ]})
+    except Exception as e:
+        print(f"Hata: {e}")
+        return jsonify({'istisnalar': [], 'error': str(e)})
+
+@app.route('/api/admin/takvim-istisnasi', methods=['POST'])
+@login_required
+def admin_takvim_istisnasi():
+    """Bir tarih için istisna ekle/güncelle ya da sil ('sil': true).
+    baslangic/bitis verilmezse stüdyo o gün kapalıdır; studyo '*' tüm stüdyolar."""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'error': 'Yetkiniz yok'})
+    data = request.json
+    studyo = data.get('studyo', '')
+    if studyo != '*' and studyo not in STUDYOLAR:
+        return jsonify({'success': False, 'error': 'Geçersiz stüdyo'})
+    try:
+        tarih = datetime.strptime(data.get('tarih', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Geçersiz tarih'})
+    baslangic = data.get('baslangic') or None
+    bitis = data.get('bitis') or None
+    aciklama = (data.get('aciklama') or '').strip() or None
+    if not data.get('sil') and (baslangic or bitis):
+        if baslangic not in SAAT_INDEKSI or bitis not in SAAT_INDEKSI or SAAT_INDEKSI[baslangic] >= SAAT_INDEKSI[bitis]:
+            return jsonify({'success': False, 'error': 'Saatler yarım saatlik ve başlangıç bitişten önce olmalı'})
+    
+    try:
+        conn = get_db()
+        if data.get('sil'):
+            conn.run('DELETE FROM takvim_istisnalari WHERE studyo = :p1 AND tarih = :p2', p1=studyo, p2=tarih)
+        else:
+            conn.run('''
+                INSERT INTO takvim_istisnalari (studyo, tarih, baslangic, bitis, aciklama)
+                VALUES (:p1, :p2, :p3, :p4, :p5)
+                ON CONFLICT (studyo, tarih) DO UPDATE
+                    SET baslangic = EXCLUDED.baslangic, bitis = EXCLUDED.bitis, aciklama = EXCLUDED.aciklama
+            ''', p1=studyo, p2=tarih, p3=baslangic, p4=bitis, p5=aciklama)
+        istisnalar.gecersiz_kil()
+        olay_bildir(conn, 'takvim', studyo=studyo, tarih=tarih.isoformat())
+        # Açık takvim ekranları o günü yeniden yüklesin
+        for etkilenen in (STUDYOLAR if studyo == '*' else [studyo]):
+            for alan in STUDYOLAR[etkilenen]['alanlar']:
+                slot_degisti(conn, etkilenen, alan, [tarih.isoformat()], islem='takvim')
+        conn.close()
+        return jsonify({'success': True})
+    except Exception as e:
+        print(f"Hata: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+def tekrar_kurali_json(kural):
+    return {
+        'id': kural.id,
+        'studyo': kural.studyo,
+        'alan': kural.alan,
+        'gunler': [g for g in range(7) if kural.gunler >> g & 1],
+        'baslangic': kural.baslangic,
+        'bitis': kural.bitis,
+        'gecerli_baslangic': kural.gecerli_baslangic.isoformat(),
+        'gecerli_bitis': kural.gecerli_bitis.isoformat() if kural.gecerli_bitis else None,
+        'bloklu': kural.bloklu,
+        'rezerve_eden': kural.rezerve_eden,
+        'telefon': kural.telefon,
+        'aciklama': kural.aciklama,
+    }
+
+@app.route('/api/admin/tekrar-kurallari')
+@login_required
+def admin_tekrar_kurallari():
+    """Süresi dolmamış tekrarlayan blok/rezervasyon kuralları"""
+    if not session.get('admin'):
+        return jsonify({'error': 'Yetkiniz yok'})
+    try:
+        conn = get_db()
+        rows = conn.run(f'''
+            SELECT {TEKRAR_KURALI_KOLONLARI} FROM tekrar_kurallari
+            WHERE gecerli_bitis IS NULL OR gecerli_bitis >= CURRENT_DATE
+            ORDER BY studyo, alan, baslangic, id
+        ''')
+        conn.close()
+        return jsonify({'kurallar': [tekrar_kurali_json(tekrar_kurali(r)) for r in rows]})
+    except Exception as e:
+        print(f"Hata: {e}")
+        return jsonify({'error': str(e)})
+
+@app.route('/api/admin/tekrar-kurali', methods=['POST'])
+@login_required
+def admin_tekrar_kurali():
+    """Tekrarlayan kural ekle, 'id' ile güncelle ya da sil ('sil': true).
+    gunler: 0 (Pazartesi) - 6 (Pazar) listesi. 'telefon' verilirse kural o kişi adına
+    tekrarlayan rezervasyondur ve mevcut rezervasyonlarla/kurallarla çakışamaz; verilmezse bloktur."""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'error': 'Yetkiniz yok'})
+    data = request.json
+    try:
+        kural_id = int(data['id']) if data.get('id') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Geçersiz kural'})
+    if data.get('sil') and not kural_id:
+        return jsonify({'success': False, 'error': 'Kural bulunamadı'})
+    if not data.get('sil'):
+        studyo = data.get('studyo')
+        alan = data.get('alan')
+        studyo_bilgi = STUDYOLAR.get(studyo)
+        if not studyo_bilgi or alan not in studyo_bilgi['alanlar']:
+            return jsonify({'success': False, 'error': 'Geçersiz stüdyo/alan'})
+        try:
+            gun_maskesi = sum(1 << g for g in {int(g) for g in data.get('gunler', [])} if 0 <= g <= 6)
+            saatler = saat_araligi(data['baslangic'], data['bitis'])
+            gecerli_baslangic = datetime.strptime(data.get('gecerli_baslangic') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d').date()
+            gecerli_bitis = datetime.strptime(data['gecerli_bitis'], '%Y-%m-%d').date() if data.get('gecerli_bitis') else None
+        except (KeyError, ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Geçersiz gün, saat ya da tarih'})
+        if not gun_maskesi or not saatler:
+            return jsonify({'success': False, 'error': 'En az bir gün ve geçerli bir saat aralığı seçin'})
+        if gecerli_bitis and gecerli_bitis < gecerli_baslangic:
+            return jsonify({'success': False, 'error': 'Bitiş tarihi başlangıçtan önce olamaz'})
+        telefon = data.get('telefon') or None
+        if telefon and kullanicilar.aktif(telefon) is None:
+            return jsonify({'success': False, 'error': 'Kullanıcı bulunamadı'})
+        aciklama = (data.get('aciklama') or '').strip() or None
+    
+    try:
+        conn = get_db()
+        etkilenen = set()
+        telefonlar = set()  # eski ve yeni tekrarlayan rezervasyon sahibi
+        if kural_id:
+            rows = conn.run('SELECT studyo, alan, telefon FROM tekrar_kurallari WHERE id = :p1', p1=kural_id)
+            if not rows:
+                conn.close()
+                return jsonify({'success': False, 'error': 'Kural bulunamadı'})
+            etkilenen.add((rows[0][0], rows[0][1]))
+            telefonlar.add(rows[0][2])
+        cakisan = 0
+        if not data.get('sil'):
+            cakismalar = kural_cakismalari(conn, studyo, alan, gun_maskesi, saatler, gecerli_baslangic, gecerli_bitis)
+            cakisan = len(cakismalar)
+            if telefon:
+                if cakismalar:
+                    conn.close()
+                    tarih, saat = cakismalar[0]
+                    return jsonify({'success': False, 'error': f'{cakisan} mevcut rezervasyonla çakışıyor (ilk: {tarih.isoformat()} {saat})'})
+                maske = program_derle(data['baslangic'], data['bitis']).maske
+                for gun in range(7):
+                    if not gun_maskesi >> gun & 1:
+                        continue
+                    for diger in kurallar.veri().get((studyo, alan, gun), ()):
+                        if (diger.id != kural_id and diger.program.maske & maske
+                                and (gecerli_bitis is None or diger.gecerli_baslangic <= gecerli_bitis)
+                                and (diger.gecerli_bitis is None or gecerli_baslangic <= diger.gecerli_bitis)):
+                            conn.close()
+                            return jsonify({'success': False, 'error': f'{diger.baslangic}-{diger.bitis} kuralıyla çakışıyor'})
+            elif cakismalar and data.get('onay') is not True:
+                # Blok altında kalacak rezervasyonlar onaysız gizlenmez
+                conn.close()
+                return cakisma_onayi_iste(cakismalar)
+        conn.run('BEGIN')
+        try:
+            if data.get('sil'):
+                conn.run('DELETE FROM tekrar_kurallari WHERE id = :p1', p1=kural_id)
+            else:
+                parametreler = dict(p1=studyo, p2=alan, p3=gun_maskesi, p4=data['baslangic'], p5=data['bitis'],
+                                    p6=gecerli_baslangic, p7=gecerli_bitis, p8=not telefon,
+                                    p9=kullanicilar.al(telefon).isim if telefon else None, p10=telefon, p11=aciklama)
+                if kural_id:
+                    conn.run('''
+                        UPDATE tekrar_kurallari SET studyo = :p1, alan = :p2, gunler = :p3, baslangic = :p4, bitis = :p5,
+                            gecerli_baslangic = :p6, gecerli_bitis = :p7, bloklu = :p8, rezerve_eden = :p9,
+                            telefon = :p10, aciklama = :p11
+                        WHERE id = :p12
+                    ''', p12=kural_id, **parametreler)
+                else:
+                    kural_id = conn.run('''
+                        INSERT INTO tekrar_kurallari (studyo, alan, gunler, baslangic, bitis, gecerli_baslangic,
+                                                      gecerli_bitis, bloklu, rezerve_eden, telefon, aciklama)
+                        VALUES (:p1, :p2, :p3, :p4, :p5, :p6, :p7, :p8, :p9, :p10, :p11)
+                        RETURNING id
+                    ''', **parametreler)[0][0]
+                if cakisan:
+                    # Onaylanmış blok: altında kalan rezervasyonlar aynı transaction'da iptal edilip loglanır
+                    toplu_iptal(conn, KURAL_CAKISMA_KOSULU, p1=studyo, p2=alan, p3=gecerli_baslangic,
+                                p4=gecerli_bitis, p5=list(saatler), p6=gun_maskesi)
+                etkilenen.add((studyo, alan))
+                telefonlar.add(telefon)
+            telefonlar.discard(None)
+            olay_bildir(conn, 'kural', id=kural_id, telefonlar=sorted(telefonlar))
+            for etkilenen_studyo, etkilenen_alan in etkilenen:
+                slot_degisti(conn, etkilenen_studyo, etkilenen_alan, islem='kural')
+            conn.run('COMMIT')
+        except Exception:
+            conn.run('ROLLBACK')
+            raise
+        kurallar.gecersiz_kil()
+        ical_onbellek.gecersiz_kil(telefonlar)
+        conn.close()
+        return jsonify({'success': True, 'id': kural_id, 'cakisan': cakisan})
+    except Exception as e:
+        print(f"Hata: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/takvim')
 @login_required
 def takvim():
-    gorev_erisim = session.get('telefon') in GOREV_ERISIM
+    gorev_erisim = gorev_rolu(session['telefon']) is not None
     return render_template('takvim.html', isim=session['isim'], admin=session['admin'], studyolar=STUDYOLAR, gorev_erisim=gorev_erisim)
 
 @app.route('/pratik')
@@ -524,77 +2955,244 @@ def pratik_istatistik():
 def admin_panel():
     if not session.get('admin'):
         return redirect(url_for('takvim'))
-    return render_template('admin.html', isim=session['isim'], admin=session['admin'], kullanicilar=KULLANICILAR)
+    return render_template('admin.html', isim=session['isim'], admin=session['admin'], kullanicilar={k.telefon: kullanici_json(k) for k in kullanicilar.hepsi()}, studyolar=STUDYOLAR)
 
 @app.route('/api/slotlar/<studyo>/<alan>/<tarih>')
 @login_required
 def get_slotlar(studyo, alan, tarih):
     try:
-        tarih_obj = datetime.strptime(tarih, '%Y-%m-%d')
-        gun = tarih_obj.weekday()
-        studyo_bilgi = STUDYOLAR.get(studyo)
-        if not studyo_bilgi:
+        tarih_obj = datetime.strptime(tarih, '%Y-%m-%d').date()
+        if studyo not in STUDYOLAR:
             return jsonify([])
-        if gun < 5:
-            saat_bilgi = studyo_bilgi['saatler']['hafta_ici']
-        else:
-            saat_bilgi = studyo_bilgi['saatler']['hafta_sonu']
-        saatler = saat_listesi_olustur(saat_bilgi['baslangic'], saat_bilgi['bitis'])
+        program = gun_programi(studyo, tarih_obj)
         
-        conn = get_db()
-        rows = conn.run('SELECT saat, rezerve_eden, telefon, bloklu FROM rezervasyonlar WHERE studyo = :p1 AND alan = :p2 AND tarih = :p3', p1=studyo, p2=alan, p3=tarih)
-        conn.close()
-        
-        rezervasyonlar = {}
-        for row in rows:
-            rezervasyonlar[row[0]] = {'saat': row[0], 'rezerve_eden': row[1], 'telefon': row[2], 'bloklu': row[3]}
+        kayit = slot_kayitlari(studyo, [alan], tarih_obj, tarih_obj)[(alan, tarih_obj)]
+        rezervasyonlar = kayit['satirlar']
         
         slotlar = []
-        for saat in saatler:
-            rez = rezervasyonlar.get(saat)
-            if rez:
-                if rez['bloklu']:
-                    durum = 'bloklu'
-                    kisi = None
-                    kendi_mi = False
-                else:
-                    durum = 'dolu'
-                    kisi = rez['rezerve_eden']
-                    kendi_mi = (rez['telefon'] == session['telefon'])
-            else:
-                durum = 'bos'
-                kisi = None
-                kendi_mi = False
+        for saat in program.saatler:
+            durum, kisi, kendi_mi = slot_durumu(rezervasyonlar.get(saat), session['telefon'])
             slotlar.append({'saat': saat, 'durum': durum, 'kisi': kisi, 'kendi_mi': kendi_mi})
-        return jsonify(slotlar)
+        return kosullu_json(slotlar, kayit['surum'], program_imzasi(program), session['telefon'])
     except Exception as e:
         print(f"Hata: {e}")
         return jsonify([])
 
+@app.route('/api/slotlar-aralik/<studyo>')
+@login_required
+def get_slotlar_aralik(studyo):
+    """Bir stüdyonun tüm alanları için tarih aralığındaki slot ızgarası (tek sorgu)
+
+    ?baslangic=YYYY-MM-DD&bitis=YYYY-MM-DD[&alan=...][&kompakt=1]
+    Kompakt yanıtta her gün/alan için SLOT_KODLARI indekslerinden oluşan bir durum dizisi
+    ve yalnızca dolu slotlar için {indeks: kişi} sözlüğü döner.
+    """
+    studyo_bilgi = STUDYOLAR.get(studyo)
+    if not studyo_bilgi:
+        return jsonify({'error': 'Stüdyo bulunamadı'}), 404
+    try:
+        baslangic = datetime.strptime(request.args['baslangic'], '%Y-%m-%d').date()
+        bitis = datetime.strptime(request.args.get('bitis', request.args['baslangic']), '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Geçersiz tarih aralığı'}), 400
+    gun_sayisi = (bitis - baslangic).days + 1
+    if gun_sayisi < 1 or gun_sayisi > SLOT_ARALIK_MAX_GUN:
+        return jsonify({'error': f'Aralık 1-{SLOT_ARALIK_MAX_GUN} gün olmalı'}), 400
+    
+    alanlar = [a for a in request.args.getlist('alan') if a in studyo_bilgi['alanlar']] or studyo_bilgi['alanlar']
+    kompakt = request.args.get('kompakt') in ('1', 'true')
+    telefon = session['telefon']
+    
+    try:
+        kayitlar = slot_kayitlari(studyo, alanlar, baslangic, bitis)
+    except Exception as e:
+        print(f"Hata: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    gunler = {}
+    imzalar = []
+    for i in range(gun_sayisi):
+        tarih = baslangic + timedelta(days=i)
+        program = gun_programi(studyo, tarih)
+        saatler = program.saatler
+        imzalar.append(program_imzasi(program))
+        gun = {}
+        for alan in alanlar:
+            if kompakt:
+                durumlar = []
+                kisiler = {}
+                for j, saat in enumerate(saatler):
+                    durum, kisi, kendi_mi = slot_durumu(kayitlar[(alan, tarih)]['satirlar'].get(saat), telefon)
+                    durumlar.append(SLOT_KODLARI.index('kendi' if kendi_mi else durum))
+                    if kisi:
+                        kisiler[j] = kisi
+                gun[alan] = {'durum': durumlar, 'kisi': kisiler}
+            else:
+                slotlar = []
+                for saat in saatler:
+                    durum, kisi, kendi_mi = slot_durumu(kayitlar[(alan, tarih)]['satirlar'].get(saat), telefon)
+                    slotlar.append({'saat': saat, 'durum': durum, 'kisi': kisi, 'kendi_mi': kendi_mi})
+                gun[alan] = slotlar
+        gunler[tarih.isoformat()] = {'saatler': saatler, 'alanlar': gun}
+        if program.aciklama:
+            gunler[tarih.isoformat()]['aciklama'] = program.aciklama
+    
+    sonuc = {'studyo': studyo, 'baslangic': baslangic.isoformat(), 'bitis': bitis.isoformat(), 'gunler': gunler}
+    if kompakt:
+        sonuc['kodlar'] = SLOT_KODLARI
+    surumler = ','.join(kayitlar[(alan, baslangic + timedelta(days=i))]['surum']
+                        for alan in alanlar for i in range(gun_sayisi))
+    return kosullu_json(sonuc, surumler, ','.join(imzalar), str(kompakt), telefon)
+
+@app.route('/api/bos-slot-ara')
+@login_required
+def bos_slot_ara():
+    """Tüm stüdyo/alanlarda istenen süre kadar ardışık boş saatleri ara
+
+    ?sure=dakika&baslangic=YYYY-MM-DD&bitis=YYYY-MM-DD[&studyo=..][&alan=..]
+    [&saat_baslangic=HH:MM&saat_bitis=HH:MM][&limit=N]
+    Doluluk slot_doluluk maskelerinden tek sorguda okunur ve tekrarlayan kuralların maskesiyle
+    birleşir; her (studyo, alan, gün) için boş slotlar program maskesi & ~doluluk, ardışık
+    pencereler bit kaydırmalarıyla bulunur.
+    Tercih edilen stüdyo/alan önce, sonra en erken tarih ve saat gelir.
+    """
+    try:
+        sure = int(request.args.get('sure', '60'))
+        bugun = datetime.now().date()
+        baslangic = datetime.strptime(request.args['baslangic'], '%Y-%m-%d').date() if request.args.get('baslangic') else bugun
+        bitis = datetime.strptime(request.args['bitis'], '%Y-%m-%d').date() if request.args.get('bitis') else baslangic + timedelta(days=6)
+        pencere_bas = SAAT_INDEKSI[request.args.get('saat_baslangic') or '00:00']
+        pencere_bit = SAAT_INDEKSI[request.args.get('saat_bitis') or '24:00']
+        limit = min(max(int(request.args.get('limit', BOS_SLOT_LIMIT)), 1), BOS_SLOT_MAX_LIMIT)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Geçersiz parametre'}), 400
+    if sure % 30 or not 30 <= sure <= REZERVASYON_MAX_SLOT * 30:
+        return jsonify({'error': f'Süre 30-{REZERVASYON_MAX_SLOT * 30} dakika ve 30\'un katı olmalı'}), 400
+    if pencere_bas >= pencere_bit:
+        return jsonify({'error': 'Geçersiz saat aralığı'}), 400
+    baslangic = max(baslangic, bugun)
+    gun_sayisi = (bitis - baslangic).days + 1
+    if gun_sayisi < 1 or gun_sayisi > BOS_SLOT_MAX_GUN:
+        return jsonify({'error': f'Aralık 1-{BOS_SLOT_MAX_GUN} gün olmalı'}), 400
+    
+    tercih_studyo = request.args.get('studyo')
+    tercih_alan = request.args.get('alan')
+    slot_sayisi = sure // 30
+    pencere = ((1 << pencere_bit) - 1) & ~((1 << pencere_bas) - 1)
+    simdi = datetime.now()
+    gecmis = (1 << -(-(simdi.hour * 60 + simdi.minute) // 30)) - 1  # bugün başlamış slotlar
+    
+    try:
+        conn = get_db()
+        rows = conn.run('''
+            SELECT studyo, alan, tarih, maske FROM slot_doluluk
+            WHERE tarih BETWEEN :p1 AND :p2 AND maske <> 0
+        ''', p1=baslangic, p2=bitis)
+        conn.close()
+    except Exception as e:
+        print(f"Hata: {e}")
+        return jsonify({'error': str(e)}), 500
+    dolu = {(r[0], r[1], r[2]): r[3] for r in rows}
+    
+    adaylar = []
+    for i in range(gun_sayisi):
+        tarih = baslangic + timedelta(days=i)
+        for sira, (studyo, bilgi) in enumerate(STUDYOLAR.items()):
+            acik = gun_programi(studyo, tarih).maske & pencere
+            if tarih == bugun:
+                acik &= ~gecmis
+            if not acik:
+                continue
+            for alan in bilgi['alanlar']:
+                bos = acik & ~(dolu.get((studyo, alan, tarih), 0) | kurallar.maske(studyo, alan, tarih))
+                for ilk, son in bos_araliklar(bos, slot_sayisi):
+                    oncelik = (bool(tercih_studyo) and studyo != tercih_studyo) + (bool(tercih_alan) and alan != tercih_alan)
+                    adaylar.append(((oncelik, tarih, ilk, sira, alan), studyo, alan, tarih, ilk, son))
+    adaylar.sort(key=lambda a: a[0])
+    
+    sonuclar = [{
+        'studyo': studyo,
+        'studyo_isim': STUDYOLAR[studyo]['isim'],
+        'alan': alan,
+        'tarih': tarih.isoformat(),
+        'baslangic': SAAT_ETIKETLERI[ilk],
+        'bitis': SAAT_ETIKETLERI[ilk + slot_sayisi],
+        'bos_bitis': SAAT_ETIKETLERI[son],
+    } for _, studyo, alan, tarih, ilk, son in adaylar[:limit]]
+    return jsonify({'sure': sure, 'baslangic': baslangic.isoformat(), 'bitis': bitis.isoformat(),
+                    'toplam': len(adaylar), 'sonuclar': sonuclar})
+
 @app.route('/api/rezerve', methods=['POST'])
 @login_required
 def rezerve():
+    """Tek slot ('saat') ya da ardışık slotlar ('saat_baslangic'-'saat_bitis') için rezervasyon.
+    Tüm slotlar tek sorguda eklenir; biri bile doluysa hiçbiri eklenmez."""
     try:
         data = request.json
         studyo = data['studyo']
         alan = data['alan']
         tarih = data['tarih']
-        saat = data['saat']
         
-        conn = get_db()
-        rows = conn.run('SELECT id FROM rezervasyonlar WHERE studyo = :p1 AND alan = :p2 AND tarih = :p3 AND saat = :p4', p1=studyo, p2=alan, p3=tarih, p4=saat)
+        studyo_bilgi = STUDYOLAR.get(studyo)
+        if not studyo_bilgi or alan not in studyo_bilgi['alanlar']:
+            return jsonify({'success': False, 'error': 'Geçersiz stüdyo/alan'})
         
-        if rows:
-            conn.close()
-            return jsonify({'success': False, 'error': 'Bu slot zaten dolu'})
+        try:
+            tarih_obj = datetime.strptime(tarih, '%Y-%m-%d').date()
+            # '2024-1-5' de kabul edilir; önbellek ve bildirim anahtarları kanonik biçimle
+            tarih = tarih_obj.isoformat()
+            if data.get('saat_baslangic'):
+                saatler = list(saat_araligi(data['saat_baslangic'], data['saat_bitis']))
+            else:
+                saatler = [data['saat']]
+        except (KeyError, ValueError):
+            return jsonify({'success': False, 'error': 'Geçersiz tarih ya da saat'})
+        
+        program = gun_programi(studyo, tarih_obj)
+        if not program.saatler and program.aciklama:
+            return jsonify({'success': False, 'error': f'Stüdyo bu gün kapalı: {program.aciklama}'})
+        if not saatler or not program.kume.issuperset(saatler):
+            return jsonify({'success': False, 'error': 'Seçilen saatler stüdyo çalışma saatleri dışında'})
+        if len(saatler) > REZERVASYON_MAX_SLOT:
+            return jsonify({'success': False, 'error': f'Tek seferde en fazla {REZERVASYON_MAX_SLOT // 2} saat rezerve edilebilir'})
+        kural_maskesi = kurallar.maske(studyo, alan, tarih_obj)
+        if any(kural_maskesi >> SAAT_INDEKSI[saat] & 1 for saat in saatler):
+            return jsonify({'success': False, 'error': 'Seçilen saatler tekrarlayan bir blok ya da rezervasyona ait'})
         
-        conn.run('INSERT INTO rezervasyonlar (studyo, alan, tarih, saat, rezerve_eden, telefon) VALUES (:p1, :p2, :p3, :p4, :p5, :p6)', p1=studyo, p2=alan, p3=tarih, p4=saat, p5=session['isim'], p6=session['telefon'])
+        aralik = saatler[0] if len(saatler) == 1 else f"{saatler[0]}-{saat_ekle(saatler[-1], 30)}"
         
-        studyo_isim = STUDYOLAR[studyo]['isim']
-        conn.run('INSERT INTO aktiviteler (isim, islem, studyo, alan, tarih, saat) VALUES (:p1, :p2, :p3, :p4, :p5, :p6)', p1=session['isim'], p2='rezerve', p3=studyo_isim, p4=alan, p5=tarih, p6=saat)
+        conn = get_db()
+        try:
+            # Rezervasyon ve bildirim tek ifadede: ya hepsi ya hiçbiri. Aktivite kaydı arka planda.
+            conn.run('''
+                WITH yeni AS (
+                    INSERT INTO rezervasyonlar (studyo, alan, tarih, saat, rezerve_eden, telefon)
+                    SELECT :p1, :p2, CAST(:p3 AS date), s.saat, :p5, :p6
+                    FROM unnest(CAST(:p4 AS text[])) AS s(saat)
+                    RETURNING saat
+                )
+                SELECT pg_notify(:p7, :p8) FROM (SELECT COUNT(*) FROM yeni) AS sayi
+            ''', p1=studyo, p2=alan, p3=tarih, p4=saatler, p5=session['isim'], p6=session['telefon'],
+                p7=SLOT_KANALI, p8=slot_yuku(studyo, alan, [tarih], 'rezerve', session['telefon']))
+        except pg8000.native.DatabaseError as e:
+            if not benzersizlik_ihlali_mi(e):
+                raise
+            rows = conn.run('SELECT saat FROM rezervasyonlar WHERE studyo = :p1 AND alan = :p2 AND tarih = :p3 AND saat = ANY(CAST(:p4 AS text[])) ORDER BY saat',
+                            p1=studyo, p2=alan, p3=tarih, p4=saatler)
+            conn.close()
+            dolu = [r[0] for r in rows]
+            if len(saatler) == 1:
+                hata = 'Bu slot zaten dolu'
+            else:
+                hata = f"Seçilen saatlerden bazıları dolu: {', '.join(dolu)}" if dolu else 'Bu slot zaten dolu'
+            return jsonify({'success': False, 'error': hata, 'dolu_saatler': dolu})
+        slot_onbellegini_temizle(studyo, alan, [tarih])
+        ical_onbellek.gecersiz_kil([session['telefon']])
         conn.close()
+        aktivite_kaydedici.ekle(session['isim'], 'rezerve', studyo_bilgi['isim'], alan, tarih, aralik)
         
-        return jsonify({'success': True, 'mesaj': 'Rezervasyon yapıldı!'})
+        mesaj = 'Rezervasyon yapıldı!' if len(saatler) == 1 else f'{aralik} rezervasyonu yapıldı!'
+        return jsonify({'success': True, 'mesaj': mesaj, 'saatler': saatler})
     except Exception as e:
         print(f"Hata: {e}")
         return jsonify({'success': False, 'error': str(e)})
@@ -606,14 +3204,21 @@ def iptal():
         data = request.json
         studyo = data['studyo']
         alan = data['alan']
-        tarih = data['tarih']
         saat = data['saat']
+        try:
+            tarih_obj = datetime.strptime(data['tarih'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Geçersiz tarih'})
+        # Önbellek ve bildirim anahtarları kanonik biçimle ('2024-1-5' değil '2024-01-05')
+        tarih = tarih_obj.isoformat()
         
         conn = get_db()
         rows = conn.run('SELECT rezerve_eden, telefon FROM rezervasyonlar WHERE studyo = :p1 AND alan = :p2 AND tarih = :p3 AND saat = :p4', p1=studyo, p2=alan, p3=tarih, p4=saat)
         
         if not rows:
             conn.close()
+            if saat in SAAT_INDEKSI and kurallar.maske(studyo, alan, tarih_obj) >> SAAT_INDEKSI[saat] & 1:
+                return jsonify({'success': False, 'error': 'Bu saat tekrarlayan bir kurala ait; yönetim panelinden düzenlenebilir'})
             return jsonify({'success': False, 'error': 'Rezervasyon bulunamadı'})
         
         telefon = rows[0][1]
@@ -623,48 +3228,264 @@ def iptal():
         
         conn.run('DELETE FROM rezervasyonlar WHERE studyo = :p1 AND alan = :p2 AND tarih = :p3 AND saat = :p4', p1=studyo, p2=alan, p3=tarih, p4=saat)
         
-        studyo_isim = STUDYOLAR[studyo]['isim']
-        conn.run('INSERT INTO aktiviteler (isim, islem, studyo, alan, tarih, saat) VALUES (:p1, :p2, :p3, :p4, :p5, :p6)', p1=session['isim'], p2='iptal', p3=studyo_isim, p4=alan, p5=tarih, p6=saat)
+        slot_degisti(conn, studyo, alan, [tarih], 'iptal', telefon)
+        ical_onbellek.gecersiz_kil([telefon])
         conn.close()
+        aktivite_kaydedici.ekle(session['isim'], 'iptal', STUDYOLAR[studyo]['isim'], alan, tarih, saat)
         
         return jsonify({'success': True, 'mesaj': 'Rezervasyon iptal edildi'})
     except Exception as e:
         print(f"Hata: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/api/aktiviteler')
+TOPLU_IPTAL_SQL = '''
+    WITH silinen AS (
+        DELETE FROM rezervasyonlar WHERE {kosul}
+        RETURNING studyo, alan, tarih, saat, rezerve_eden, telefon, bloklu
+    ), adalar AS (
+        -- Ardışık yarım saatler tek aktivite satırı olur (rezerve'deki "19:00-20:30" gibi)
+        SELECT studyo, alan, tarih, telefon, saat, sira,
+               sira - ROW_NUMBER() OVER (PARTITION BY studyo, alan, tarih, telefon ORDER BY sira) AS ada
+        FROM (
+            SELECT studyo, alan, tarih, telefon, saat,
+                   CAST(split_part(saat, ':', 1) AS integer) * 2 + CAST(split_part(saat, ':', 2) AS integer) / 30 AS sira
+            FROM silinen WHERE NOT bloklu
+        ) AS s
+    ), aktivite AS (
+        INSERT INTO aktiviteler (isim, islem, studyo, alan, tarih, saat)
+        SELECT :p11, 'iptal', i.isim, a.alan, a.tarih,
+               -- Bitiş slot sırasından (saat_ekle gibi): 23:30'la biten ada "-24:00" olur, "-00:00" değil
+               CASE WHEN COUNT(*) = 1 THEN MIN(a.saat)
+                    ELSE MIN(a.saat) || '-' || lpad(CAST((MAX(a.sira) + 1) / 2 AS text), 2, '0')
+                         || CASE WHEN (MAX(a.sira) + 1) % 2 = 1 THEN ':30' ELSE ':00' END END
+        FROM adalar AS a
+        JOIN unnest(CAST(:p12 AS text[]), CAST(:p13 AS text[])) AS i(kod, isim) ON i.kod = a.studyo
+        GROUP BY i.isim, a.studyo, a.alan, a.tarih, a.telefon, a.ada
+    ), bildirim AS (
+        -- slot_yuku ile aynı gövde; (studyo, alan, sahip) başına bir bildirim
+        SELECT pg_notify(:p14, CAST(json_build_object(
+                   'studyo', studyo, 'alan', alan, 'tarihler', array_agg(DISTINCT to_char(tarih, 'YYYY-MM-DD')),
+                   'islem', 'iptal', 'telefon', telefon) AS text))
+        FROM silinen GROUP BY studyo, alan, telefon
+        UNION ALL
+        SELECT pg_notify(:p15, CAST(json_build_object('tip', 'aktivite', 'sayi', COUNT(*)) AS text))
+        FROM silinen WHERE NOT bloklu HAVING COUNT(*) > 0
+    )
+    SELECT studyo, alan, tarih, saat, rezerve_eden, telefon, bloklu, (SELECT COUNT(*) FROM bildirim)
+    FROM silinen ORDER BY tarih, studyo, alan, saat
+'''
+
+def toplu_iptal(conn, kosul, **parametreler):
+    """kosul'a uyan rezervasyonları tek ifadede sil: DELETE ... RETURNING, silinenlerden tek çok
+    satırlı aktivite INSERT'i ve bildirimler aynı transaction'da. kosul yalnızca :p1-:p10 kullanır.
+    Silinen satırları (studyo, alan, tarih, saat, rezerve_eden, telefon, bloklu) döner."""
+    rows = conn.run(TOPLU_IPTAL_SQL.format(kosul=kosul), **parametreler,
+                    p11=session['isim'], p12=list(STUDYOLAR), p13=[b['isim'] for b in STUDYOLAR.values()],
+                    p14=SLOT_KANALI, p15=OLAY_KANALI)
+    rows = [r[:7] for r in rows]
+    # Bu worker'ın önbellekleri hemen; diğerleri bildirimle
+    etkilenen = {}
+    for studyo, alan, tarih, *_ in rows:
+        etkilenen.setdefault((studyo, alan), set()).add(tarih.isoformat())
+    for (studyo, alan), tarihler in etkilenen.items():
+        slot_onbellegini_temizle(studyo, alan, sorted(tarihler))
+    ical_onbellek.gecersiz_kil(sorted({r[5] for r in rows if r[5]}))
+    if any(not r[6] for r in rows):
+        aktivite_onbellek.temizle()
+    return rows
+
+def toplu_iptal_json(row, telefon_goster):
+    sonuc = {'studyo': row[0], 'alan': row[1], 'tarih': row[2].isoformat(), 'saat': row[3],
+             'rezerve_eden': row[4], 'bloklu': row[6]}
+    if telefon_goster:
+        sonuc['telefon'] = row[5]
+    return sonuc
+
+def tarih_araligi_oku(data):
+    """İstekten (baslangic, bitis); geçersizse hata mesajı döner"""
+    try:
+        baslangic = datetime.strptime(data.get('baslangic') or date.today().isoformat(), '%Y-%m-%d').date()
+        bitis = datetime.strptime(data.get('bitis') or baslangic.isoformat(), '%Y-%m-%d').date()
+    except ValueError:
+        return None, None, 'Geçersiz tarih'
+    if bitis < baslangic:
+        return None, None, 'Bitiş tarihi başlangıçtan önce olamaz'
+    if (bitis - baslangic).days >= TOPLU_IPTAL_MAX_GUN:
+        return None, None, f'En fazla {TOPLU_IPTAL_MAX_GUN} günlük aralık seçilebilir'
+    return baslangic, bitis, None
+
+@app.route('/api/iptal-toplu', methods=['POST'])
 @login_required
-def get_aktiviteler():
+def iptal_toplu():
+    """Kullanıcının tarih aralığındaki tüm rezervasyonlarını iptal et.
+    {baslangic, bitis[, studyo][, alan]}; geçmiş günler, bugün başlamış slotlar ve bloklar dokunulmaz.
+    Tekrarlayan kural slotları yönetim panelinden düzenlenir."""
+    data = request.json or {}
+    baslangic, bitis, hata = tarih_araligi_oku(data)
+    if hata:
+        return jsonify({'success': False, 'error': hata})
+    if baslangic < date.today():
+        return jsonify({'success': False, 'error': 'Geçmiş tarihler toplu iptal edilemez'})
+    studyo = data.get('studyo') or None
+    alan = data.get('alan') or None
+    if studyo is not None and studyo not in STUDYOLAR:
+        return jsonify({'success': False, 'error': 'Geçersiz stüdyo'})
+    if alan is not None and (studyo is None or alan not in STUDYOLAR[studyo]['alanlar']):
+        return jsonify({'success': False, 'error': 'Geçersiz alan'})
+    
     try:
         conn = get_db()
-        rows = conn.run('SELECT isim, islem, studyo, alan, tarih, saat, created_at FROM aktiviteler ORDER BY created_at DESC LIMIT 30')
+        rows = toplu_iptal(conn, '''
+            telefon = :p1 AND NOT bloklu AND tarih BETWEEN :p2 AND :p3
+            AND (tarih > CURRENT_DATE OR saat >= to_char(LOCALTIME, 'HH24:MI'))
+            AND (CAST(:p4 AS text) IS NULL OR studyo = :p4) AND (CAST(:p5 AS text) IS NULL OR alan = :p5)
+        ''', p1=session['telefon'], p2=baslangic, p3=bitis, p4=studyo, p5=alan)
         conn.close()
-        
-        aktiviteler = []
-        for row in rows:
-            created = row[6]
-            now = datetime.now()
-            if isinstance(created, datetime):
-                diff = now - created
-            else:
-                diff = timedelta(seconds=0)
-            
-            if diff.total_seconds() < 60:
-                zaman = 'Az önce'
-            elif diff.total_seconds() < 3600:
-                zaman = f'{int(diff.total_seconds() // 60)} dakika önce'
-            elif diff.total_seconds() < 86400:
-                zaman = f'{int(diff.total_seconds() // 3600)} saat önce'
-            else:
-                zaman = f'{diff.days} gün önce'
-            
-            tarih_str = row[4].strftime('%Y-%m-%d') if hasattr(row[4], 'strftime') else str(row[4])
-            aktiviteler.append({'isim': row[0], 'islem': row[1], 'studyo': row[2], 'alan': row[3], 'tarih': tarih_str, 'saat': row[5], 'zaman': zaman})
-        
-        return jsonify(aktiviteler)
+        return jsonify({'success': True, 'silinen': len(rows),
+                        'mesaj': f'{len(rows)} slot iptal edildi' if rows else 'Bu aralıkta rezervasyonun yok',
+                        'iptaller': [toplu_iptal_json(r, False) for r in rows]})
     except Exception as e:
         print(f"Hata: {e}")
-        return jsonify([])
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/admin/alan-temizle', methods=['POST'])
+@login_required
+def admin_alan_temizle():
+    """Bir stüdyonun (ya da tek alanının) tarih/saat aralığındaki rezervasyon ve bloklarını sil.
+    {studyo[, alan], baslangic, bitis[, saat_baslangic, saat_bitis][, telefon][, bloklar_dahil=true]}"""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'error': 'Yetkiniz yok'})
+    data = request.json or {}
+    studyo = data.get('studyo')
+    if studyo not in STUDYOLAR:
+        return jsonify({'success': False, 'error': 'Geçersiz stüdyo'})
+    alanlar = STUDYOLAR[studyo]['alanlar']
+    if data.get('alan'):
+        if data['alan'] not in alanlar:
+            return jsonify({'success': False, 'error': 'Geçersiz alan'})
+        alanlar = [data['alan']]
+    baslangic, bitis, hata = tarih_araligi_oku(data)
+    if hata:
+        return jsonify({'success': False, 'error': hata})
+    saatler = None
+    if data.get('saat_baslangic') or data.get('saat_bitis'):
+        try:
+            saatler = list(saat_araligi(data['saat_baslangic'], data['saat_bitis']))
+        except KeyError:
+            return jsonify({'success': False, 'error': 'Geçersiz saat aralığı'})
+        if not saatler:
+            return jsonify({'success': False, 'error': 'Geçersiz saat aralığı'})
+    telefon = data.get('telefon') or None
+    if telefon and kullanicilar.al(telefon) is None:
+        return jsonify({'success': False, 'error': 'Kullanıcı bulunamadı'})
+    bloklar_dahil = data.get('bloklar_dahil', True)
+    if not isinstance(bloklar_dahil, bool):
+        return jsonify({'success': False, 'error': 'bloklar_dahil true ya da false olmalı'})
+    
+    try:
+        conn = get_db()
+        rows = toplu_iptal(conn, '''
+            studyo = :p1 AND alan = ANY(CAST(:p2 AS text[])) AND tarih BETWEEN :p3 AND :p4
+            AND (CAST(:p5 AS text[]) IS NULL OR saat = ANY(CAST(:p5 AS text[])))
+            AND (CAST(:p6 AS text) IS NULL OR telefon = :p6)
+            AND (CAST(:p7 AS boolean) OR NOT bloklu)
+        ''', p1=studyo, p2=alanlar, p3=baslangic, p4=bitis, p5=saatler, p6=telefon, p7=bloklar_dahil)
+        conn.close()
+        bloklu = sum(1 for r in rows if r[6])
+        mesaj = f'{len(rows) - bloklu} rezervasyon, {bloklu} blok slotu kaldırıldı' if rows else 'Bu aralıkta kayıt yok'
+        return jsonify({'success': True, 'silinen': len(rows), 'mesaj': mesaj,
+                        'iptaller': [toplu_iptal_json(r, True) for r in rows]})
+    except Exception as e:
+        print(f"Hata: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/aktiviteler')
+@login_required
+def get_aktiviteler():
+    """Aktivite akışı, yeniden eskiye
+
+    [?after_id=N]   yalnızca N'den yeni kayıtlar (yoklama; çoğunlukla boş)
+    [?before_id=N]  N'den eski sayfa (geçmişte geri gitmek için; yanıttaki 'onceki')
+    [&studyo=..][&alan=..][&isim=..][&baslangic=YYYY-MM-DD][&bitis=YYYY-MM-DD][&limit=N]
+    Zamanlar ham (created_at, UTC ISO) döner; göreli zamanı istemci hesaplar.
+    """
+    try:
+        after_id = int(request.args['after_id']) if request.args.get('after_id') else None
+        before_id = int(request.args['before_id']) if request.args.get('before_id') else None
+        baslangic = datetime.strptime(request.args['baslangic'], '%Y-%m-%d').date() if request.args.get('baslangic') else None
+        bitis = datetime.strptime(request.args['bitis'], '%Y-%m-%d').date() if request.args.get('bitis') else None
+        limit = min(max(int(request.args.get('limit', AKTIVITE_SAYFA)), 1), AKTIVITE_MAX_SAYFA)
+    except ValueError:
+        return jsonify({'error': 'Geçersiz parametre'}), 400
+    studyo = request.args.get('studyo')
+    if studyo and studyo not in STUDYOLAR:
+        return jsonify({'error': 'Geçersiz stüdyo'}), 400
+    alan = request.args.get('alan')
+    isim = request.args.get('isim')
+    
+    # aktiviteler.studyo stüdyonun görünen ismini tutar
+    kosullar, parametreler = [], {}
+    for kolon, isaret, deger in (('studyo', '=', STUDYOLAR[studyo]['isim'] if studyo else None),
+                                 ('alan', '=', alan), ('isim', '=', isim),
+                                 ('created_at', '>=', baslangic),
+                                 ('created_at', '<', bitis + timedelta(days=1) if bitis else None),
+                                 ('id', '>', after_id), ('id', '<', before_id)):
+        if deger is not None:
+            anahtar = f'p{len(parametreler) + 1}'
+            kosullar.append(f'{kolon} {isaret} :{anahtar}')
+            parametreler[anahtar] = deger
+    suzgec = (studyo, alan, isim, baslangic, bitis)
+    son_anahtar = ('son',) + suzgec  # bu süzgeçteki bilinen en yeni id
+    sayfa_anahtar = ('sayfa', limit) + suzgec  # ilk sayfa
+    
+    bilinen_son = aktivite_onbellek.al(son_anahtar) if after_id is not None else None
+    ilk_sayfa = aktivite_onbellek.al(sayfa_anahtar) if after_id is None and before_id is None else None
+    if bilinen_son is not None and bilinen_son <= after_id:
+        sonuc = {'aktiviteler': [], 'son_id': after_id, 'onceki': None}
+    elif ilk_sayfa is not None:
+        sonuc = ilk_sayfa
+    else:
+        try:
+            nesil = aktivite_onbellek.nesil()
+            conn = get_db()
+            # after_id: en yeni limit kayıt değil, after_id'den hemen sonrakiler (eskiden yeniye) gerekir
+            rows = conn.run(f'''
+                SELECT id, isim, islem, studyo, alan, tarih, saat,
+                       created_at AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC'
+                FROM aktiviteler
+                {'WHERE ' + ' AND '.join(kosullar) if kosullar else ''}
+                ORDER BY id {'ASC' if after_id is not None else 'DESC'} LIMIT {limit}
+            ''', **parametreler)
+            conn.close()
+        except Exception as e:
+            print(f"Hata: {e}")
+            return jsonify({'error': str(e)}), 500
+        if after_id is not None:
+            rows.reverse()
+        aktiviteler = [{
+            'id': row[0],
+            'isim': row[1],
+            'islem': row[2],
+            'studyo': row[3],
+            'alan': row[4],
+            'tarih': row[5].isoformat(),
+            'saat': row[6],
+            # created_at veritabanı oturum saat diliminde (CURRENT_TIMESTAMP) yazılır; sorgu UTC'ye çevirir
+            'created_at': row[7].replace(tzinfo=timezone.utc).isoformat(),
+        } for row in rows]
+        sonuc = {
+            'aktiviteler': aktiviteler,
+            'son_id': aktiviteler[0]['id'] if aktiviteler else after_id,
+            # Sayfa doluysa daha eskisi olabilir; yoklamada geri sayfa anlamsız
+            'onceki': aktiviteler[-1]['id'] if len(aktiviteler) == limit and after_id is None else None,
+        }
+        if after_id is None and before_id is None:
+            aktivite_onbellek.koy(sayfa_anahtar, sonuc, nesil)
+            aktivite_onbellek.koy(son_anahtar, sonuc['son_id'] or 0, nesil)
+        elif after_id is not None and len(aktiviteler) < limit:
+            aktivite_onbellek.koy(son_anahtar, sonuc['son_id'], nesil)
+    ids = ','.join(str(a['id']) for a in sonuc['aktiviteler'])
+    return kosullu_json(sonuc, repr(suzgec), str(limit), str(after_id), str(before_id), ids)
 
 @app.route('/api/admin/toplu-blok', methods=['POST'])
 @login_required
@@ -679,6 +3500,9 @@ def toplu_blok():
         saat_bas = data['saat_baslangic']
         saat_bit = data['saat_bitis']
         islem_tipi = data['islem']
+        # gun_sayisi boş ya da 0 ise blok süresizdir
+        gun_sayisi = data.get('gun_sayisi', TOPLU_BLOK_GUN)
+        gun_sayisi = min(max(int(gun_sayisi), 1), TOPLU_BLOK_MAX_GUN) if gun_sayisi else None
         
         gun_map = {'Pzt': 0, 'Sal': 1, 'Çar': 2, 'Car': 2, 'Per': 3, 'Cum': 4, 'Cmt': 5, 'Paz': 6}
         
@@ -687,69 +3511,735 @@ def toplu_blok():
         else:
             secili_gunler = [gun_map[g] for g in gunler if g in gun_map]
         
-        saatler = saat_listesi_olustur(saat_bas, saat_bit)
+        studyo_bilgi = STUDYOLAR.get(studyo)
+        if not studyo_bilgi or alan not in studyo_bilgi['alanlar']:
+            return jsonify({'success': False, 'error': 'Geçersiz stüdyo/alan'})
+        try:
+            saatler = saat_araligi(saat_bas, saat_bit)
+        except KeyError:
+            return jsonify({'success': False, 'error': 'Geçersiz saat aralığı'})
+        
+        gun_maskesi = sum(1 << g for g in set(secili_gunler))
+        if not gun_maskesi or not saatler:
+            return jsonify({'success': True, 'mesaj': '0 slot güncellendi', 'kural_id': None, 'cakisan': 0, 'silinen': 0})
         
-        conn = get_db()
         bugun = datetime.now().date()
-        islem_sayisi = 0
+        conn = get_db()
+        kural_id = None
+        cakisan = silinen = 0
         
-        for i in range(90):
-            tarih = bugun + timedelta(days=i)
-            if tarih.weekday() in secili_gunler:
-                for saat in saatler:
-                    tarih_str = tarih.strftime('%Y-%m-%d')
-                    if islem_tipi == 'blokla':
-                        try:
-                            conn.run('INSERT INTO rezervasyonlar (studyo, alan, tarih, saat, bloklu) VALUES (:p1, :p2, :p3, :p4, TRUE)', p1=studyo, p2=alan, p3=tarih_str, p4=saat)
-                        except:
-                            conn.run('UPDATE rezervasyonlar SET bloklu = TRUE, rezerve_eden = NULL, telefon = NULL WHERE studyo = :p1 AND alan = :p2 AND tarih = :p3 AND saat = :p4', p1=studyo, p2=alan, p3=tarih_str, p4=saat)
-                    else:
-                        conn.run('DELETE FROM rezervasyonlar WHERE studyo = :p1 AND alan = :p2 AND tarih = :p3 AND saat = :p4 AND bloklu = TRUE', p1=studyo, p2=alan, p3=tarih_str, p4=saat)
-                    islem_sayisi += 1
+        if islem_tipi == 'blokla':
+            # Tek kural satırı; slotlar okuma anında bloklu görünür (çalışma saati dışındakiler zaten gösterilmez).
+            # Altında kalan rezervasyonlar onaysız gizlenmez: onayla aynı transaction'da iptal edilip loglanır
+            gecerli_bitis = bugun + timedelta(days=gun_sayisi - 1) if gun_sayisi else None
+            cakismalar = kural_cakismalari(conn, studyo, alan, gun_maskesi, saatler, bugun, gecerli_bitis)
+            if cakismalar and data.get('onay') is not True:
+                conn.close()
+                return cakisma_onayi_iste(cakismalar)
+            conn.run('BEGIN')
+            try:
+                kural_id = conn.run('''
+                    INSERT INTO tekrar_kurallari (studyo, alan, gunler, baslangic, bitis, gecerli_baslangic, gecerli_bitis, bloklu)
+                    VALUES (:p1, :p2, :p3, :p4, :p5, :p6, :p7, TRUE)
+                    RETURNING id
+                ''', p1=studyo, p2=alan, p3=gun_maskesi, p4=saat_bas, p5=saat_bit, p6=bugun, p7=gecerli_bitis)[0][0]
+                cakisan = len(toplu_iptal(conn, KURAL_CAKISMA_KOSULU, p1=studyo, p2=alan, p3=bugun,
+                                          p4=gecerli_bitis, p5=list(saatler), p6=gun_maskesi))
+                olay_bildir(conn, 'kural', studyo=studyo, alan=alan)
+                slot_degisti(conn, studyo, alan, islem='blok')
+                conn.run('COMMIT')
+            except Exception:
+                conn.run('ROLLBACK')
+                raise
+        else:
+            # Seçimle kesişen blok kuralları silinir, seçimin dışında kalan kısımları
+            # (günler, saatler, geçerlilik dönemi) yeni kurallar olarak geri yazılır
+            secim_bitis = bugun + timedelta(days=gun_sayisi - 1) if gun_sayisi else None
+            conn.run('BEGIN')
+            try:
+                rows = conn.run(f'''
+                    SELECT {TEKRAR_KURALI_KOLONLARI} FROM tekrar_kurallari
+                    WHERE studyo = :p1 AND alan = :p2 AND bloklu
+                    AND gunler & CAST(:p3 AS smallint) <> 0 AND baslangic < :p5 AND bitis > :p4
+                    AND COALESCE(gecerli_bitis, DATE 'infinity') >= :p6
+                    AND gecerli_baslangic <= COALESCE(CAST(:p7 AS date), DATE 'infinity')
+                    FOR UPDATE
+                ''', p1=studyo, p2=alan, p3=gun_maskesi, p4=saat_bas, p5=saat_bit, p6=bugun, p7=secim_bitis)
+                kesisen = [tekrar_kurali(r) for r in rows]
+                parcalar = [{'studyo': k.studyo, 'alan': k.alan, 'gunler': gunler, 'baslangic': bas, 'bitis': bit,
+                             'gecerli_baslangic': gb.isoformat(), 'gecerli_bitis': gbit.isoformat() if gbit else None,
+                             'rezerve_eden': k.rezerve_eden, 'telefon': k.telefon, 'aciklama': k.aciklama}
+                            for k in kesisen
+                            for gunler, bas, bit, gb, gbit in kurali_kirp(k, gun_maskesi, saat_bas, saat_bit, bugun, secim_bitis)]
+                if kesisen:
+                    conn.run('DELETE FROM tekrar_kurallari WHERE id = ANY(CAST(:p1 AS integer[]))', p1=[k.id for k in kesisen])
+                if parcalar:
+                    conn.run('''
+                        INSERT INTO tekrar_kurallari (studyo, alan, gunler, baslangic, bitis, gecerli_baslangic,
+                                                      gecerli_bitis, bloklu, rezerve_eden, telefon, aciklama)
+                        SELECT studyo, alan, gunler, baslangic, bitis, gecerli_baslangic, gecerli_bitis, TRUE,
+                               rezerve_eden, telefon, aciklama
+                        FROM json_to_recordset(CAST(:p1 AS json))
+                            AS x(studyo TEXT, alan TEXT, gunler SMALLINT, baslangic TEXT, bitis TEXT,
+                                 gecerli_baslangic DATE, gecerli_bitis DATE, rezerve_eden TEXT, telefon TEXT, aciklama TEXT)
+                    ''', p1=json.dumps(parcalar))
+                silinen = len(kesisen)
+                # Kurallardan önce slot slot üretilmiş eski bloklar
+                ufuk = gun_sayisi or TOPLU_BLOK_MAX_GUN
+                tarihler = [bugun + timedelta(days=i) for i in range(ufuk)
+                            if (bugun + timedelta(days=i)).weekday() in secili_gunler]
+                conn.run('''
+                    DELETE FROM rezervasyonlar
+                    WHERE studyo = :p1 AND alan = :p2 AND bloklu = TRUE
+                    AND tarih = ANY(CAST(:p3 AS date[])) AND saat = ANY(CAST(:p4 AS text[]))
+                ''', p1=studyo, p2=alan, p3=[t.isoformat() for t in tarihler], p4=list(saatler))
+                eski_blok = conn.row_count
+                if silinen or eski_blok:
+                    olay_bildir(conn, 'kural', studyo=studyo, alan=alan)
+                    slot_degisti(conn, studyo, alan, islem='blok')
+                conn.run('COMMIT')
+            except Exception:
+                conn.run('ROLLBACK')
+                raise
+            silinen += eski_blok
         
+        if kural_id or silinen:
+            kurallar.gecersiz_kil()
+        conn.close()
+        if islem_tipi == 'blokla':
+            sure = f'{gun_sayisi} gün' if gun_sayisi else 'süresiz'
+            mesaj = f'{saat_bas}-{saat_bit} tekrarlayan blok eklendi ({sure})'
+            if cakisan:
+                mesaj += f'; {cakisan} çakışan rezervasyon iptal edildi'
+        elif silinen:
+            mesaj = f'{saat_bas}-{saat_bit} arası blok kaldırıldı ({silinen} kural/slot güncellendi)'
+        else:
+            mesaj = 'Seçilen gün ve saatlerde blok yok'
+        return jsonify({
+            'success': True,
+            'mesaj': mesaj,
+            'kural_id': kural_id,
+            'cakisan': cakisan,
+            'silinen': silinen,
+            'gun_sayisi': gun_sayisi
+        })
+    except Exception as e:
+        print(f"Hata: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+def akis_destekleniyor():
+    """Uzun akış bu worker'ı kilitlemez mi: thread'li sunucu ya da gevent yamalı süreç"""
+    if request.environ.get('wsgi.multithread'):
+        return True
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    return gevent_monkey is not None and gevent_monkey.is_module_patched('socket')
+
+@app.route('/api/stream')
+@login_required
+def olay_akisi():
+    """Server-Sent Events: slot, aktivite, oy, gorev (ve gerektiğinde yenile) olayları.
+
+    ?tipler=slot,aktivite ile yalnızca istenen olaylar alınır. Her akış bir worker
+    thread'ini meşgul ettiğinden gunicorn thread'li (gthread, gunicorn.conf.py) ya da gevent
+    worker ile çalıştırılmalı; sync worker'da 204 döner ve sayfalar yoklamaya geçer.
+    Akış SSE_MAX_SURE sonra kapanır, tarayıcı kendisi yeniden bağlanır.
+    """
+    if not akis_destekleniyor():
+        return Response(status=204)
+    izinli = set(SSE_TIPLERI)
+    if gorev_rolu(session['telefon']) is None:
+        izinli.discard('gorev')
+    if request.args.get('tipler'):
+        izinli &= set(request.args['tipler'].split(','))
+    izinli.add('yenile')
+    son_id = request.headers.get('Last-Event-ID') or request.args.get('son_id')
+    
+    def uret():
+        kuyruk, kacirilan = olaylar.abone_ol(son_id)
+        try:
+            yield 'retry: 3000\n\n'
+            if kacirilan is None:
+                yield sse_mesaji(olaylar.son_id(), 'yenile', {})
+                kacirilan = []
+            for _, olay_id, tip, veri in kacirilan:
+                if tip in izinli:
+                    yield sse_mesaji(olay_id, tip, veri)
+            bitis = time.monotonic() + SSE_MAX_SURE
+            while time.monotonic() < bitis:
+                try:
+                    _, olay_id, tip, veri = kuyruk.get(timeout=SSE_NABIZ)
+                except queue.Empty:
+                    yield ': nabiz\n\n'
+                    continue
+                if kuyruk.tasti:
+                    while not kuyruk.empty():
+                        _, olay_id, _, _ = kuyruk.get_nowait()
+                    kuyruk.tasti = False
+                    yield sse_mesaji(olay_id, 'yenile', {})
+                elif tip in izinli:
+                    yield sse_mesaji(olay_id, tip, veri)
+        finally:
+            olaylar.abonelikten_cik(kuyruk)
+    
+    return Response(uret(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# ==================== KULLANICI DİZİNİ ====================
+#
+# Üyeler ve rolleri kullanicilar tablosundadır. Her worker tabloyu bellekte telefona göre
+# (sıcak yol: oturum doğrulama, rol kontrolleri) ve isme göre (yönetim araması) dizinler;
+# değişiklikler OLAY_KANALI'ndan 'kullanici' bildirimiyle yeniden okunur. Devre dışı bırakılan
+# üyenin oturumu bir sonraki isteğinde kapanır, isim/admin değişikliği oturuma yansır.
+
+Kullanici = namedtuple('Kullanici', 'telefon isim admin gorev_rolu aktif')
+
+def isim_anahtari(metin):
+    """Türkçe büyük/küçük harf duyarsız arama anahtarı"""
+    return metin.replace('I', 'ı').replace('İ', 'i').lower().strip()
+
+class KullaniciDizini(TabloKopyasi):
+    """kullanicilar: telefon -> Kullanici, ayrıca isimdeki her kelimeden başlayan sıralı anahtarlar"""
+
+    def __init__(self):
+        super().__init__('SELECT telefon, isim, admin, gorev_rolu, aktif FROM kullanicilar', self._dizinle)
+
+    @staticmethod
+    def _dizinle(rows):
+        telefonla = {r[0]: Kullanici(*r) for r in rows}
+        # "Bilge Sağnak Altun" -> "bilge sağnak altun", "sağnak altun", "altun": önek araması her kelimeyi bulur
+        isimle = []
+        for k in telefonla.values():
+            kelimeler = isim_anahtari(k.isim).split()
+            isimle.extend((' '.join(kelimeler[i:]), k.telefon) for i in range(len(kelimeler)))
+        isimle.sort()
+        return telefonla, isimle
+
+    def al(self, telefon):
+        return self.veri()[0].get(telefon)
+
+    def aktif(self, telefon):
+        """Kayıtlı ve devre dışı bırakılmamış üye, yoksa None"""
+        kullanici = self.veri()[0].get(telefon)
+        return kullanici if kullanici is not None and kullanici.aktif else None
+
+    def hepsi(self):
+        return sorted(self.veri()[0].values(), key=lambda k: isim_anahtari(k.isim))
+
+    def ara(self, sorgu):
+        telefonla, isimle = self.veri()
+        anahtar = isim_anahtari(sorgu)
+        bulunan = {}
+        i = bisect.bisect_left(isimle, (anahtar,))
+        while i < len(isimle) and isimle[i][0].startswith(anahtar):
+            bulunan.setdefault(isimle[i][1], None)
+            i += 1
+        # Rakamla aranırsa telefon öneki
+        if anahtar.isdigit():
+            bulunan.update((t, None) for t in telefonla if t.startswith(anahtar))
+        return sorted((telefonla[t] for t in bulunan), key=lambda k: isim_anahtari(k.isim))
+
+kullanicilar = KullaniciDizini()
+
+def _kullanici_olayi(veri):
+    if veri.get('tip') == 'kullanici':
+        kullanicilar.gecersiz_kil()
+
+dinleyici.abone_ol(OLAY_KANALI, _kullanici_olayi)
+dinleyici.baglaninca(kullanicilar.gecersiz_kil)
+
+def gorev_rolu(telefon):
+    """Görev takip rolü ('admin' / 'kullanici'); erişimi yoksa None"""
+    kullanici = kullanicilar.aktif(telefon)
+    return kullanici.gorev_rolu if kullanici is not None else None
+
+@app.before_request
+def oturumu_dogrula():
+    telefon = session.get('telefon')
+    if telefon is None:
+        return
+    kullanici = kullanicilar.aktif(telefon)
+    if kullanici is None:
+        # Devre dışı bırakılmış ya da silinmiş; login_required girişe yönlendirir
+        session.clear()
+        return
+    # Yazmalar (rezerve_eden, aktiviteler.isim) oturumdaki ismi kullanır; dizinle güncel tut
+    if session.get('isim') != kullanici.isim:
+        session['isim'] = kullanici.isim
+    if session.get('admin') != kullanici.admin:
+        session['admin'] = kullanici.admin
+
+def kullanici_json(kullanici):
+    return kullanici._asdict()
+
+@app.route('/api/admin/kullanicilar')
+@login_required
+def admin_kullanicilar():
+    """Üye listesi; ?q= verilirse isim (kelime başı) ya da telefon önekiyle arar"""
+    if not session.get('admin'):
+        return jsonify({'error': 'Yetkiniz yok'})
+    try:
+        sorgu = request.args.get('q', '').strip()
+        liste = kullanicilar.ara(sorgu) if sorgu else kullanicilar.hepsi()
+        return jsonify({'kullanicilar': [kullanici_json(k) for k in liste]})
+    except Exception as e:
+        print(f"Hata: {e}")
+        return jsonify({'error': str(e)})
+
+@app.route('/api/admin/kullanici', methods=['POST'])
+@login_required
+def admin_kullanici():
+    """Üye ekle ya da güncelle: telefon, isim, admin, gorev_rolu, aktif.
+    Silme yoktur; geçmiş kayıtlar telefona bağlı kalsın diye üye devre dışı bırakılır."""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'error': 'Yetkiniz yok'})
+    data = request.json
+    telefon = (data.get('telefon') or '').strip()
+    isim = ' '.join((data.get('isim') or '').split())
+    admin = bool(data.get('admin'))
+    rol = data.get('gorev_rolu') or None
+    aktif = bool(data.get('aktif', True))
+    if not re.fullmatch(r'5\d{9}', telefon):
+        return jsonify({'success': False, 'error': 'Telefon 5 ile başlayan 10 haneli olmalı'})
+    if not isim:
+        return jsonify({'success': False, 'error': 'İsim gerekli'})
+    if rol not in (None, 'admin', 'kullanici'):
+        return jsonify({'success': False, 'error': 'Geçersiz görev rolü'})
+    if telefon == session['telefon'] and not (admin and aktif):
+        return jsonify({'success': False, 'error': 'Kendi yönetici yetkinizi kaldıramazsınız'})
+    
+    try:
+        conn = get_db()
+        conn.run('''
+            INSERT INTO kullanicilar (telefon, isim, admin, gorev_rolu, aktif)
+            VALUES (:p1, :p2, :p3, :p4, :p5)
+            ON CONFLICT (telefon) DO UPDATE
+                SET isim = EXCLUDED.isim, admin = EXCLUDED.admin,
+                    gorev_rolu = EXCLUDED.gorev_rolu, aktif = EXCLUDED.aktif
+        ''', p1=telefon, p2=isim, p3=admin, p4=rol, p5=aktif)
+        kullanicilar.gecersiz_kil()
+        olay_bildir(conn, 'kullanici', telefon=telefon)
+        conn.close()
+        return jsonify({'success': True, 'kullanici': {'telefon': telefon, 'isim': isim, 'admin': admin,
+                                                       'gorev_rolu': rol, 'aktif': aktif}})
+    except Exception as e:
+        print(f"Hata: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+# ==================== DIŞA AKTARMA (CSV / NDJSON) ====================
+#
+# Satırlar bir transaction içinde DECLARE edilen sunucu tarafı cursor'dan DISA_AKTARIM_PARCA'lık
+# FETCH'lerle okunup generator yanıtla akıtılır; çok yıllık aktarımlar da sabit bellekle çalışır.
+# Aktarım boyunca havuzdan bir bağlantı tutulduğundan worker başına eşzamanlı aktarım sınırlıdır.
+
+# tarih: filtre kolonu (zaman: timestamp mı), studyo: filtre kolonu (isim: stüdyo ismi mi saklanıyor)
+DISA_AKTARIMLAR = {
+    'rezervasyonlar': {
+        'kolonlar': ('id', 'studyo', 'alan', 'tarih', 'saat', 'rezerve_eden', 'telefon', 'bloklu', 'created_at'),
+        'tarih': 'tarih', 'zaman': False, 'studyo': 'studyo', 'isim': False,
+        'sira': 'tarih, saat, studyo, alan',
+    },
+    'aktiviteler': {
+        'kolonlar': ('id', 'created_at', 'isim', 'islem', 'studyo', 'alan', 'tarih', 'saat'),
+        'tarih': 'created_at', 'zaman': True, 'studyo': 'studyo', 'isim': True,
+        'sira': 'created_at, id',
+    },
+    'pratik_gorevli': {
+        'kolonlar': ('id', 'pratik_tarih', 'lokasyon', 'telefon', 'isim', 'created_at'),
+        'tarih': 'pratik_tarih', 'zaman': False, 'studyo': 'lokasyon', 'isim': False,
+        'sira': 'pratik_tarih, lokasyon, id',
+    },
+    'giris_denemeleri': {
+        'kolonlar': ('id', 'created_at', 'telefon', 'ip_adresi', 'basarili'),
+        'tarih': 'created_at', 'zaman': True, 'studyo': None, 'isim': False,
+        'sira': 'created_at, id',
+    },
+}
+
+disa_aktarim_siniri = threading.BoundedSemaphore(DISA_AKTARIM_MAX_ESZAMANLI)
+
+def disa_aktarim_degeri(deger):
+    if isinstance(deger, (date, datetime)):
+        return deger.isoformat()
+    return deger
+
+def csv_satirlari(kolonlar, parcalar):
+    tampon = io.StringIO()
+    yazici = csv.writer(tampon)
+    yazici.writerow(kolonlar)
+    for parca in parcalar:
+        for row in parca:
+            yazici.writerow(['' if v is None else disa_aktarim_degeri(v) for v in row])
+        yield tampon.getvalue()
+        tampon.seek(0)
+        tampon.truncate()
+
+def ndjson_satirlari(kolonlar, parcalar):
+    for parca in parcalar:
+        yield ''.join(json.dumps(dict(zip(kolonlar, map(disa_aktarim_degeri, row))), ensure_ascii=False) + '\n'
+                      for row in parca)
+
+@app.route('/api/admin/disa-aktar/<tablo>')
+@login_required
+def disa_aktar(tablo):
+    """Tabloyu CSV ya da NDJSON olarak akıt
+
+    ?format=csv|ndjson[&baslangic=YYYY-MM-DD][&bitis=YYYY-MM-DD][&studyo=...]
+    Tarihler dahildir; giris_denemeleri stüdyo filtresi almaz.
+    """
+    if not session.get('admin'):
+        return jsonify({'error': 'Yetkiniz yok'})
+    tanim = DISA_AKTARIMLAR.get(tablo)
+    if not tanim:
+        return jsonify({'error': 'Tablo bulunamadı'}), 404
+    bicim = request.args.get('format', 'csv')
+    if bicim not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Format csv ya da ndjson olmalı'}), 400
+    try:
+        baslangic = datetime.strptime(request.args['baslangic'], '%Y-%m-%d').date() if request.args.get('baslangic') else None
+        bitis = datetime.strptime(request.args['bitis'], '%Y-%m-%d').date() if request.args.get('bitis') else None
+    except ValueError:
+        return jsonify({'error': 'Geçersiz tarih'}), 400
+    studyo = request.args.get('studyo')
+    if studyo and (studyo not in STUDYOLAR or not tanim['studyo']):
+        return jsonify({'error': 'Geçersiz stüdyo'}), 400
+    
+    kosullar, parametreler = [], {}
+    if baslangic:
+        kosullar.append(f"{tanim['tarih']} >= :p1")
+        parametreler['p1'] = baslangic
+    if bitis:
+        # timestamp kolonlarında bitiş günü de dahil
+        kosullar.append(f"{tanim['tarih']} < :p2" if tanim['zaman'] else f"{tanim['tarih']} <= :p2")
+        parametreler['p2'] = bitis + timedelta(days=1) if tanim['zaman'] else bitis
+    if studyo:
+        kosullar.append(f"{tanim['studyo']} = :p3")
+        parametreler['p3'] = STUDYOLAR[studyo]['isim'] if tanim['isim'] else studyo
+    sql = f"SELECT {', '.join(tanim['kolonlar'])} FROM {tablo}"
+    if kosullar:
+        sql += ' WHERE ' + ' AND '.join(kosullar)
+    sql += f" ORDER BY {tanim['sira']}"
+    
+    if not disa_aktarim_siniri.acquire(blocking=False):
+        return jsonify({'error': 'Şu anda çok fazla dışa aktarım var, biraz sonra tekrar deneyin'}), 429
+    conn = None
+    try:
+        # İstekten bağımsız bağlantı: generator, istek bittikten sonra da okumaya devam eder
+        conn = havuz.al()
+        conn.run('BEGIN READ ONLY')
+        conn.run(f'DECLARE disa_aktarim NO SCROLL CURSOR FOR {sql}', **parametreler)
+        ilk = conn.run(f'FETCH FORWARD {DISA_AKTARIM_PARCA} FROM disa_aktarim')
+    except Exception as e:
+        print(f"Hata: {e}")
+        if conn is not None:
+            conn.birak()
+        disa_aktarim_siniri.release()
+        return jsonify({'error': str(e)}), 500
+    
+    def parcalar():
+        parca = ilk
+        while parca:
+            yield parca
+            if len(parca) < DISA_AKTARIM_PARCA:
+                break
+            parca = conn.run(f'FETCH FORWARD {DISA_AKTARIM_PARCA} FROM disa_aktarim')
+    
+    def kapat():
+        # Akış bitince ya da istemci yarıda kopunca bir kez çalışır; birak() transaction'ı
+        # (ve cursor'ı) ROLLBACK ile kapatır
+        conn.birak()
+        disa_aktarim_siniri.release()
+    
+    uretici = csv_satirlari if bicim == 'csv' else ndjson_satirlari
+    ek = '_'.join(str(x) for x in (baslangic, bitis, studyo) if x)
+    dosya = f"{tablo}{'_' + ek if ek else ''}.{bicim}"
+    mimetype = 'text/csv; charset=utf-8' if bicim == 'csv' else 'application/x-ndjson; charset=utf-8'
+    yanit = Response(uretici(tanim['kolonlar'], parcalar()), mimetype=mimetype,
+                     headers={'Content-Disposition': f'attachment; filename="{dosya}"',
+                              'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+    # Generator hiç başlatılmasa da (HEAD, erken kopma) bağlantı ve aktarım hakkı geri verilir
+    yanit.call_on_close(kapat)
+    return yanit
+
+# ==================== iCALENDAR BESLEMESİ ====================
+#
+# Her kullanıcının rezervasyonları, tekrarlayan rezervasyonları ve pratik görevleri
+# /ical/<token>.ics adresinden takvim uygulamalarına abonelik olarak sunulur. Takvim
+# uygulamaları sık yokladığından oluşturulan gövde kullanıcı başına önbellekte tutulur ve
+# yalnızca o kullanıcının rezervasyonu, kuralı ya da oyu değişince (bildirimdeki telefon
+# ile) yeniden üretilir; koşullu GET'ler ETag/Last-Modified ile 304 alır.
+
+ICAL_GECMIS_GUN = 90  # bu kadar gün öncesine kadarki etkinlikler beslemede kalır
+ICAL_ONBELLEK_SURE = 6 * 3600  # saniye, emniyet sınırı
+ICAL_SAAT_DILIMI = 'Europe/Istanbul'
+ICAL_UTC_FARKI = timedelta(hours=3)  # Türkiye 2016'dan beri yaz saati uygulamıyor
+ICAL_GUNLERI = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+# telefon -> {'govde', 'etag', 'degisim'}; token -> telefon
+ical_onbellek = onbellek_olustur('ical', 512, ICAL_ONBELLEK_SURE)
+ical_token_onbellek = onbellek_olustur('ical_token', 512, ICAL_ONBELLEK_SURE)
+
+def _ical_slot_olayi(veri):
+    if veri.get('telefon'):
+        ical_onbellek.gecersiz_kil([veri['telefon']])
+
+def _ical_olayi(veri):
+    if veri.get('tip') == 'oy' and veri.get('telefon'):
+        ical_onbellek.gecersiz_kil([veri['telefon']])
+    elif veri.get('tip') == 'kural':
+        ical_onbellek.gecersiz_kil(veri.get('telefonlar'))
+    elif veri.get('tip') == 'ical':
+        ical_token_onbellek.gecersiz_kil([veri.get('token')])
+
+dinleyici.abone_ol(SLOT_KANALI, _ical_slot_olayi)
+dinleyici.abone_ol(OLAY_KANALI, _ical_olayi)
+
+def ical_metni(metin):
+    """RFC 5545 TEXT kaçışı"""
+    return (metin.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def ical_satiri(satir):
+    """75 oktetten uzun satırları katla (çok baytlı karakterleri bölmeden)"""
+    parcalar, parca, uzunluk = [], '', 0
+    for karakter in satir:
+        boy = len(karakter.encode('utf-8'))
+        if uzunluk + boy > 75:
+            parcalar.append(parca)
+            parca, uzunluk = ' ', 1
+        parca += karakter
+        uzunluk += boy
+    parcalar.append(parca)
+    return '\r\n'.join(parcalar)
+
+def ical_zamani(tarih, slot):
+    """Gün + yarım saatlik slot indeksi -> yerel DTSTART/DTEND değeri"""
+    an = datetime(tarih.year, tarih.month, tarih.day) + timedelta(minutes=30 * slot)
+    return an.strftime('%Y%m%dT%H%M%S')
+
+def ardisik_bloklar(saatler):
+    """Sıralı 'HH:MM' slotlarını ardışık [(ilk slot, son slot + 1)] aralıklarına birleştir"""
+    bloklar = []
+    for saat in saatler:
+        i = SAAT_INDEKSI[saat]
+        if bloklar and bloklar[-1][1] == i:
+            bloklar[-1][1] = i + 1
+        else:
+            bloklar.append([i, i + 1])
+    return bloklar
+
+def pratik_saatleri(lokasyon):
+    """PRATIK_BILGI'deki '20.30 - 22.30' -> (başlangıç, bitiş) dakika"""
+    bas, bit = (sum(int(x) * c for x, c in zip(parca.strip().split('.'), (60, 1)))
+                for parca in PRATIK_BILGI[lokasyon]['saat'].split('-'))
+    return bas, bit
+
+def ical_olustur(telefon):
+    """Kullanıcının beslemesini üret (CRLF satırlı metin)"""
+    alt_sinir = datetime.now().date() - timedelta(days=ICAL_GECMIS_GUN)
+    conn = get_db()
+    rezervasyonlar = conn.run('''
+        SELECT studyo, alan, tarih, saat FROM rezervasyonlar
+        WHERE telefon = :p1 AND tarih >= :p2 AND NOT bloklu
+        ORDER BY studyo, alan, tarih, saat
+    ''', p1=telefon, p2=alt_sinir)
+    tekrarlar = conn.run(f'''
+        SELECT {TEKRAR_KURALI_KOLONLARI} FROM tekrar_kurallari
+        WHERE telefon = :p1 AND NOT bloklu AND (gecerli_bitis IS NULL OR gecerli_bitis >= :p2)
+        ORDER BY id
+    ''', p1=telefon, p2=alt_sinir)
+    gorevler = conn.run('''
+        SELECT pratik_tarih, lokasyon FROM pratik_gorevli
+        WHERE telefon = :p1 AND pratik_tarih >= :p2
+        ORDER BY pratik_tarih, lokasyon
+    ''', p1=telefon, p2=alt_sinir)
+    conn.close()
+    
+    damga = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    satirlar = [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Swing Planet//Studyo Rezervasyon//TR',
+        'CALSCALE:GREGORIAN', 'METHOD:PUBLISH', 'X-WR-CALNAME:Swing Planet',
+        f'X-WR-TIMEZONE:{ICAL_SAAT_DILIMI}',
+        'BEGIN:VTIMEZONE', f'TZID:{ICAL_SAAT_DILIMI}',
+        'BEGIN:STANDARD', 'DTSTART:19700101T000000', 'TZOFFSETFROM:+0300', 'TZOFFSETTO:+0300',
+        'TZNAME:+03', 'END:STANDARD', 'END:VTIMEZONE',
+    ]
+    
+    def etkinlik(uid, baslangic, bitis, baslik, yer, *ekler):
+        satirlar.extend([
+            'BEGIN:VEVENT', f'UID:{uid}@swingplanet', f'DTSTAMP:{damga}',
+            f'DTSTART;TZID={ICAL_SAAT_DILIMI}:{baslangic}', f'DTEND;TZID={ICAL_SAAT_DILIMI}:{bitis}',
+            f'SUMMARY:{ical_metni(baslik)}', f'LOCATION:{ical_metni(yer)}', *ekler, 'END:VEVENT',
+        ])
+    
+    # Aynı gün ve alandaki ardışık 30 dakikalık slotlar tek etkinlik
+    gruplu = {}
+    for studyo, alan, tarih, saat in rezervasyonlar:
+        gruplu.setdefault((studyo, alan, tarih), []).append(saat)
+    for (studyo, alan, tarih), saatler in gruplu.items():
+        studyo_isim = STUDYOLAR.get(studyo, {}).get('isim', studyo)
+        for ilk, son in ardisik_bloklar(saatler):
+            uid = sha256(f'{studyo}|{alan}|{tarih}|{ilk}'.encode()).hexdigest()[:16]
+            etkinlik(f'rez-{uid}', ical_zamani(tarih, ilk), ical_zamani(tarih, son),
+                     f'{alan} rezervasyonu', f'{studyo_isim} - {alan}')
+    
+    for row in tekrarlar:
+        kural = tekrar_kurali(row)
+        ilk_gun = next(kural.gecerli_baslangic + timedelta(days=i) for i in range(7)
+                       if kural.gunler >> (kural.gecerli_baslangic + timedelta(days=i)).weekday() & 1)
+        kural_satiri = 'RRULE:FREQ=WEEKLY;BYDAY=' + ','.join(g for i, g in enumerate(ICAL_GUNLERI) if kural.gunler >> i & 1)
+        if kural.gecerli_bitis:
+            son_an = datetime(kural.gecerli_bitis.year, kural.gecerli_bitis.month, kural.gecerli_bitis.day, 23, 59, 59)
+            kural_satiri += ';UNTIL=' + (son_an - ICAL_UTC_FARKI).strftime('%Y%m%dT%H%M%SZ')
+        studyo_isim = STUDYOLAR.get(kural.studyo, {}).get('isim', kural.studyo)
+        etkinlik(f'kural-{kural.id}', ical_zamani(ilk_gun, SAAT_INDEKSI[kural.baslangic]),
+                 ical_zamani(ilk_gun, SAAT_INDEKSI[kural.bitis]),
+                 kural.aciklama or f'{kural.alan} rezervasyonu', f'{studyo_isim} - {kural.alan}', kural_satiri)
+    
+    for pratik_tarih, lokasyon in gorevler:
+        bilgi = PRATIK_BILGI.get(lokasyon)
+        if not bilgi:
+            continue
+        bas, bit = pratik_saatleri(lokasyon)
+        gun = datetime(pratik_tarih.year, pratik_tarih.month, pratik_tarih.day)
+        etkinlik(f'pratik-{lokasyon}-{pratik_tarih.isoformat()}',
+                 (gun + timedelta(minutes=bas)).strftime('%Y%m%dT%H%M%S'),
+                 (gun + timedelta(minutes=bit)).strftime('%Y%m%dT%H%M%S'),
+                 'Pratik görevi', bilgi['yer'])
+    
+    satirlar.append('END:VCALENDAR')
+    return '\r\n'.join(ical_satiri(satir) for satir in satirlar) + '\r\n'
+
+def ical_token_telefonu(token):
+    telefon = ical_token_onbellek.al(token)
+    if telefon is None:
+        nesil = ical_token_onbellek.nesil()
+        conn = get_db()
+        rows = conn.run('SELECT telefon FROM ical_tokenlari WHERE token = :p1', p1=token)
         conn.close()
-        return jsonify({'success': True, 'mesaj': f'{islem_sayisi} slot güncellendi'})
+        if not rows:
+            return None
+        telefon = ical_token_onbellek.koy(token, rows[0][0], nesil)
+    return telefon
+
+@app.route('/ical/<token>.ics')
+def ical_besleme(token):
+    """Kullanıcının takvim beslemesi (oturum gerektirmez, token gizlidir)"""
+    try:
+        telefon = ical_token_telefonu(token)
+        if telefon is None or kullanicilar.aktif(telefon) is None:
+            return Response('bulunamadi\n', status=404, mimetype='text/plain')
+        kayit = ical_onbellek.al(telefon)
+        if kayit is None:
+            nesil = ical_onbellek.nesil()
+            govde = ical_olustur(telefon).encode('utf-8')
+            kayit = ical_onbellek.koy(telefon, {
+                'govde': govde,
+                'etag': sha256(govde).hexdigest()[:20],
+                'degisim': datetime.now(timezone.utc).replace(microsecond=0),
+            }, nesil)
+    except Exception as e:
+        print(f"Hata: {e}")
+        return Response('hata\n', status=500, mimetype='text/plain')
+    yanit = Response(kayit['govde'], mimetype='text/calendar')
+    yanit.set_etag(kayit['etag'])
+    yanit.last_modified = kayit['degisim']
+    yanit.headers['Cache-Control'] = 'private, max-age=300'
+    return yanit.make_conditional(request)
+
+@app.route('/api/ical-linki', methods=['GET', 'POST'])
+@login_required
+def ical_linki():
+    """Kullanıcının besleme adresi; POST eski adresi geçersiz kılıp yenisini üretir"""
+    telefon = session['telefon']
+    try:
+        conn = get_db()
+        if request.method == 'POST':
+            eski = conn.run('SELECT token FROM ical_tokenlari WHERE telefon = :p1', p1=telefon)
+            token = conn.run('''
+                INSERT INTO ical_tokenlari (telefon, token) VALUES (:p1, :p2)
+                ON CONFLICT (telefon) DO UPDATE SET token = EXCLUDED.token, created_at = CURRENT_TIMESTAMP
+                RETURNING token
+            ''', p1=telefon, p2=secrets.token_urlsafe(24))[0][0]
+            if eski:
+                ical_token_onbellek.gecersiz_kil([eski[0][0]])
+                olay_bildir(conn, 'ical', token=eski[0][0])
+        else:
+            conn.run('''
+                INSERT INTO ical_tokenlari (telefon, token) VALUES (:p1, :p2)
+                ON CONFLICT (telefon) DO NOTHING
+            ''', p1=telefon, p2=secrets.token_urlsafe(24))
+            token = conn.run('SELECT token FROM ical_tokenlari WHERE telefon = :p1', p1=telefon)[0][0]
+        conn.close()
+        return jsonify({'success': True, 'url': url_for('ical_besleme', token=token, _external=True)})
     except Exception as e:
         print(f"Hata: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
 # ==================== PRATİK ANKETİ API ====================
 
+def pratik_ozetleri(hedefler):
+    """[(lokasyon, tarih_str)] -> her biri için evet/hayır listeleri, cevaplar ve WhatsApp mesajı.
+    Önbellekte olmayanlar tek sorguyla okunur."""
+    sonuc = {}
+    for hedef in hedefler:
+        ozet = pratik_onbellek.al(hedef)
+        if ozet is not None:
+            sonuc[hedef] = ozet
+    eksik = [h for h in hedefler if h not in sonuc]
+    if not eksik:
+        return sonuc
+    
+    nesil = pratik_onbellek.nesil()
+    conn = get_db()
+    rows = conn.run('''
+        SELECT a.lokasyon, a.pratik_tarih, a.telefon, a.isim, a.cevap
+        FROM pratik_anket a
+        JOIN unnest(CAST(:p1 AS text[]), CAST(:p2 AS date[])) AS h(lokasyon, pratik_tarih)
+          ON a.lokasyon = h.lokasyon AND a.pratik_tarih = h.pratik_tarih
+        ORDER BY a.created_at
+    ''', p1=[h[0] for h in eksik], p2=[h[1] for h in eksik])
+    conn.close()
+    
+    for lokasyon, tarih_str in eksik:
+        evet_listesi = []
+        hayir_listesi = []
+        cevaplar = {}
+        for row in rows:
+            if row[0] != lokasyon or row[1].isoformat() != tarih_str:
+                continue
+            cevaplar[row[2]] = row[4]
+            if lokasyon == 'sisli' and row[3] == 'Uğur Altun':
+                continue
+            if row[4] == 'evet':
+                evet_listesi.append(row[3])
+            elif row[4] == 'hayir':
+                hayir_listesi.append(row[3])
+        ozet = {
+            'evet_listesi': evet_listesi,
+            'hayir_listesi': hayir_listesi,
+            'cevaplar': cevaplar,
+            'mesaj': pratik_mesaji_olustur(lokasyon, evet_listesi),
+        }
+        sonuc[(lokasyon, tarih_str)] = pratik_onbellek.koy((lokasyon, tarih_str), ozet, nesil)
+    return sonuc
+
 @app.route('/api/pratik/durum')
 @login_required
 def pratik_durum():
     """Her iki lokasyon için anket durumu"""
     try:
-        sonuc = {}
-        conn = get_db()
+        gun_isimleri = ['Pazartesi', 'Salı', 'Çarşamba', 'Perşembe', 'Cuma', 'Cumartesi', 'Pazar']
+        ay_isimleri = ['Ocak', 'Şubat', 'Mart', 'Nisan', 'Mayıs', 'Haziran', 
+                      'Temmuz', 'Ağustos', 'Eylül', 'Ekim', 'Kasım', 'Aralık']
         
-        for lokasyon in ['sisli', 'kadikoy']:
-            aktif, pratik_tarihi = anket_aktif_mi(lokasyon)
+        durumlar = {lokasyon: anket_aktif_mi(lokasyon) for lokasyon in ['sisli', 'kadikoy']}
+        ozetler = pratik_ozetleri([(lokasyon, pratik_tarihi.strftime('%Y-%m-%d'))
+                                   for lokasyon, (_, pratik_tarihi) in durumlar.items()])
+        
+        sonuc = {}
+        for lokasyon, (aktif, pratik_tarihi) in durumlar.items():
             tarih_str = pratik_tarihi.strftime('%Y-%m-%d')
-            
-            # Kullanıcının cevabı
-            rows = conn.run('SELECT cevap FROM pratik_anket WHERE pratik_tarih = :p1 AND lokasyon = :p2 AND telefon = :p3', 
-                          p1=tarih_str, p2=lokasyon, p3=session['telefon'])
-            kullanici_cevap = rows[0][0] if rows else None
-            
-            # Tüm cevaplar
-            evet_rows = conn.run('SELECT isim FROM pratik_anket WHERE pratik_tarih = :p1 AND lokasyon = :p2 AND cevap = :p3 ORDER BY created_at', 
-                               p1=tarih_str, p2=lokasyon, p3='evet')
-            hayir_rows = conn.run('SELECT isim FROM pratik_anket WHERE pratik_tarih = :p1 AND lokasyon = :p2 AND cevap = :p3 ORDER BY created_at', 
-                                p1=tarih_str, p2=lokasyon, p3='hayir')
-            
-            evet_listesi = [r[0] for r in evet_rows]
-            hayir_listesi = [r[0] for r in hayir_rows]
-            
-            if lokasyon == 'sisli':
-                evet_listesi = [x for x in evet_listesi if x != 'Uğur Altun']
-                hayir_listesi = [x for x in hayir_listesi if x != 'Uğur Altun']
-            
-            mesaj = pratik_mesaji_olustur(lokasyon, evet_listesi)
-            
-            gun_isimleri = ['Pazartesi', 'Salı', 'Çarşamba', 'Perşembe', 'Cuma', 'Cumartesi', 'Pazar']
-            ay_isimleri = ['Ocak', 'Şubat', 'Mart', 'Nisan', 'Mayıs', 'Haziran', 
-                          'Temmuz', 'Ağustos', 'Eylül', 'Ekim', 'Kasım', 'Aralık']
+            ozet = ozetler[(lokasyon, tarih_str)]
             
             sonuc[lokasyon] = {
                 'aktif': aktif,
@@ -757,13 +4247,12 @@ def pratik_durum():
                 'pratik_tarih_str': f"{pratik_tarihi.day} {ay_isimleri[pratik_tarihi.month - 1]} {gun_isimleri[pratik_tarihi.weekday()]}",
                 'saat': PRATIK_BILGI[lokasyon]['saat'],
                 'yer': PRATIK_BILGI[lokasyon]['yer'],
-                'kullanici_cevap': kullanici_cevap,
-                'evet_listesi': evet_listesi,
-                'hayir_listesi': hayir_listesi,
-                'mesaj': mesaj
+                'kullanici_cevap': ozet['cevaplar'].get(session['telefon']),
+                'evet_listesi': ozet['evet_listesi'],
+                'hayir_listesi': ozet['hayir_listesi'],
+                'mesaj': ozet['mesaj']
             }
         
-        conn.close()
         return jsonify(sonuc)
     except Exception as e:
         print(f"Hata: {e}")
@@ -786,25 +4275,40 @@ def pratik_oyla():
         
         conn = get_db()
         
-        # Önceki cevabı sil
-        conn.run('DELETE FROM pratik_anket WHERE pratik_tarih = :p1 AND lokasyon = :p2 AND telefon = :p3',
-                p1=tarih_str, p2=lokasyon, p3=session['telefon'])
-        
-        # Yeni cevap ekle
-        conn.run('INSERT INTO pratik_anket (pratik_tarih, lokasyon, telefon, isim, cevap) VALUES (:p1, :p2, :p3, :p4, :p5)',
-                p1=tarih_str, p2=lokasyon, p3=session['telefon'], p4=session['isim'], p5=cevap)
-        
-        # Eğer evet ise görevli tablosuna da ekle
-        if cevap == 'evet':
-            try:
-                conn.run('INSERT INTO pratik_gorevli (pratik_tarih, lokasyon, telefon, isim) VALUES (:p1, :p2, :p3, :p4)',
-                        p1=tarih_str, p2=lokasyon, p3=session['telefon'], p4=session['isim'])
-            except:
-                pass  # Zaten var
-        else:
-            conn.run('DELETE FROM pratik_gorevli WHERE pratik_tarih = :p1 AND lokasyon = :p2 AND telefon = :p3',
-                    p1=tarih_str, p2=lokasyon, p3=session['telefon'])
+        # Cevap, görevli kaydı ve görev sayaçları tek ifadede (atomik) güncellenir.
+        # Sayaçlar yalnızca görevli satırı gerçekten eklendiyse/silindiyse değişir.
+        conn.run('''
+            WITH anket AS (
+                INSERT INTO pratik_anket (pratik_tarih, lokasyon, telefon, isim, cevap)
+                VALUES (CAST(:p1 AS date), :p2, :p3, :p4, :p5)
+                ON CONFLICT (pratik_tarih, lokasyon, telefon)
+                DO UPDATE SET cevap = EXCLUDED.cevap, isim = EXCLUDED.isim, created_at = CURRENT_TIMESTAMP
+            ), eklenen AS (
+                INSERT INTO pratik_gorevli (pratik_tarih, lokasyon, telefon, isim)
+                SELECT CAST(:p1 AS date), :p2, :p3, :p4 WHERE :p5 = 'evet'
+                ON CONFLICT (pratik_tarih, lokasyon, telefon) DO NOTHING
+                RETURNING pratik_tarih, lokasyon, telefon, isim, 1 AS fark
+            ), silinen AS (
+                DELETE FROM pratik_gorevli
+                WHERE :p5 <> 'evet' AND pratik_tarih = CAST(:p1 AS date) AND lokasyon = :p2 AND telefon = :p3
+                RETURNING pratik_tarih, lokasyon, telefon, isim, -1 AS fark
+            ), degisim AS (
+                SELECT * FROM eklenen UNION ALL SELECT * FROM silinen
+            ), toplam AS (
+                INSERT INTO pratik_gorev_sayac (lokasyon, telefon, isim, sayi)
+                SELECT lokasyon, telefon, isim, fark FROM degisim
+                ON CONFLICT (lokasyon, telefon)
+                DO UPDATE SET sayi = pratik_gorev_sayac.sayi + EXCLUDED.sayi, isim = EXCLUDED.isim
+            )
+            INSERT INTO pratik_gorev_haftalik (hafta, lokasyon, telefon, isim, sayi)
+            SELECT CAST(date_trunc('week', pratik_tarih) AS date), lokasyon, telefon, isim, fark FROM degisim
+            ON CONFLICT (hafta, lokasyon, telefon)
+            DO UPDATE SET sayi = pratik_gorev_haftalik.sayi + EXCLUDED.sayi, isim = EXCLUDED.isim
+        ''', p1=tarih_str, p2=lokasyon, p3=session['telefon'], p4=session['isim'], p5=cevap)
         
+        olay_bildir(conn, 'oy', lokasyon=lokasyon, pratik_tarih=tarih_str, telefon=session['telefon'])
+        pratik_onbellek.gecersiz_kil([(lokasyon, tarih_str)])
+        ical_onbellek.gecersiz_kil([session['telefon']])
         conn.close()
         
         return jsonify({'success': True, 'mesaj': 'Oyunuz kaydedildi!'})
@@ -815,50 +4319,62 @@ def pratik_oyla():
 @app.route('/api/pratik/istatistik')
 @login_required
 def pratik_istatistik_api():
-    """Pratik görevli istatistikleri"""
+    """Pratik görevli istatistikleri
+
+    Sayaç tablolarından okunur (pratik_oyla günceller). ?baslangic=&bitis= verilirse
+    haftalık kovalar toplanır; aralık hafta başına yuvarlanır.
+    """
+    try:
+        baslangic = request.args.get('baslangic')
+        bitis = request.args.get('bitis')
+        if baslangic or bitis:
+            baslangic = datetime.strptime(baslangic, '%Y-%m-%d').date() if baslangic else datetime(2000, 1, 1).date()
+            bitis = datetime.strptime(bitis, '%Y-%m-%d').date() if bitis else datetime.now().date() + timedelta(days=7)
+    except ValueError:
+        return jsonify({'error': 'Geçersiz tarih'})
     try:
         conn = get_db()
         
-        # Şişli istatistikleri
-        sisli_rows = conn.run('''
-            SELECT isim, COUNT(*) as sayi 
-            FROM pratik_gorevli 
-            WHERE lokasyon = :p1 
-            GROUP BY isim 
-            ORDER BY sayi DESC, isim
-        ''', p1='sisli')
-        
-        # Kadıköy istatistikleri
-        kadikoy_rows = conn.run('''
-            SELECT isim, COUNT(*) as sayi 
-            FROM pratik_gorevli 
-            WHERE lokasyon = :p1 
-            GROUP BY isim 
-            ORDER BY sayi DESC, isim
-        ''', p1='kadikoy')
-        
-        # Toplam istatistikler
-        toplam_rows = conn.run('''
-            SELECT isim, COUNT(*) as sayi 
-            FROM pratik_gorevli 
-            GROUP BY isim 
-            ORDER BY sayi DESC, isim
-        ''')
-        
-        # Son pratikler
-        son_pratikler = conn.run('''
-            SELECT pratik_tarih, lokasyon, isim 
-            FROM pratik_gorevli 
-            ORDER BY pratik_tarih DESC, lokasyon, isim
-            LIMIT 50
-        ''')
+        if baslangic:
+            sayac_rows = conn.run('''
+                SELECT lokasyon, telefon, MAX(isim), SUM(sayi)
+                FROM pratik_gorev_haftalik
+                WHERE hafta BETWEEN CAST(date_trunc('week', CAST(:p1 AS date)) AS date) AND CAST(:p2 AS date)
+                GROUP BY lokasyon, telefon
+                HAVING SUM(sayi) > 0
+            ''', p1=baslangic.isoformat(), p2=bitis.isoformat())
+            son_pratikler = conn.run('''
+                SELECT pratik_tarih, lokasyon, isim 
+                FROM pratik_gorevli 
+                WHERE pratik_tarih BETWEEN :p1 AND :p2
+                ORDER BY pratik_tarih DESC, lokasyon, isim
+                LIMIT 50
+            ''', p1=baslangic.isoformat(), p2=bitis.isoformat())
+        else:
+            sayac_rows = conn.run('SELECT lokasyon, telefon, isim, sayi FROM pratik_gorev_sayac WHERE sayi > 0')
+            son_pratikler = conn.run('''
+                SELECT pratik_tarih, lokasyon, isim 
+                FROM pratik_gorevli 
+                ORDER BY pratik_tarih DESC, lokasyon, isim
+                LIMIT 50
+            ''')
         
         conn.close()
         
+        lokasyonlar = {'sisli': {}, 'kadikoy': {}}
+        toplam = {}
+        for lokasyon, _, isim, sayi in sayac_rows:
+            if lokasyon in lokasyonlar:
+                lokasyonlar[lokasyon][isim] = lokasyonlar[lokasyon].get(isim, 0) + sayi
+            toplam[isim] = toplam.get(isim, 0) + sayi
+        
+        def sirala(sayilar):
+            return [{'isim': isim, 'sayi': sayi} for isim, sayi in sorted(sayilar.items(), key=lambda x: (-x[1], x[0]))]
+        
         return jsonify({
-            'sisli': [{'isim': r[0], 'sayi': r[1]} for r in sisli_rows],
-            'kadikoy': [{'isim': r[0], 'sayi': r[1]} for r in kadikoy_rows],
-            'toplam': [{'isim': r[0], 'sayi': r[1]} for r in toplam_rows],
+            'sisli': sirala(lokasyonlar['sisli']),
+            'kadikoy': sirala(lokasyonlar['kadikoy']),
+            'toplam': sirala(toplam),
             'son_pratikler': [{'tarih': str(r[0]), 'lokasyon': r[1], 'isim': r[2]} for r in son_pratikler]
         })
     except Exception as e:
@@ -871,32 +4387,77 @@ def pratik_istatistik_api():
 @login_required
 def gorev_takip():
     telefon = session.get('telefon')
-    if telefon not in GOREV_ERISIM:
+    rol = gorev_rolu(telefon)
+    if rol is None:
         return redirect(url_for('takvim'))
-    rol = GOREV_ERISIM[telefon]
     return render_template('gorev_takip.html', isim=session['isim'], rol=rol)
 
+GOREV_SIRA_SQL = "CASE g.durum WHEN 'bekliyor' THEN 1 WHEN 'yapildi_iddia' THEN 2 WHEN 'tamamlandi' THEN 3 ELSE 4 END"
+
 @app.route('/api/gorevler')
 @login_required
 def api_gorevler():
+    """Görevler notlarıyla birlikte tek sorguda; ?durum=bekliyor,yapildi_iddia&limit=50&sonra=<imleç>
+    durum verilmezse yalnızca açık görevler (tamamlananlar ?durum=tamamlandi ile ayrıca sayfalanır).
+
+    Sıralama (durum, created_at DESC, id DESC); 'sonraki' imleci bir sonraki sayfayı
+    OFFSET kullanmadan kaldığı yerden getirir.
+    """
     telefon = session.get('telefon')
-    if telefon not in GOREV_ERISIM:
+    if gorev_rolu(telefon) is None:
         return jsonify({'error': 'Yetkiniz yok'}), 403
+    durumlar = [d for d in request.args.get('durum', '').split(',') if d in GOREV_DURUMLARI] or list(GOREV_ACIK_DURUMLAR)
+    try:
+        limit = min(max(int(request.args.get('limit', GOREV_SAYFA)), 1), GOREV_MAX_SAYFA)
+        imlec = request.args.get('sonra')
+        if imlec:
+            sira, created_at, gorev_id = imlec.split('|')
+            sira, gorev_id = int(sira), int(gorev_id)
+            created_at = datetime.fromisoformat(created_at)
+    except ValueError:
+        return jsonify({'error': 'Geçersiz sayfa parametresi'}), 400
+    kosul = ''
+    parametreler = {'p1': durumlar, 'p2': limit + 1}
+    if imlec:
+        kosul = f'AND ({GOREV_SIRA_SQL} > :p3 OR ({GOREV_SIRA_SQL} = :p3 AND (g.created_at, g.id) < (:p4, :p5)))'
+        parametreler.update(p3=sira, p4=created_at, p5=gorev_id)
     try:
         conn = get_db()
-        gorevler = conn.run('SELECT id, baslik, durum, created_at FROM gorevler ORDER BY CASE durum WHEN \'bekliyor\' THEN 1 WHEN \'yapildi_iddia\' THEN 2 WHEN \'tamamlandi\' THEN 3 END, created_at DESC')
-        result = []
-        for g in gorevler:
-            notlar = conn.run('SELECT yazar, yazar_isim, not_text, created_at FROM gorev_notlar WHERE gorev_id = :p1 ORDER BY created_at ASC', p1=g[0])
-            result.append({
-                'id': g[0],
-                'baslik': g[1],
-                'durum': g[2],
-                'tarih': g[3].strftime('%Y-%m-%d') if g[3] else '',
-                'notlar': [{'yazar': n[0], 'yazar_isim': n[1], 'text': n[2], 'zaman': n[3].strftime('%H:%M') if n[3] else ''} for n in notlar]
-            })
+        rows = conn.run(f'''
+            SELECT g.id, g.baslik, g.durum, g.created_at, {GOREV_SIRA_SQL} AS sira,
+                   COALESCE(n.notlar, '[]'),
+                   (SELECT json_object_agg(durum, sayi) FROM (SELECT durum, COUNT(*) AS sayi FROM gorevler GROUP BY durum) d)
+            FROM gorevler g
+            LEFT JOIN LATERAL (
+                SELECT json_agg(json_build_object('yazar', yazar, 'yazar_isim', yazar_isim, 'text', not_text,
+                                                  'zaman', to_char(created_at, 'HH24:MI')) ORDER BY created_at) AS notlar
+                FROM gorev_notlar WHERE gorev_id = g.id
+            ) n ON TRUE
+            WHERE g.durum = ANY(CAST(:p1 AS text[])) {kosul}
+            ORDER BY sira, g.created_at DESC, g.id DESC
+            LIMIT :p2
+        ''', **parametreler)
         conn.close()
-        return jsonify(result)
+        
+        sonraki = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            son = rows[-1]
+            sonraki = f"{son[4]}|{son[3].isoformat()}|{son[0]}"
+        sayilar = rows[0][6] if rows else None
+        if sayilar is None:
+            conn = get_db()
+            sayilar = dict(conn.run('SELECT durum, COUNT(*) FROM gorevler GROUP BY durum'))
+            conn.close()
+        
+        result = [{
+            'id': g[0],
+            'baslik': g[1],
+            'durum': g[2],
+            'tarih': g[3].strftime('%Y-%m-%d') if g[3] else '',
+            'notlar': g[5]
+        } for g in rows]
+        return jsonify({'gorevler': result, 'sayilar': sayilar, 'sonraki': sonraki})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -904,7 +4465,7 @@ def api_gorevler():
 @login_required
 def api_gorev_ekle():
     telefon = session.get('telefon')
-    if telefon not in GOREV_ERISIM:
+    if gorev_rolu(telefon) is None:
         return jsonify({'error': 'Yetkiniz yok'}), 403
     data = request.json
     baslik = data.get('baslik', '').strip()
@@ -912,7 +4473,8 @@ def api_gorev_ekle():
         return jsonify({'error': 'Görev başlığı gerekli'}), 400
     try:
         conn = get_db()
-        conn.run('INSERT INTO gorevler (baslik, olusturan) VALUES (:p1, :p2)', p1=baslik, p2=telefon)
+        rows = conn.run('INSERT INTO gorevler (baslik, olusturan) VALUES (:p1, :p2) RETURNING id', p1=baslik, p2=telefon)
+        olay_bildir(conn, 'gorev', id=rows[0][0], islem='ekle')
         conn.close()
         return jsonify({'success': True})
     except Exception as e:
@@ -922,13 +4484,14 @@ def api_gorev_ekle():
 @login_required
 def api_gorev_tick():
     telefon = session.get('telefon')
-    if telefon not in GOREV_ERISIM:
+    if gorev_rolu(telefon) is None:
         return jsonify({'error': 'Yetkiniz yok'}), 403
     data = request.json
     gorev_id = data.get('gorev_id')
     try:
         conn = get_db()
         conn.run('UPDATE gorevler SET durum = :p1, updated_at = CURRENT_TIMESTAMP WHERE id = :p2', p1='yapildi_iddia', p2=gorev_id)
+        olay_bildir(conn, 'gorev', id=gorev_id, islem='tick')
         conn.close()
         return jsonify({'success': True})
     except Exception as e:
@@ -938,13 +4501,14 @@ def api_gorev_tick():
 @login_required
 def api_gorev_onayla():
     telefon = session.get('telefon')
-    if telefon not in GOREV_ERISIM or GOREV_ERISIM[telefon] != 'admin':
+    if gorev_rolu(telefon) != 'admin':
         return jsonify({'error': 'Yetkiniz yok'}), 403
     data = request.json
     gorev_id = data.get('gorev_id')
     try:
         conn = get_db()
         conn.run('UPDATE gorevler SET durum = :p1, updated_at = CURRENT_TIMESTAMP WHERE id = :p2', p1='tamamlandi', p2=gorev_id)
+        olay_bildir(conn, 'gorev', id=gorev_id, islem='onayla')
         conn.close()
         return jsonify({'success': True})
     except Exception as e:
@@ -954,13 +4518,14 @@ def api_gorev_onayla():
 @login_required
 def api_gorev_reddet():
     telefon = session.get('telefon')
-    if telefon not in GOREV_ERISIM or GOREV_ERISIM[telefon] != 'admin':
+    if gorev_rolu(telefon) != 'admin':
         return jsonify({'error': 'Yetkiniz yok'}), 403
     data = request.json
     gorev_id = data.get('gorev_id')
     try:
         conn = get_db()
         conn.run('UPDATE gorevler SET durum = :p1, updated_at = CURRENT_TIMESTAMP WHERE id = :p2', p1='bekliyor', p2=gorev_id)
+        olay_bildir(conn, 'gorev', id=gorev_id, islem='reddet')
         conn.close()
         return jsonify({'success': True})
     except Exception as e:
@@ -970,18 +4535,19 @@ def api_gorev_reddet():
 @login_required
 def api_gorev_not_ekle():
     telefon = session.get('telefon')
-    if telefon not in GOREV_ERISIM:
+    rol = gorev_rolu(telefon)
+    if rol is None:
         return jsonify({'error': 'Yetkiniz yok'}), 403
     data = request.json
     gorev_id = data.get('gorev_id')
     not_text = data.get('not', '').strip()
     if not not_text:
         return jsonify({'error': 'Not boş olamaz'}), 400
-    rol = GOREV_ERISIM[telefon]
     try:
         conn = get_db()
         conn.run('INSERT INTO gorev_notlar (gorev_id, yazar, yazar_isim, not_text) VALUES (:p1, :p2, :p3, :p4)', p1=gorev_id, p2=rol, p3=session['isim'], p4=not_text)
         conn.run('UPDATE gorevler SET updated_at = CURRENT_TIMESTAMP WHERE id = :p1', p1=gorev_id)
+        olay_bildir(conn, 'gorev', id=gorev_id, islem='not')
         conn.close()
         return jsonify({'success': True})
     except Exception as e:
@@ -991,7 +4557,7 @@ def api_gorev_not_ekle():
 @login_required
 def api_gorev_sil():
     telefon = session.get('telefon')
-    if telefon not in GOREV_ERISIM or GOREV_ERISIM[telefon] != 'admin':
+    if gorev_rolu(telefon) != 'admin':
         return jsonify({'error': 'Yetkiniz yok'}), 403
     data = request.json
     gorev_id = data.get('gorev_id')
@@ -999,6 +4565,7 @@ def api_gorev_sil():
         conn = get_db()
         conn.run('DELETE FROM gorev_notlar WHERE gorev_id = :p1', p1=gorev_id)
         conn.run('DELETE FROM gorevler WHERE id = :p1', p1=gorev_id)
+        olay_bildir(conn, 'gorev', id=gorev_id, islem='sil')
         conn.close()
         return jsonify({'success': True})
     except Exception as e:
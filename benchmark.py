@@ -0,0 +1,500 @@
+"""
+Uç nokta benchmark'ı: yerel bir PostgreSQL'i gerçekçi hacimle doldurur, /api/* rotalarını
+Flask test istemcisiyle ya da eşzamanlı HTTP yüküyle çalıştırır ve p50/p95/p99 gecikme,
+throughput, istek başına SQL ifadesi ve havuz bağlantısı raporlar.
+
+    export BENCH_DATABASE_URL=postgres://postgres@localhost/studyo_bench
+    python benchmark.py doldur
+    python benchmark.py calistir --kaydet bench_taban.json
+    python benchmark.py calistir --mod http --eszamanli 16 --karsilastir bench_taban.json
+
+`doldur` tabloları boşaltır; veritabanı adında 'bench' geçmiyorsa --zorla ister.
+--karsilastir ile tabana göre p95 ya da sorgu sayısı gerileyen rota varsa çıkış kodu 1'dir.
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+BENCH_DATABASE_URL = os.environ.get('BENCH_DATABASE_URL', 'postgres://postgres@localhost/studyo_bench')
+os.environ['DATABASE_URL'] = BENCH_DATABASE_URL
+
+import app as uygulama  # noqa: E402  (DATABASE_URL import'tan önce ayarlanmalı)
+
+# Doldurma hacimleri
+GECMIS_GUN = 180
+GELECEK_GUN = 180
+DOLULUK = 0.4
+AKTIVITE_SAYISI = 30000
+GIRIS_SAYISI = 50000
+GOREV_SAYISI = 300
+PRATIK_HAFTA = 52
+
+# Yazma rotaları doldurulmuş aralığın ötesindeki günleri kullanır; her çalıştırmada temizlenir
+KARALAMA_ARALIK_OFSET = 400
+
+TABLOLAR = ['rezervasyonlar', 'aktiviteler', 'giris_denemeleri', 'pratik_anket', 'pratik_gorevli',
+            'pratik_gorev_sayac', 'pratik_gorev_haftalik', 'gorevler', 'gorev_notlar', 'kullanici_sifreler',
+            'slot_doluluk', 'tekrar_kurallari']
+
+
+# ==================== ÖLÇÜM ====================
+
+class Sayac:
+    """HavuzBaglantisi.run ve BaglantiHavuzu.al çağrılarını sayar (yalnızca süreç içi modlarda)"""
+
+    def __init__(self):
+        self._kilit = threading.Lock()
+        self.ifade = 0
+        self.odunc = 0
+
+    def kur(self):
+        sayac = self
+        asil_run = uygulama.HavuzBaglantisi.run
+        asil_al = uygulama.BaglantiHavuzu.al
+
+        def run(hb, sql, **params):
+            with sayac._kilit:
+                sayac.ifade += 1
+            return asil_run(hb, sql, **params)
+
+        def al(havuz):
+            with sayac._kilit:
+                sayac.odunc += 1
+            return asil_al(havuz)
+
+        uygulama.HavuzBaglantisi.run = run
+        uygulama.BaglantiHavuzu.al = al
+
+    def anlik(self):
+        with self._kilit:
+            return self.ifade, self.odunc, uygulama.havuz.acilan
+
+
+def yuzdelik(sirali, oran):
+    if not sirali:
+        return None
+    return sirali[min(len(sirali) - 1, int(round(oran * (len(sirali) - 1))))]
+
+
+def ozetle(sureler, hata, gecen, ifade, odunc, acilan):
+    sirali = sorted(sureler)
+    n = len(sirali)
+    return {
+        'istek': n,
+        'hata': hata,
+        'p50_ms': round(yuzdelik(sirali, 0.50) * 1000, 2) if n else None,
+        'p95_ms': round(yuzdelik(sirali, 0.95) * 1000, 2) if n else None,
+        'p99_ms': round(yuzdelik(sirali, 0.99) * 1000, 2) if n else None,
+        'ortalama_ms': round(sum(sirali) / n * 1000, 2) if n else None,
+        'istek_sn': round(n / gecen, 1) if gecen > 0 else None,
+        'ifade_istek': round(ifade / n, 2) if n and ifade is not None else None,
+        'odunc_istek': round(odunc / n, 2) if n and odunc is not None else None,
+        'yeni_baglanti': acilan,
+    }
+
+
+# ==================== DOLDURMA ====================
+
+def doldur(conn):
+    print('Migrasyonlar...')
+    uygulama.migrasyonlari_uygula(conn)
+    conn.run(f"TRUNCATE {', '.join(TABLOLAR)} RESTART IDENTITY")
+
+    bugun = datetime.now().date()
+    ilk, son = bugun - timedelta(days=GECMIS_GUN), bugun + timedelta(days=GELECEK_GUN)
+    # Geçmiş veri varsayılan bölüme değil kendi aylık bölümüne düşsün
+    for tablo, kolon, _, _ in uygulama.BOLUMLU_TABLOLAR:
+        conn.run('''
+            SELECT aylik_bolum_olustur(:p1, :p2, CAST(ay AS date))
+            FROM generate_series(date_trunc('month', CAST(:p3 AS date)), CAST(:p4 AS date), interval '1 month') AS ay
+        ''', p1=tablo, p2=kolon, p3=ilk, p4=son)
+
+    telefonlar = list(uygulama.ILK_KULLANICILAR)
+    isimler = [uygulama.ILK_KULLANICILAR[t]['isim'] for t in telefonlar]
+    saatler = list(uygulama.saat_araligi('12:00', '22:00'))
+
+    print('rezervasyonlar...')
+    for studyo, bilgi in uygulama.STUDYOLAR.items():
+        conn.run('''
+            INSERT INTO rezervasyonlar (studyo, alan, tarih, saat, rezerve_eden, telefon, bloklu)
+            SELECT :p1, alan, tarih, saat,
+                   CASE WHEN x < 0.9 THEN (CAST(:p5 AS text[]))[k] END,
+                   CASE WHEN x < 0.9 THEN (CAST(:p6 AS text[]))[k] END,
+                   x >= 0.9
+            FROM (
+                SELECT a.alan, CAST(t AS date) AS tarih, s.saat, random() AS x, 1 + floor(random() * :p8)::int AS k
+                FROM unnest(CAST(:p2 AS text[])) AS a(alan)
+                CROSS JOIN generate_series(CAST(:p3 AS date), CAST(:p4 AS date), interval '1 day') AS t
+                CROSS JOIN unnest(CAST(:p7 AS text[])) AS s(saat)
+            ) AS r
+            WHERE x < :p9
+            ON CONFLICT DO NOTHING
+        ''', p1=studyo, p2=bilgi['alanlar'], p3=ilk, p4=son, p5=isimler, p6=telefonlar,
+             p7=saatler, p8=len(telefonlar), p9=DOLULUK)
+
+    print('aktiviteler...')
+    conn.run('''
+        INSERT INTO aktiviteler (isim, islem, studyo, alan, tarih, saat, created_at)
+        SELECT (CAST(:p1 AS text[]))[1 + floor(random() * :p2)::int],
+               CASE WHEN random() < 0.8 THEN 'rezerve' ELSE 'iptal' END,
+               'Şişli', 'Büyük Stüdyo', CAST(z AS date), '20:00', z
+        FROM (SELECT now() - random() * interval '1 day' * :p3 AS z FROM generate_series(1, :p4)) AS x
+    ''', p1=isimler, p2=len(isimler), p3=GECMIS_GUN, p4=AKTIVITE_SAYISI)
+
+    print('giris_denemeleri...')
+    conn.run('''
+        INSERT INTO giris_denemeleri (telefon, ip_adresi, basarili, created_at)
+        SELECT (CAST(:p1 AS text[]))[1 + floor(random() * :p2)::int],
+               '10.0.' || floor(random() * 255)::int || '.' || floor(random() * 255)::int,
+               random() < 0.8, now() - random() * interval '90 days'
+        FROM generate_series(1, :p3)
+    ''', p1=telefonlar, p2=len(telefonlar), p3=GIRIS_SAYISI)
+
+    print('gorevler...')
+    conn.run('''
+        INSERT INTO gorevler (baslik, durum, olusturan, created_at, updated_at)
+        SELECT 'Görev ' || i, (ARRAY['bekliyor', 'yapildi_iddia', 'tamamlandi'])[1 + floor(random() * 3)::int],
+               (CAST(:p1 AS text[]))[1 + floor(random() * :p2)::int], z, z
+        FROM (SELECT i, now() - random() * interval '120 days' AS z FROM generate_series(1, :p3) AS i) AS x
+    ''', p1=telefonlar, p2=len(telefonlar), p3=GOREV_SAYISI)
+    conn.run('''
+        INSERT INTO gorev_notlar (gorev_id, yazar, yazar_isim, not_text, created_at)
+        SELECT g.id, :p1, :p2, 'Not ' || n, g.created_at + n * interval '1 hour'
+        FROM gorevler g CROSS JOIN LATERAL generate_series(1, floor(random() * 6)::int) AS n
+    ''', p1=telefonlar[0], p2=isimler[0])
+
+    print('pratik...')
+    for lokasyon, bilgi in uygulama.PRATIK_BILGI.items():
+        conn.run('''
+            INSERT INTO pratik_anket (pratik_tarih, lokasyon, telefon, isim, cevap)
+            SELECT d, :p1, k.telefon, k.isim, CASE WHEN random() < 0.6 THEN 'evet' ELSE 'hayir' END
+            FROM (SELECT CAST(CAST(:p2 AS date) - w * 7 AS date) AS d FROM generate_series(0, :p3) AS w) AS h
+            CROSS JOIN unnest(CAST(:p4 AS text[]), CAST(:p5 AS text[])) AS k(telefon, isim)
+            WHERE random() < 0.5
+        ''', p1=lokasyon, p2=bugun + timedelta(days=(bilgi['gun'] - bugun.weekday()) % 7),
+             p3=PRATIK_HAFTA, p4=telefonlar, p5=isimler)
+    conn.run('''
+        INSERT INTO pratik_gorevli (pratik_tarih, lokasyon, telefon, isim)
+        SELECT pratik_tarih, lokasyon, telefon, isim FROM pratik_anket WHERE cevap = 'evet'
+    ''')
+    # Sayaçlar migrasyon 2'deki geri doldurma ifadeleriyle yeniden hesaplanır
+    for ifade in uygulama.MIGRASYONLAR[1][2][2:]:
+        conn.run(ifade)
+
+    conn.run('ANALYZE')
+    for tablo in ('rezervasyonlar', 'aktiviteler', 'giris_denemeleri', 'gorevler', 'gorev_notlar', 'pratik_anket'):
+        print(f'{tablo:<20} {conn.run(f"SELECT COUNT(*) FROM {tablo}")[0][0]:>8}')
+
+
+# ==================== SENARYOLAR ====================
+
+def bench_kullanicisi():
+    """Hem admin hem görev erişimi olan ilk kullanıcı (her rotayı çağırabilsin)"""
+    for telefon, bilgi in uygulama.ILK_KULLANICILAR.items():
+        if bilgi['admin'] and telefon in uygulama.ILK_GOREV_ERISIM:
+            return telefon
+    return next(t for t, b in uygulama.ILK_KULLANICILAR.items() if b['admin'])
+
+
+def senaryolar(baglam):
+    """(isim, metod, istek üreten fonksiyon) listesi; fonksiyon i. tekrar için (yol, json) döner"""
+    bugun = datetime.now().date()
+    sisli = uygulama.STUDYOLAR['sisli']
+    alan = sisli['alanlar'][0]
+    saatler = list(uygulama.saat_araligi('12:00', '22:00'))
+    gorevler = baglam['gorev_idleri']
+
+    def gun(i):
+        return (bugun + timedelta(days=i % 60)).strftime('%Y-%m-%d')
+
+    def bos_slot(i, ofset=0):
+        # Doldurulmuş aralığın dışında (karalama bölgesi), tekrar başına benzersiz bir slot
+        tarih = bugun + timedelta(days=GELECEK_GUN + 10 + ofset + i // len(saatler))
+        return {'studyo': 'sisli', 'alan': alan, 'tarih': tarih.strftime('%Y-%m-%d'), 'saat': saatler[i % len(saatler)]}
+
+    def bos_aralik(i):
+        # 1 saatlik (2 slot) aralık; rezerve/iptal'in kullandığı günlerden uzakta
+        slot = bos_slot(i * 2, ofset=KARALAMA_ARALIK_OFSET)
+        saat = slot.pop('saat')
+        return dict(slot, saat_baslangic=saat, saat_bitis=uygulama.saat_ekle(saat, 60))
+
+    def pazartesi(i):
+        d = bugun + timedelta(days=(i % 26) * 7 - bugun.weekday())
+        return d.strftime('%Y-%m-%d'), (d + timedelta(days=6)).strftime('%Y-%m-%d')
+
+    return [
+        ('get_slotlar', 'GET', lambda i: (f'/api/slotlar/sisli/{alan}/{gun(i)}', None)),
+        ('slotlar_aralik', 'GET', lambda i: ('/api/slotlar-aralik/sisli?baslangic=%s&bitis=%s&kompakt=1' % pazartesi(i), None)),
+        ('bos_slot_ara', 'GET', lambda i: (f'/api/bos-slot-ara?sure={60 + (i % 3) * 30}&baslangic={bugun}&bitis={bugun + timedelta(days=89)}', None)),
+        ('aktiviteler', 'GET', lambda i: ('/api/aktiviteler', None)),
+        ('aktiviteler_yeni', 'GET', lambda i: ('/api/aktiviteler?after_id=2147483647', None)),
+        ('aktiviteler_studyo', 'GET', lambda i: ('/api/aktiviteler?studyo=sisli', None)),
+        ('pratik_durum', 'GET', lambda i: ('/api/pratik/durum', None)),
+        ('pratik_istatistik', 'GET', lambda i: ('/api/pratik/istatistik', None)),
+        ('pratik_istatistik_donem', 'GET', lambda i: (f'/api/pratik/istatistik?baslangic={bugun - timedelta(days=90)}', None)),
+        ('gorevler', 'GET', lambda i: ('/api/gorevler', None)),
+        ('sifre_durumu', 'GET', lambda i: ('/api/admin/sifre-durumu', None)),
+        ('rezerve', 'POST', lambda i: ('/api/rezerve', bos_slot(i))),
+        ('iptal', 'POST', lambda i: ('/api/iptal', bos_slot(i))),
+        ('rezerve_aralik', 'POST', lambda i: ('/api/rezerve', bos_aralik(i))),
+        ('toplu_blok', 'POST', lambda i: ('/api/admin/toplu-blok', {
+            'studyo': 'sisli', 'alan': sisli['alanlar'][-1], 'gunler': ['Pzt', 'Per'],
+            'saat_baslangic': '12:00', 'saat_bitis': '14:00', 'gun_sayisi': 90,
+            'islem': 'blokla' if i % 2 == 0 else 'kaldir'})),
+        ('pratik_oyla', 'POST', lambda i: ('/api/pratik/oyla', {
+            'lokasyon': 'sisli' if i % 4 < 2 else 'kadikoy', 'cevap': 'evet' if i % 2 == 0 else 'hayir'})),
+        ('gorev_ekle', 'POST', lambda i: ('/api/gorev-ekle', {'baslik': f'bench {i}'})),
+        ('gorev_not_ekle', 'POST', lambda i: ('/api/gorev-not-ekle', {'gorev_id': gorevler[i % len(gorevler)], 'not': f'bench {i}'})),
+        ('gorev_tick', 'POST', lambda i: ('/api/gorev-tick', {'gorev_id': gorevler[i % len(gorevler)]})),
+        ('gorev_reddet', 'POST', lambda i: ('/api/gorev-reddet', {'gorev_id': gorevler[i % len(gorevler)]})),
+        ('gorev_onayla', 'POST', lambda i: ('/api/gorev-onayla', {'gorev_id': gorevler[i % len(gorevler)]})),
+        ('gorev_sil', 'POST', lambda i: ('/api/gorev-sil', {'gorev_id': baglam['silinecek'][i % len(baglam['silinecek'])]})),
+        ('sifre_sifirla', 'POST', lambda i: ('/api/admin/sifre-sifirla', {'telefon': baglam['telefon']})),
+    ]
+
+
+def basarili_mi(durum, govde):
+    if durum >= 400:
+        return False
+    try:
+        veri = json.loads(govde)
+    except ValueError:
+        return True
+    return not (isinstance(veri, dict) and (veri.get('success') is False or 'error' in veri))
+
+
+# ==================== ÇALIŞTIRICILAR ====================
+
+def istemci_modu(senaryo, tekrar, isinma, telefon, sayac):
+    """Flask test istemcisiyle sıralı; istek başına ifade/ödünç sayıları tam ölçülür"""
+    istemci = uygulama.app.test_client()
+    with istemci.session_transaction() as s:
+        s['telefon'], s['isim'], s['admin'] = telefon, uygulama.ILK_KULLANICILAR[telefon]['isim'], True
+    _, metod, uret = senaryo
+    for i in range(isinma):
+        yol, govde = uret(tekrar + i)
+        istemci.open(yol, method=metod, json=govde)
+    sureler, hata = [], 0
+    ifade0, odunc0, acilan0 = sayac.anlik()
+    baslangic = time.perf_counter()
+    for i in range(tekrar):
+        yol, govde = uret(i)
+        t0 = time.perf_counter()
+        yanit = istemci.open(yol, method=metod, json=govde)
+        sureler.append(time.perf_counter() - t0)
+        hata += not basarili_mi(yanit.status_code, yanit.get_data())
+    gecen = time.perf_counter() - baslangic
+    ifade1, odunc1, acilan1 = sayac.anlik()
+    return ozetle(sureler, hata, gecen, ifade1 - ifade0, odunc1 - odunc0, acilan1 - acilan0)
+
+
+def http_modu(senaryo, tekrar, eszamanli, adres, cerez, sayac):
+    """Eşzamanlı HTTP yükü; adres verilmezse süreç içi çok thread'li bir sunucu açılır"""
+    hedef = urlparse(adres)
+    _, metod, uret = senaryo
+    sureler, hatalar = [], []
+    sira = iter(range(tekrar))
+    sira_kilidi = threading.Lock()
+
+    def isci():
+        baglanti = http.client.HTTPConnection(hedef.hostname, hedef.port, timeout=30)
+        while True:
+            with sira_kilidi:
+                i = next(sira, None)
+            if i is None:
+                break
+            yol, govde = uret(i)
+            basliklar = {'Cookie': cerez}
+            veri = None
+            if govde is not None:
+                veri = json.dumps(govde).encode()
+                basliklar['Content-Type'] = 'application/json'
+            t0 = time.perf_counter()
+            try:
+                baglanti.request(metod, yol, body=veri, headers=basliklar)
+                yanit = baglanti.getresponse()
+                icerik = yanit.read()
+                basarili = basarili_mi(yanit.status, icerik)
+                if yanit.getheader('Connection', '').lower() == 'close' or yanit.version == 10:
+                    baglanti.close()
+            except (OSError, http.client.HTTPException):
+                baglanti.close()
+                basarili = False
+            sureler.append(time.perf_counter() - t0)
+            hatalar.append(not basarili)
+        baglanti.close()
+
+    ifade0, odunc0, acilan0 = sayac.anlik() if sayac else (None, None, None)
+    baslangic = time.perf_counter()
+    iscler = [threading.Thread(target=isci) for _ in range(eszamanli)]
+    for t in iscler:
+        t.start()
+    for t in iscler:
+        t.join()
+    gecen = time.perf_counter() - baslangic
+    if sayac:
+        ifade1, odunc1, acilan1 = sayac.anlik()
+        return ozetle(sureler, sum(hatalar), gecen, ifade1 - ifade0, odunc1 - odunc0, acilan1 - acilan0)
+    return ozetle(sureler, sum(hatalar), gecen, None, None, None)
+
+
+def surec_ici_sunucu():
+    from werkzeug.serving import make_server
+    sunucu = make_server('127.0.0.1', 0, uygulama.app, threaded=True)
+    threading.Thread(target=sunucu.serve_forever, daemon=True).start()
+    return sunucu, f'http://127.0.0.1:{sunucu.server_port}'
+
+
+def oturum_cerezi(telefon):
+    """Süreç içi sunucu (ya da aynı SECRET_KEY ile çalışan harici sunucu) için imzalı oturum çerezi"""
+    flask_app = uygulama.app
+    imzalayici = flask_app.session_interface.get_signing_serializer(flask_app)
+    deger = imzalayici.dumps({'telefon': telefon, 'isim': uygulama.ILK_KULLANICILAR[telefon]['isim'], 'admin': True})
+    return f"{flask_app.config['SESSION_COOKIE_NAME']}={deger}"
+
+
+def karsilastir(sonuc, taban, tolerans):
+    """Tabana göre gerileyen rotaları listele"""
+    gerileyen = []
+    for isim, eski in taban['senaryolar'].items():
+        yeni = sonuc['senaryolar'].get(isim)
+        if not yeni:
+            continue
+        if eski['p95_ms'] and yeni['p95_ms'] and yeni['p95_ms'] > eski['p95_ms'] * (1 + tolerans):
+            gerileyen.append(f"{isim}: p95 {eski['p95_ms']} -> {yeni['p95_ms']} ms")
+        if eski.get('ifade_istek') is not None and yeni.get('ifade_istek') is not None \
+                and yeni['ifade_istek'] > eski['ifade_istek']:
+            gerileyen.append(f"{isim}: istek başına ifade {eski['ifade_istek']} -> {yeni['ifade_istek']}")
+    return gerileyen
+
+
+def yazdir_tablo(sonuc):
+    print(f"\n{'rota':<26}{'istek':>7}{'hata':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'istek/sn':>10}{'ifade':>7}{'ödünç':>7}")
+    for isim, r in sonuc['senaryolar'].items():
+        def h(deger):
+            return '-' if deger is None else deger
+        print(f"{isim:<26}{r['istek']:>7}{r['hata']:>6}{h(r['p50_ms']):>9}{h(r['p95_ms']):>9}{h(r['p99_ms']):>9}"
+              f"{h(r['istek_sn']):>10}{h(r['ifade_istek']):>7}{h(r['odunc_istek']):>7}")
+
+
+def calistir(args):
+    sayac = None if args.url else Sayac()
+    if sayac:
+        sayac.kur()
+    telefon = bench_kullanicisi()
+
+    conn = uygulama.yeni_baglanti()
+    try:
+        gorev_idleri = [r[0] for r in conn.run("SELECT id FROM gorevler WHERE baslik NOT LIKE 'bench %' ORDER BY id")]
+    finally:
+        conn.close()
+    if not gorev_idleri:
+        sys.exit('Önce: python benchmark.py doldur')
+    conn = uygulama.yeni_baglanti()
+    try:
+        conn.run('DELETE FROM rezervasyonlar WHERE tarih > :p1', p1=datetime.now().date() + timedelta(days=GELECEK_GUN))
+    finally:
+        conn.close()
+    baglam = {'telefon': telefon, 'gorev_idleri': gorev_idleri, 'silinecek': []}
+
+    sunucu = None
+    adres = args.url
+    if args.mod == 'http' and not adres:
+        sunucu, adres = surec_ici_sunucu()
+    cerez = oturum_cerezi(telefon)
+
+    # Dinleyici bağlanınca önbellekler devreye girer; üretimdeki duruma yakın ölç
+    uygulama.dinleyici.baslat()
+    for _ in range(50):
+        if uygulama.dinleyici.bagli:
+            break
+        time.sleep(0.1)
+
+    secili = set(args.rota.split(',')) if args.rota else None
+    sonuc = {
+        'meta': {'zaman': datetime.now().isoformat(timespec='seconds'), 'mod': args.mod, 'tekrar': args.tekrar,
+                 'eszamanli': args.eszamanli if args.mod == 'http' else 1, 'havuz_max': uygulama.DB_HAVUZ_MAX},
+        'senaryolar': {},
+    }
+    for senaryo in senaryolar(baglam):
+        isim = senaryo[0]
+        if secili and isim not in secili:
+            continue
+        if isim == 'gorev_sil':
+            # gorev_ekle'nin eklediği görevleri sil, veri hacmi sabit kalsın
+            conn = uygulama.yeni_baglanti()
+            try:
+                baglam['silinecek'] = [r[0] for r in conn.run("SELECT id FROM gorevler WHERE baslik LIKE 'bench %' ORDER BY id")]
+            finally:
+                conn.close()
+            if not baglam['silinecek']:
+                continue
+        if args.mod == 'http':
+            tekrar = min(args.tekrar, len(baglam['silinecek'])) if isim == 'gorev_sil' else args.tekrar
+            r = http_modu(senaryo, tekrar, args.eszamanli, adres, cerez, sayac)
+        else:
+            tekrar = min(args.tekrar, len(baglam['silinecek'])) if isim == 'gorev_sil' else args.tekrar
+            r = istemci_modu(senaryo, tekrar, 0 if isim == 'gorev_sil' else args.isinma, telefon, sayac)
+        sonuc['senaryolar'][isim] = r
+        print(f"{isim:<26} p95 {r['p95_ms']} ms, {r['hata']} hata")
+
+    if sunucu:
+        sunucu.shutdown()
+    sonuc['havuz'] = uygulama.havuz.istatistik()
+    yazdir_tablo(sonuc)
+
+    if args.kaydet:
+        with open(args.kaydet, 'w', encoding='utf-8') as f:
+            json.dump(sonuc, f, ensure_ascii=False, indent=2)
+        print(f'\nTaban kaydedildi: {args.kaydet}')
+    if args.karsilastir:
+        with open(args.karsilastir, encoding='utf-8') as f:
+            taban = json.load(f)
+        gerileyen = karsilastir(sonuc, taban, args.tolerans)
+        if gerileyen:
+            print('\nGERİLEME:')
+            for satir in gerileyen:
+                print('  ' + satir)
+            sys.exit(1)
+        print('\nTabana göre gerileme yok')
+
+
+def main():
+    ayristirici = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    alt = ayristirici.add_subparsers(dest='komut', required=True)
+    d = alt.add_parser('doldur', help='Bench veritabanını migrate et ve gerçekçi hacimle doldur')
+    d.add_argument('--zorla', action='store_true', help="Veritabanı adında 'bench' geçmese de boşalt")
+    c = alt.add_parser('calistir', help='Rotaları çalıştır ve raporla')
+    c.add_argument('--mod', choices=['istemci', 'http'], default='istemci')
+    c.add_argument('--tekrar', type=int, default=200, help='Rota başına istek sayısı')
+    c.add_argument('--isinma', type=int, default=5, help='Ölçülmeyen ısınma istekleri (istemci modu)')
+    c.add_argument('--eszamanli', type=int, default=8, help='HTTP modunda eşzamanlı istemci')
+    c.add_argument('--url', help='Harici sunucu (ör. gunicorn); aynı SECRET_KEY gerekir, DB sayaçları ölçülmez')
+    c.add_argument('--rota', help='Yalnızca bu rotalar (virgülle)')
+    c.add_argument('--kaydet', help='Sonucu JSON taban olarak kaydet')
+    c.add_argument('--karsilastir', help='Bu JSON tabana göre karşılaştır')
+    c.add_argument('--tolerans', type=float, default=0.25, help='p95 için izin verilen artış oranı')
+    args = ayristirici.parse_args()
+
+    if args.komut == 'doldur':
+        if 'bench' not in urlparse(BENCH_DATABASE_URL).path and not args.zorla:
+            sys.exit(f"{BENCH_DATABASE_URL} bench veritabanı gibi görünmüyor; boşaltmak için --zorla")
+        conn = uygulama.yeni_baglanti()
+        try:
+            doldur(conn)
+        finally:
+            conn.close()
+    else:
+        if args.mod == 'istemci' and args.url:
+            sys.exit('--url yalnızca --mod http ile kullanılır')
+        calistir(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+# Gunicorn ayarları; gunicorn çalışma dizinindeki bu dosyayı kendiliğinden okur:
+#
+#     gunicorn app:app
+#
+# /api/stream (SSE) her açık sekme için bir isteği SSE_MAX_SURE saniyeye kadar açık tutar.
+# Varsayılan sync worker'da bu, worker'ın tamamını meşgul eder; gthread'de yalnızca bir thread'i.
+# Worker sayısı WEB_CONCURRENCY, adres PORT ortam değişkeninden (gunicorn varsayılanı).
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# Worker başına eşzamanlı istek (açık SSE akışları dahil). Akışlar veritabanı bağlantısı
+# tutmaz; diğer istekler DB_HAVUZ_MAX bağlantıyı paylaşır.
+threads = int(os.environ.get('GUNICORN_THREADS', '32'))